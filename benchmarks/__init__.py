@@ -0,0 +1 @@
+"""Benchmarks for the campaign MCP server (run with ``python -m benchmarks.<name>``)."""
@@ -0,0 +1,140 @@
+"""Bandwidth and latency of HTTP response compression on real tool results.
+
+Renders ``list_characters`` pages from a generated vault as the
+Streamable HTTP transport would send them (one server-sent event per
+response), pushes each through the compression middleware at several
+levels, and reports the bytes on the wire, the CPU time spent compressing
+and the resulting end-to-end time over links of different speeds::
+
+    python -m benchmarks.bench_compression --notes 2000 --limits 20,200
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import tempfile
+import time
+from collections.abc import MutableMapping
+from pathlib import Path
+from typing import Any
+
+import main
+from benchmarks.common import summarize, write_results
+from benchmarks.vaultgen import VaultSpec, generate_vault
+
+# Settings compared: (label, encoding, level); level 0 means compression off
+SETTINGS = (
+    ("identity", "gzip", 0),
+    ("gzip-1", "gzip", 1),
+    ("gzip-6", "gzip", 6),
+    ("gzip-9", "gzip", 9),
+    ("deflate-6", "deflate", 6),
+)
+
+# Link speeds the transfer time is estimated for, in megabits per second
+LINKS_MBPS = (1, 10, 100)
+
+# Size of the body chunks the payload is handed to the middleware in
+CHUNK_BYTES = 16 * 1024
+
+
+async def _payload(limit: int) -> bytes:
+    """One list_characters response, framed as a JSON-RPC result in an SSE event."""
+    contents = await main.call_tool("list_characters", {"limit": limit})
+    result = {"content": [content.model_dump(mode="json") for content in contents]}
+    message = {"jsonrpc": "2.0", "id": 1, "result": result}
+    return f"event: message\ndata: {json.dumps(message)}\n\n".encode()
+
+
+async def _send_through(payload: bytes, encoding: str, level: int) -> tuple[int, int]:
+    """Return (bytes sent, nanoseconds spent) for *payload* at *level*."""
+    sent_bytes = 0
+
+    async def inner(scope: Any, receive: Any, send: Any) -> None:
+        headers = [(b"content-type", b"text/event-stream")]
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        for start in range(0, len(payload), CHUNK_BYTES):
+            chunk = payload[start : start + CHUNK_BYTES]
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def receive() -> MutableMapping[str, Any]:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: MutableMapping[str, Any]) -> None:
+        nonlocal sent_bytes
+        sent_bytes += len(message.get("body", b""))
+
+    app = main._CompressionMiddleware(inner, level) if level else inner
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/mcp",
+        "headers": [(b"accept-encoding", encoding.encode())],
+    }
+    started = time.perf_counter_ns()
+    await app(scope, receive, send)
+    return sent_bytes, time.perf_counter_ns() - started
+
+
+async def run(notes: int, limits: list[int], iterations: int) -> list[dict[str, Any]]:
+    results = []
+    with tempfile.TemporaryDirectory(prefix="campaign-bench-") as tmp_dir:
+        vault = generate_vault(Path(tmp_dir), VaultSpec.for_notes(notes))
+        main.load_vault(vault.locations_dir, vault.characters_dir, vault.sessions_dir)
+        for limit in limits:
+            payload = await _payload(limit)
+            for label, encoding, level in SETTINGS:
+                samples = []
+                sent_bytes = 0
+                for _ in range(iterations):
+                    sent_bytes, elapsed_ns = await _send_through(payload, encoding, level)
+                    samples.append(elapsed_ns)
+                latency = summarize(samples)
+                results.append(
+                    {
+                        "limit": limit,
+                        "setting": label,
+                        "payload_bytes": len(payload),
+                        "sent_bytes": sent_bytes,
+                        "ratio": round(sent_bytes / len(payload), 3),
+                        "compress": latency,
+                        "transfer_ms": {
+                            f"{mbps}mbps": round(
+                                latency.p50_us / 1000 + sent_bytes * 8 / (mbps * 1000), 2
+                            )
+                            for mbps in LINKS_MBPS
+                        },
+                    }
+                )
+    return results
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notes", type=int, default=2000, help="Notes in the generated vault")
+    parser.add_argument(
+        "--limits", default="20,200", help="Comma-separated list_characters page sizes"
+    )
+    parser.add_argument("--iterations", type=int, default=50, help="Timed runs per setting")
+    parser.add_argument("--output", type=Path, help="Write results to this JSON file")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    limits = [int(limit) for limit in args.limits.split(",")]
+    results = asyncio.run(run(args.notes, limits, args.iterations))
+    links = "".join(f"{f'{mbps} Mbit/s ms':>15}" for mbps in LINKS_MBPS)
+    print(f"  {'page':>5} {'setting':<10} {'bytes':>10} {'ratio':>6} {'cpu p50 us':>11}{links}")
+    for row in results:
+        transfer = "".join(f"{ms:>15}" for ms in row["transfer_ms"].values())
+        print(
+            f"  {row['limit']:>5} {row['setting']:<10} {row['sent_bytes']:>10}"
+            f" {row['ratio']:>6} {row['compress'].p50_us:>11}{transfer}"
+        )
+    if args.output is not None:
+        write_results(args.output, "compression", results)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,105 @@
+"""Memory and per-check cost of the HTTP rate limiter under a scan from many IPs.
+
+Feeds one request from each of N distinct addresses (as a scan across a
+public IP range would) and samples the tracked-client count and RSS along
+the way.  ``--legacy`` runs the same load through the previous deque-based
+sliding-window limiter for comparison::
+
+    python -m benchmarks.bench_ratelimit --clients 1000000
+    python -m benchmarks.bench_ratelimit --clients 1000000 --legacy
+"""
+
+import argparse
+import collections
+import gc
+import time
+from pathlib import Path
+from typing import Any, Protocol
+
+from benchmarks.common import current_rss_bytes, peak_rss_bytes, write_results
+from main import _RateLimiter
+
+
+class _Limiter(Protocol):
+    def __len__(self) -> int: ...
+
+    def is_allowed(self, client_id: str) -> bool: ...
+
+
+class _LegacyRateLimiter:
+    """The sliding-window limiter this benchmark was written to replace."""
+
+    def __init__(self, max_requests: int = 60, window_seconds: int = 60) -> None:
+        self._max = max_requests
+        self._window = float(window_seconds)
+        self._store: dict[str, collections.deque[float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def is_allowed(self, client_id: str) -> bool:
+        now = time.monotonic()
+        window = self._store.setdefault(client_id, collections.deque())
+        cutoff = now - self._window
+        while window and window[0] < cutoff:
+            window.popleft()
+        if len(window) >= self._max:
+            return False
+        window.append(now)
+        return True
+
+
+def _address(i: int) -> str:
+    return f"{10 + (i >> 24) % 200}.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}"
+
+
+def run(clients: int, samples: int, legacy: bool) -> dict[str, Any]:
+    limiter: _Limiter = _LegacyRateLimiter() if legacy else _RateLimiter()
+    addresses = [_address(i) for i in range(clients)]
+    gc.collect()
+    baseline_rss = current_rss_bytes() or 0
+    step = max(1, clients // samples)
+    checkpoints = []
+    started = time.perf_counter_ns()
+    for i, address in enumerate(addresses, start=1):
+        limiter.is_allowed(address)
+        if i % step == 0 or i == clients:
+            rss = current_rss_bytes()
+            checkpoints.append(
+                {
+                    "clients_seen": i,
+                    "tracked": len(limiter),
+                    "rss_growth_bytes": None if rss is None else rss - baseline_rss,
+                }
+            )
+    elapsed_ns = time.perf_counter_ns() - started
+    return {
+        "limiter": "legacy-deque" if legacy else "gcra",
+        "clients": clients,
+        "ns_per_check": round(elapsed_ns / clients, 1),
+        "peak_rss_bytes": peak_rss_bytes(),
+        "checkpoints": checkpoints,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=1_000_000, help="Distinct client IPs")
+    parser.add_argument("--samples", type=int, default=10, help="Checkpoints to report")
+    parser.add_argument("--legacy", action="store_true", help="Benchmark the old limiter")
+    parser.add_argument("--output", type=Path, help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    result = run(args.clients, args.samples, args.legacy)
+    print(f"{result['limiter']}: {result['ns_per_check']} ns per check")
+    print(f"  {'clients seen':>12} {'tracked':>10} {'RSS growth MiB':>15}")
+    for point in result["checkpoints"]:
+        growth = point["rss_growth_bytes"]
+        shown = "n/a" if growth is None else f"{growth / 2**20:.1f}"
+        print(f"  {point['clients_seen']:>12} {point['tracked']:>10} {shown:>15}")
+    if args.output is not None:
+        write_results(args.output, "ratelimit", result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""Time every ``call_tool`` branch against generated vaults of increasing size.
+
+Each vault size runs in its own process so peak RSS is attributable to it::
+
+    python -m benchmarks.bench_tools --sizes 100,10000,100000 --output tools.json
+    python -m benchmarks.bench_tools --sizes 100,10000 --compare tools.json
+    python -m benchmarks.bench_tools --sizes 100,10000 --storage sqlite
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+import main
+from benchmarks.common import (
+    LatencySummary,
+    io_syscalls,
+    peak_rss_bytes,
+    summarize,
+    write_results,
+)
+from benchmarks.vaultgen import GeneratedVault, VaultSpec, generate_vault
+
+DEFAULT_SIZES = (100, 10_000, 100_000)
+
+Arguments = dict[str, Any]
+
+
+def _scenarios(
+    vault: GeneratedVault, since: int
+) -> dict[str, Callable[[random.Random], Arguments]]:
+    """Argument factories for each benchmarked tool call, keyed by scenario name.
+
+    *since* is the vault generation before :func:`_edit_batch` ran.
+    """
+
+    def character(rng: random.Random) -> tuple[str, str]:
+        return rng.choice(vault.characters)
+
+    def locations(rng: random.Random) -> list[str]:
+        return rng.sample(vault.locations, min(_BATCH_SIZE, len(vault.locations)))
+
+    def characters(rng: random.Random) -> list[dict[str, str]]:
+        sample = rng.sample(vault.characters, min(_BATCH_SIZE, len(vault.characters)))
+        return [{"name": name, "organization": organization} for name, organization in sample]
+
+    return {
+        "list_locations": lambda rng: {},
+        "list_locations/summary": lambda rng: {"detail": "summary"},
+        "get_location": lambda rng: {"name": rng.choice(vault.locations)},
+        "get_location/sections": lambda rng: {
+            "name": rng.choice(vault.locations),
+            "sections": ["Secrets"],
+        },
+        "get_location/not_found": lambda rng: {"name": rng.choice(vault.locations)[:-2] + "xx"},
+        "get_locations": lambda rng: {"names": locations(rng)},
+        "get_locations/sections": lambda rng: {"names": locations(rng), "sections": ["Secrets"]},
+        "list_characters": lambda rng: {},
+        "list_characters/organization": lambda rng: {
+            "organization": rng.choice(vault.organizations),
+        },
+        "list_characters/summary": lambda rng: {"detail": "summary"},
+        "get_character": lambda rng: dict(zip(("name", "organization"), character(rng))),
+        "get_character/sections": lambda rng: {
+            **dict(zip(("name", "organization"), character(rng))),
+            "sections": ["Haven", "Touchstones"],
+        },
+        "get_characters": lambda rng: {"characters": characters(rng)},
+        "get_characters/sections": lambda rng: {
+            "characters": characters(rng),
+            "sections": ["Secrets"],
+        },
+        "get_story_so_far": lambda rng: {},
+        "get_story_so_far/last_n_sections": lambda rng: {"last_n_sections": 3},
+        "search_vault": lambda rng: {"query": " ".join(rng.sample(_QUERY_WORDS, 2))},
+        "query_notes": lambda rng: {
+            "where": {"clan": rng.choice(_QUERY_CLANS), "generation": {"lte": 9}},
+            "kind": "character",
+        },
+        "get_related": lambda rng: {"name": character(rng)[0], "depth": 2},
+        "changes_since": lambda rng: {"generation": since},
+        "victims_resonance": lambda rng: {"mood": rng.choice([m.value for m in main.Mood])},
+    }
+
+
+# Notes fetched per get_locations / get_characters call
+_BATCH_SIZE = 10
+
+# Notes touched before the changes_since scenario
+_EDITED_NOTES = 100
+
+_QUERY_WORDS = ["prince", "harbour", "ledger", "betrayal", "ritual", "smuggler", "boon"]
+_QUERY_CLANS = ["Ventrue", "Toreador", "Nosferatu", "Tremere"]
+
+
+def _edit_batch(state: main.VaultState, vault: GeneratedVault, count: int) -> int:
+    """Touch *count* notes as one change batch and return the generation before it.
+
+    Only modification times move, so a vault kept with ``--vault-dir`` is
+    left as it was generated.
+    """
+    since = state.journal.generation
+    paths = [vault.locations_dir / f"{name}.md" for name in vault.locations]
+    paths += [
+        vault.characters_dir / organization / f"{name}.md"
+        for name, organization in vault.characters
+    ]
+    edited = random.Random("edits").sample(paths, min(count, len(paths)))
+    for path in edited:
+        st = path.stat()
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    state.index.apply_changes(edited)
+    return since
+
+
+async def _time_scenario(
+    tool: str, make_arguments: Callable[[random.Random], Arguments], iterations: int, warmup: int
+) -> dict[str, Any]:
+    rng = random.Random(tool)
+    calls = [make_arguments(rng) for _ in range(warmup + iterations)]
+    for arguments in calls[:warmup]:
+        await main.call_tool(tool, arguments)
+
+    samples: list[int] = []
+    response_bytes = 0
+    syscalls_before = io_syscalls()
+    for arguments in calls[warmup:]:
+        started = time.perf_counter_ns()
+        result = await main.call_tool(tool, arguments)
+        samples.append(time.perf_counter_ns() - started)
+        response_bytes += sum(len(item.text.encode()) for item in result)
+    syscalls_after = io_syscalls()
+
+    syscalls = None
+    if syscalls_before is not None and syscalls_after is not None:
+        syscalls = round((syscalls_after - syscalls_before) / iterations, 2)
+    return {
+        "latency": summarize(samples),
+        "syscalls_per_call": syscalls,
+        "response_bytes_mean": response_bytes // iterations,
+    }
+
+
+async def run_size(
+    notes: int, iterations: int, warmup: int, vault_root: Path, storage: str = "filesystem"
+) -> dict[str, Any]:
+    """Generate (or reuse) a vault of *notes* notes and time every scenario against it."""
+    spec = VaultSpec.for_notes(notes)
+    root = vault_root / f"notes-{notes}"
+    started = time.perf_counter()
+    if root.exists():
+        vault = _describe_existing(root, spec)
+    else:
+        vault = generate_vault(root, spec)
+    generate_seconds = time.perf_counter() - started
+
+    dirs = (vault.locations_dir, vault.characters_dir, vault.sessions_dir)
+    syscalls_before = io_syscalls()
+    started = time.perf_counter()
+    state = main.load_vault(*dirs)
+    load_seconds = time.perf_counter() - started
+    syscalls_after = io_syscalls()
+
+    # Restart from the on-disk index cache, as a second run of the server would
+    cache = main.IndexCache(root / "index.snapshot")
+    cache.attach(state, dirty=True)
+    cache.save()
+    started = time.perf_counter()
+    state = main.load_vault(*dirs, main.IndexCache(cache.path))
+    cached_load_seconds = time.perf_counter() - started
+    main._vault_watcher = main.start_vault_watcher(state.index)
+
+    sqlite_sync_seconds = None
+    if storage == "sqlite":
+        store = main.SQLiteStore(root / "vault.sqlite3")
+        started = time.perf_counter()
+        store.sync(state.index)
+        sqlite_sync_seconds = round(time.perf_counter() - started, 3)
+        main.NotePipeline(state.index).register(store)
+        main._sqlite_store = store
+
+    tools: dict[str, Any] = {}
+    try:
+        since = _edit_batch(state, vault, _EDITED_NOTES)
+        for scenario, make_arguments in _scenarios(vault, since).items():
+            tool = scenario.split("/")[0]
+            tools[scenario] = await _time_scenario(tool, make_arguments, iterations, warmup)
+    finally:
+        if main._vault_watcher is not None:
+            main._vault_watcher.stop()
+
+    return {
+        "notes": vault.notes,
+        "organizations": len(vault.organizations),
+        "generate_seconds": round(generate_seconds, 3),
+        "load_seconds": round(load_seconds, 3),
+        "cached_load_seconds": round(cached_load_seconds, 3),
+        "storage": storage,
+        "sqlite_sync_seconds": sqlite_sync_seconds,
+        "load_syscalls": (
+            syscalls_after - syscalls_before
+            if syscalls_before is not None and syscalls_after is not None
+            else None
+        ),
+        "peak_rss_bytes": peak_rss_bytes(),
+        "tools": tools,
+    }
+
+
+def _describe_existing(root: Path, spec: VaultSpec) -> GeneratedVault:
+    """Rebuild the name lists of a vault generated by an earlier run."""
+    vault = GeneratedVault(root / "Locations", root / "Characters", root / "sessions")
+    vault.locations = sorted(p.stem for p in vault.locations_dir.glob("*.md"))
+    vault.characters = sorted(
+        (p.stem, p.parent.relative_to(vault.characters_dir).as_posix())
+        for p in vault.characters_dir.rglob("*.md")
+    )
+    vault.organizations = sorted({org for _, org in vault.characters})
+    if vault.notes != spec.locations + spec.characters:
+        raise SystemExit(f"{root} does not match the spec for {spec.locations + spec.characters}")
+    return vault
+
+
+def _run_in_child(notes: int, args: argparse.Namespace, vault_root: Path) -> dict[str, Any]:
+    command = [
+        sys.executable,
+        "-m",
+        "benchmarks.bench_tools",
+        "--single",
+        str(notes),
+        "--iterations",
+        str(args.iterations),
+        "--warmup",
+        str(args.warmup),
+        "--vault-dir",
+        str(vault_root),
+        "--storage",
+        args.storage,
+    ]
+    completed = subprocess.run(command, check=True, stdout=subprocess.PIPE, text=True)
+    result: dict[str, Any] = json.loads(completed.stdout)
+    return result
+
+
+def _print_report(results: list[dict[str, Any]], baseline: dict[int, Any] | None) -> None:
+    for size in results:
+        print(
+            f"\n{size['notes']} notes: load {size['load_seconds']}s "
+            f"(from cache {size.get('cached_load_seconds', '-')}s), "
+            f"peak RSS {size['peak_rss_bytes'] / 2**20:.1f} MiB"
+        )
+        print(f"  {'scenario':34} {'p50 us':>10} {'p95 us':>10} {'p99 us':>10} {'sys/call':>9}")
+        before = (baseline or {}).get(size["notes"], {}).get("tools", {})
+        for scenario, measured in size["tools"].items():
+            latency = measured["latency"]
+            if isinstance(latency, LatencySummary):
+                latency = latency.__dict__
+            line = (
+                f"  {scenario:34} {latency['p50_us']:>10} {latency['p95_us']:>10} "
+                f"{latency['p99_us']:>10} {measured['syscalls_per_call']!s:>9}"
+            )
+            if scenario in before:
+                ratio = latency["p50_us"] / max(before[scenario]["latency"]["p50_us"], 0.1)
+                line += f"  p50 x{ratio:.2f} vs baseline"
+            print(line)
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        default=",".join(str(s) for s in DEFAULT_SIZES),
+        help="Comma-separated note counts (default: %(default)s)",
+    )
+    parser.add_argument("--iterations", type=int, default=200, help="Timed calls per scenario")
+    parser.add_argument("--warmup", type=int, default=20, help="Untimed calls per scenario")
+    parser.add_argument(
+        "--vault-dir",
+        type=Path,
+        help="Keep generated vaults here and reuse them on later runs (default: a temp dir)",
+    )
+    parser.add_argument(
+        "--storage",
+        choices=("filesystem", "sqlite"),
+        default="filesystem",
+        help="Storage engine the tools read from (default: %(default)s)",
+    )
+    parser.add_argument("--output", type=Path, help="Write results to this JSON file")
+    parser.add_argument("--compare", type=Path, help="Earlier results file to compare against")
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if args.single is not None:
+        result = asyncio.run(
+            run_size(args.single, args.iterations, args.warmup, args.vault_dir, args.storage)
+        )
+        json.dump(result, sys.stdout, default=lambda value: value.__dict__)
+        return
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    with tempfile.TemporaryDirectory(prefix="campaign-bench-") as tmp_dir:
+        vault_root = args.vault_dir or Path(tmp_dir)
+        vault_root.mkdir(parents=True, exist_ok=True)
+        results = [_run_in_child(notes, args, vault_root) for notes in sizes]
+
+    baseline = None
+    if args.compare is not None:
+        previous = json.loads(args.compare.read_text())["results"]
+        baseline = {size["notes"]: size for size in previous}
+    _print_report(results, baseline)
+    if args.output is not None:
+        write_results(args.output, "tools", results)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,134 @@
+"""Character-directory walk: the single-pass scandir walker against the old rglob one.
+
+Builds a deep characters tree (nested organizations, ``--files`` notes in
+total) with the clutter a real Obsidian vault carries: ``.obsidian`` and
+``.trash`` folders and a ``.git`` object store.  Each implementation then
+lists every character in it, and the benchmark reports the wall time and
+how many characters each found.  "scandir, first" times how long the
+walker takes to yield its first character::
+
+    python -m benchmarks.bench_walk --files 50000 --depth 6 --fanout 3
+"""
+
+import argparse
+import logging
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+import main
+from benchmarks.common import summarize, write_results
+
+
+def legacy_get_all_characters(characters_dir: Path) -> list[dict[str, str]]:
+    """``get_all_characters`` as it was before the scandir walker, for comparison."""
+    if not characters_dir.exists():
+        return []
+    characters = []
+    for subdir in characters_dir.rglob("*"):
+        if subdir.is_dir():
+            organization = str(subdir.relative_to(characters_dir))
+            for file_path in subdir.glob("*.md"):
+                if file_path.name.startswith("__"):
+                    continue
+                characters.append({"name": file_path.stem, "organization": organization})
+    return sorted(characters, key=lambda x: (x["organization"], x["name"]))
+
+
+def _first_character(characters_dir: Path) -> list[dict[str, str]]:
+    """Stop at the first character :func:`main.iter_characters` yields."""
+    return [next(main.iter_characters(characters_dir))]
+
+
+IMPLEMENTATIONS: dict[str, Callable[[Path], list[dict[str, str]]]] = {
+    "rglob (before)": legacy_get_all_characters,
+    "scandir": main.get_all_characters,
+    "scandir, first": _first_character,
+}
+
+
+def generate_tree(root: Path, files: int, depth: int, fanout: int, clutter: int) -> None:
+    """Spread *files* notes over a *fanout*-ary organization tree *depth* levels deep.
+
+    *clutter* files go into hidden folders: a third as markdown in
+    ``.trash`` and ``.obsidian``, the rest as a ``.git`` object store.
+    """
+    directories = [root]
+    level = [root]
+    for _ in range(depth):
+        level = [parent / f"org {i}" for parent in level for i in range(fanout)]
+        directories.extend(level)
+    for directory in directories:
+        directory.mkdir(parents=True, exist_ok=True)
+    notes = directories[1:]
+    for i in range(files):
+        (notes[i % len(notes)] / f"Character {i}.md").write_text(f"Character {i}\n")
+
+    trash = root / ".trash"
+    plugins = root / ".obsidian" / "plugins"
+    trash.mkdir()
+    plugins.mkdir(parents=True)
+    markdown = clutter // 3
+    for i in range(markdown):
+        folder = trash if i % 2 else plugins
+        (folder / f"Deleted {i}.md").write_text("Deleted\n")
+    for i in range(clutter - markdown):
+        objects = root / ".git" / "objects" / f"{i % 256:02x}"
+        objects.mkdir(parents=True, exist_ok=True)
+        (objects / f"{i:038x}").write_bytes(b"x")
+
+
+def run(files: int, depth: int, fanout: int, clutter: int, iterations: int) -> list[dict[str, Any]]:
+    results = []
+    with tempfile.TemporaryDirectory(prefix="campaign-bench-") as tmp_dir:
+        root = Path(tmp_dir) / "Characters"
+        started = time.monotonic()
+        generate_tree(root, files, depth, fanout, clutter)
+        logging.info("Generated the tree in %.1fs", time.monotonic() - started)
+        for label, walk in IMPLEMENTATIONS.items():
+            walk(root)  # Warm the dentry cache the same way for every implementation
+            samples = []
+            found: list[dict[str, str]] = []
+            for _ in range(iterations):
+                started_ns = time.perf_counter_ns()
+                found = walk(root)
+                samples.append(time.perf_counter_ns() - started_ns)
+            results.append(
+                {
+                    "implementation": label,
+                    "characters": len(found),
+                    "latency": summarize(samples),
+                }
+            )
+    return results
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=50_000, help="Character notes in the tree")
+    parser.add_argument("--depth", type=int, default=6, help="Levels of nested organizations")
+    parser.add_argument("--fanout", type=int, default=3, help="Suborganizations per organization")
+    parser.add_argument(
+        "--clutter", type=int, default=6000, help="Files in .git, .trash and .obsidian"
+    )
+    parser.add_argument("--iterations", type=int, default=5, help="Timed walks per implementation")
+    parser.add_argument("--output", type=Path, help="Write results to this JSON file")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.INFO)
+
+    results = run(args.files, args.depth, args.fanout, args.clutter, args.iterations)
+    print(f"  {'implementation':<16} {'characters':>10} {'p50 ms':>9} {'max ms':>9}")
+    for row in results:
+        latency = row["latency"]
+        print(
+            f"  {row['implementation']:<16} {row['characters']:>10}"
+            f" {latency.p50_us / 1000:>9.1f} {latency.max_us / 1000:>9.1f}"
+        )
+    if args.output is not None:
+        write_results(args.output, "walk", results)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,97 @@
+"""Measurement helpers shared by the benchmark scripts."""
+
+import json
+import math
+import os
+import platform
+import resource
+import sys
+import time
+from collections.abc import Sequence
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any
+
+
+@dataclass(frozen=True)
+class LatencySummary:
+    """Latency percentiles of one benchmarked operation, in microseconds."""
+
+    calls: int
+    p50_us: float
+    p95_us: float
+    p99_us: float
+    max_us: float
+    mean_us: float
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted, non-empty sequence."""
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples_ns: Sequence[int]) -> LatencySummary:
+    """Summarize per-call durations measured with :func:`time.perf_counter_ns`."""
+    values = sorted(ns / 1000 for ns in samples_ns)
+    return LatencySummary(
+        calls=len(values),
+        p50_us=round(percentile(values, 0.50), 1),
+        p95_us=round(percentile(values, 0.95), 1),
+        p99_us=round(percentile(values, 0.99), 1),
+        max_us=round(values[-1], 1),
+        mean_us=round(sum(values) / len(values), 1),
+    )
+
+
+def peak_rss_bytes() -> int:
+    """Peak resident set size of this process so far."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def current_rss_bytes() -> int | None:
+    """Current resident set size, where the platform exposes it cheaply."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return None
+
+
+def io_syscalls() -> int | None:
+    """Read and write syscalls issued by this process so far (Linux only).
+
+    Comes from ``syscr``/``syscw`` in ``/proc/self/io``, which count every
+    read-like and write-like system call, including ``getdents`` and
+    ``pread``.  Returns None where that file is unavailable.
+    """
+    try:
+        with open("/proc/self/io") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+    except OSError:
+        return None
+    return int(fields["syscr"]) + int(fields["syscw"])
+
+
+def environment() -> dict[str, Any]:
+    """Machine details recorded with every result file."""
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def write_results(path: Path, benchmark: str, results: Any) -> None:
+    """Save *results* as JSON alongside the environment they were measured in."""
+    payload = {"benchmark": benchmark, "environment": environment(), "results": results}
+    path.write_text(json.dumps(payload, indent=2, default=_to_json) + "\n")
+
+
+def _to_json(value: Any) -> Any:
+    if hasattr(value, "__dataclass_fields__"):
+        return asdict(value)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
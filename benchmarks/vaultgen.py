@@ -0,0 +1,211 @@
+"""Deterministic generator for synthetic campaign vaults.
+
+The same :class:`VaultSpec` always produces byte-identical files, so runs on
+different machines or commits measure the same workload::
+
+    python -m benchmarks.vaultgen /tmp/vault --notes 10000
+"""
+
+import argparse
+import math
+import random
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Any
+
+_FIRST_NAMES = (
+    "Adrian Beatrix Cassius Delphine Elias Fiona Gideon Helena Ignatius Juno Kasimir Lucia "
+    "Magnus Nadia Octavian Petra Quentin Rosalind Silas Theodora Ulric Valeria Wilhelm Xenia "
+    "Yusuf Zora Anselm Brigid Corvin Dagny Emeric Freya Gaspard Hester Isolde Jasper"
+).split()
+_LAST_NAMES = (
+    "Ashford Blackwood Crane Dumont Everly Falk Grimaldi Harrow Ives Jessup Kovac Lindqvist "
+    "Moreau Novak Orsini Pryce Quill Ravenscroft Sorel Thorne Underhill Vance Whitlock York "
+    "Zeller Abernathy Bellamy Castellan Drummond Estrada Fairbanks Galloway Holloway Ingram"
+).split()
+_PLACES = (
+    "Docks Cathedral Warehouse Nightclub Library Cemetery Asylum Gallery Subway Observatory "
+    "Mansion Foundry Chapel Market Theatre Tower Bridge Harbour Tannery Hospital"
+).split()
+_ORGANIZATIONS = (
+    "camarilla anarchs sabbat hecata ministry mortals inquisition ashirra independents "
+    "thin-bloods lasombra tremere nosferatu toreador ventrue brujah gangrel malkavian"
+).split()
+_CLANS = "Brujah Gangrel Malkavian Nosferatu Toreador Tremere Ventrue Lasombra Hecata".split()
+_STATUSES = ("alive", "alive", "alive", "torpor", "destroyed", "missing")
+_WORDS = (
+    "blood night prince court elysium hunger beast masquerade sire childe coterie haven "
+    "domain feeding herd ghoul kine torpor diablerie boon prestation harpy sheriff keeper "
+    "scourge primogen seneschal anarch baron rant city street rain neon shadow whisper "
+    "ledger debt oath betrayal ritual candle chapel crypt river harbour smuggler ship "
+    "warehouse contract favour rival ally secret letter portrait mirror ash ember dawn"
+).split()
+
+# Sections every generated location or character note carries
+_SECTIONS = ("Haven", "Touchstones", "Secrets", "Notes")
+
+
+@dataclass(frozen=True)
+class VaultSpec:
+    """Shape of a generated vault."""
+
+    locations: int
+    organizations: int
+    characters: int
+    nesting_depth: int = 2
+    note_bytes: int = 2048
+    link_density: float = 3.0
+    sessions: int = 60
+    seed: int = 1
+
+    @classmethod
+    def for_notes(cls, notes: int, **overrides: Any) -> "VaultSpec":
+        """A realistic mix for a vault of about *notes* location and character notes."""
+        locations = max(1, notes // 10)
+        characters = max(1, notes - locations)
+        organizations = max(1, min(characters, round(math.sqrt(characters) / 2)))
+        spec = cls(locations=locations, organizations=organizations, characters=characters)
+        return replace(spec, **overrides)
+
+
+@dataclass
+class GeneratedVault:
+    """Paths and note names of a generated vault."""
+
+    locations_dir: Path
+    characters_dir: Path
+    sessions_dir: Path
+    locations: list[str] = field(default_factory=list)
+    characters: list[tuple[str, str]] = field(default_factory=list)
+    organizations: list[str] = field(default_factory=list)
+
+    @property
+    def notes(self) -> int:
+        return len(self.locations) + len(self.characters)
+
+
+def _unique_names(rng: random.Random, count: int, *parts: list[str]) -> list[str]:
+    names: list[str] = []
+    seen: set[str] = set()
+    for i in range(count):
+        name = " ".join(rng.choice(part) for part in parts)
+        if name in seen:
+            name = f"{name} {i}"
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+def _organization_paths(rng: random.Random, spec: VaultSpec) -> list[str]:
+    paths: list[str] = []
+    for i in range(spec.organizations):
+        depth = 1 + i % max(1, spec.nesting_depth)
+        parts = [_ORGANIZATIONS[i % len(_ORGANIZATIONS)]]
+        if i >= len(_ORGANIZATIONS):
+            parts[0] += f"-{i // len(_ORGANIZATIONS)}"
+        parts.extend(f"cell {rng.randint(1, 9)}" for _ in range(depth - 1))
+        paths.append("/".join(parts))
+    return paths
+
+
+def _body(rng: random.Random, size: int, link_targets: list[str], density: float) -> str:
+    """Prose of about *size* bytes split over the standard sections."""
+    links = [
+        f"[[{rng.choice(link_targets)}]]"
+        for _ in range(min(len(link_targets), round(rng.uniform(0, 2 * density))))
+    ]
+    per_section = max(1, size // len(_SECTIONS))
+    out: list[str] = []
+    for section in _SECTIONS:
+        out.append(f"## {section}\n\n")
+        written = 0
+        line: list[str] = []
+        while written < per_section:
+            word = links.pop() if links and rng.random() < 0.05 else rng.choice(_WORDS)
+            line.append(word)
+            written += len(word) + 1
+            if len(line) == 12:
+                out.append(" ".join(line) + ".\n")
+                line = []
+        if line:
+            out.append(" ".join(line) + ".\n")
+        out.append("\n")
+    if links:
+        out.append("See also " + ", ".join(links) + ".\n")
+    return "".join(out)
+
+
+def generate_vault(root: Path, spec: VaultSpec) -> GeneratedVault:
+    """Write a vault shaped by *spec* under *root* (which must be empty or missing)."""
+    rng = random.Random(spec.seed)
+    vault = GeneratedVault(root / "Locations", root / "Characters", root / "sessions")
+    for directory in (vault.locations_dir, vault.characters_dir, vault.sessions_dir):
+        directory.mkdir(parents=True)
+
+    vault.organizations = _organization_paths(rng, spec)
+    vault.locations = _unique_names(rng, spec.locations, _LAST_NAMES, _PLACES)
+    character_names = _unique_names(rng, spec.characters, _FIRST_NAMES, _LAST_NAMES)
+    vault.characters = [
+        (name, vault.organizations[i % len(vault.organizations)])
+        for i, name in enumerate(character_names)
+    ]
+    link_targets = vault.locations + character_names
+
+    for organization in vault.organizations:
+        (vault.characters_dir / organization).mkdir(parents=True, exist_ok=True)
+    for name in vault.locations:
+        frontmatter = f"district: {rng.choice(_LAST_NAMES)}\nsafety: {rng.randint(1, 5)}\n"
+        body = _body(rng, spec.note_bytes, link_targets, spec.link_density)
+        text = f"---\n{frontmatter}---\n# {name}\n\n{body}"
+        (vault.locations_dir / f"{name}.md").write_text(text, encoding="utf-8")
+    for name, organization in vault.characters:
+        frontmatter = (
+            f"clan: {rng.choice(_CLANS)}\ngeneration: {rng.randint(6, 14)}\n"
+            f"status: {rng.choice(_STATUSES)}\ntags: [{organization.split('/')[0]}]\n"
+        )
+        body = _body(rng, spec.note_bytes, link_targets, spec.link_density)
+        text = f"---\n{frontmatter}---\n# {name}\n\n{body}"
+        (vault.characters_dir / organization / f"{name}.md").write_text(text, encoding="utf-8")
+
+    chronicle = ["# Chronicle\n\n"]
+    for number in range(1, spec.sessions + 1):
+        title = f"Session {number} - {rng.choice(vault.locations)}"
+        body = _body(rng, spec.note_bytes * 2, link_targets, spec.link_density)
+        chronicle.append(f"## {title}\n\n{body.replace('## ', '### ')}")
+        (vault.sessions_dir / f"Session {number}.md").write_text(
+            f"# {title}\n\n{body}", encoding="utf-8"
+        )
+    (vault.sessions_dir / "__result.md").write_text("".join(chronicle), encoding="utf-8")
+    return vault
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("root", type=Path, help="Directory to create the vault in")
+    parser.add_argument("--notes", type=int, default=1000, help="Location and character notes")
+    parser.add_argument("--organizations", type=int, help="Override the organization count")
+    parser.add_argument("--nesting-depth", type=int, default=2)
+    parser.add_argument("--note-bytes", type=int, default=2048)
+    parser.add_argument("--link-density", type=float, default=3.0, help="Mean links per note")
+    parser.add_argument("--sessions", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    overrides: dict[str, Any] = {
+        "nesting_depth": args.nesting_depth,
+        "note_bytes": args.note_bytes,
+        "link_density": args.link_density,
+        "sessions": args.sessions,
+        "seed": args.seed,
+    }
+    if args.organizations is not None:
+        overrides["organizations"] = args.organizations
+    vault = generate_vault(args.root, VaultSpec.for_notes(args.notes, **overrides))
+    print(
+        f"Wrote {len(vault.locations)} locations, {len(vault.characters)} characters in "
+        f"{len(vault.organizations)} organizations and {args.sessions} sessions to {args.root}"
+    )
+
+
+if __name__ == "__main__":
+    main()
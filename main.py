@@ -18,25 +18,98 @@ HTTP-mode additional variables
 -------------------------------
 MCP_API_KEY      Bearer token clients must supply (required, minimum 32 chars).
                  Generate one: python3 -c "import secrets; print(secrets.token_hex(32))"
+MCP_API_KEYS     Extra named keys, rate-limited separately: name=key,name=key
+                 (MCP_API_KEY may then be left unset)
+MCP_RATE_LIMIT   Rate-limit units per minute per client IP (default: 60)
+MCP_KEY_RATE_LIMIT
+                 Rate-limit units per minute per API key (default: 120)
+MCP_TOOL_COSTS   Per-tool unit overrides: tool=weight,tool=weight
+MCP_RESPONSE_BYTES_PER_UNIT
+                 Charge one extra unit per this many response bytes (default: 0, off)
+MCP_WORKERS      HTTP worker processes (default: 1).  Above 1, this process indexes
+                 the vault and publishes snapshots that each worker loads
+MCP_SNAPSHOT_DIR Where multi-worker mode keeps its snapshot (default: a temp dir)
+MCP_COMPRESSION_LEVEL
+                 gzip/deflate level for responses, 1-9, or 0 for none (default: 1)
+MCP_COMPRESSION_MIN_BYTES
+                 Smallest response that is compressed (default: 1024)
 MCP_HOST         Bind address (default: 0.0.0.0)
 MCP_PORT         Listen port   (default: 8000)
+
+Optional variables
+------------------
+MCP_WATCH        How vault changes are picked up: auto (default; inotify on Linux,
+                 polling elsewhere), inotify, poll, or off (revalidate per request;
+                 notes edited in place are seen within WATCH_POLL_INTERVAL)
+MCP_IO_WORKERS   Threads in the pool that runs blocking vault reads (default: 8)
+MCP_IO_MAX_CONCURRENT
+                 Maximum vault operations in flight at once (default: MCP_IO_WORKERS)
+MCP_CONTENT_CACHE_BYTES
+                 Byte budget of the note content cache (default: 32 MiB)
+MCP_METRICS_TOKEN
+                 Bearer token for GET /metrics in HTTP mode, minimum 32 chars
+                 (unset: no /metrics endpoint)
+MCP_CACHE_DIR    Where the vault index is kept between runs (default:
+                 $XDG_CACHE_HOME/local-campaign-mcp-obsidian), or off
+MCP_STORAGE      Where the listing, lookup, search, query and link tools read from:
+                 filesystem (default) or sqlite
+MCP_SQLITE_PATH  Database file for MCP_STORAGE=sqlite (default: next to the index cache)
+MCP_IGNORE_DIRS  Comma-separated directory names never scanned, in addition to hidden
+                 directories such as .obsidian, .trash and .git
 """
 
 import asyncio
+import base64
+import bisect
 import collections
 import contextlib
+import ctypes
+import ctypes.util
+import functools
+import gc
+import hashlib
+import heapq
 import hmac
+import itertools
 import json
 import logging
+import marshal
+import math
+import mmap
 import os
 import random
+import re
+import select
+import shutil
+import signal
+import socket
+import sqlite3
+import stat
+import struct
 import sys
+import tempfile
+import threading
 import time
-from collections.abc import AsyncIterator, Awaitable, Callable, MutableMapping
-from dataclasses import dataclass
+import weakref
+import zlib
+from array import array
+from collections.abc import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Container,
+    Iterable,
+    Iterator,
+    Mapping,
+    MutableMapping,
+    Sequence,
+)
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from enum import Enum
+from errno import ENOENT, ENOTDIR
 from pathlib import Path
-from typing import Any
+from typing import Any, Protocol, TypeVar
 
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
@@ -308,10 +381,412 @@ def get_sessions_directory() -> Path:
     return path
 
 
+def _int_from_env(name: str, default: int, minimum: int = 1) -> int:
+    """Read an optional integer setting from the environment.
+
+    Raises:
+        SystemExit: If the variable is set but is not an integer >= *minimum*
+    """
+    raw = os.environ.get(name, "").strip()
+    if not raw:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        value = minimum - 1
+    if value < minimum:
+        print(f"Error: {name} must be an integer >= {minimum}, got {raw!r}", file=sys.stderr)
+        sys.exit(1)
+    return value
+
+
+def ignored_dirs_from_env() -> frozenset[str]:
+    """Read ``MCP_IGNORE_DIRS``, the directory names vault walks skip besides hidden ones.
+
+    Raises:
+        SystemExit: If an entry is a path rather than a single directory name
+    """
+    names = set()
+    for raw in os.environ.get("MCP_IGNORE_DIRS", "").split(","):
+        name = raw.strip()
+        if not name:
+            continue
+        if "/" in name or "\\" in name or name in (".", ".."):
+            print(
+                f"Error: MCP_IGNORE_DIRS entries must be directory names, got {name!r}",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+        names.add(name)
+    return frozenset(names)
+
+
+# ---------------------------------------------------------------------------
+# Note content cache
+# ---------------------------------------------------------------------------
+
+# Default for MCP_CONTENT_CACHE_BYTES
+DEFAULT_CONTENT_CACHE_BYTES = 32 * 1024 * 1024
+
+# Upper bound on notes whose content hash is remembered (about 150 bytes each)
+DIGEST_CACHE_ENTRIES = 100_000
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    """Point-in-time counters for a :class:`ContentCache`."""
+
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    bytes: int
+    max_bytes: int
+
+
+def content_digest(text: str) -> str:
+    """Return the hash that identifies one version of a note's content."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class ContentCache:
+    """LRU cache of note contents, bounded by the total size of the cached files.
+
+    Entries are keyed by resolved path and validated against the file's
+    ``(mtime_ns, size)`` on every lookup, so a hit costs one ``stat`` and an
+    edited file is re-read automatically.  Files larger than the whole budget
+    are never cached.
+
+    Every read also records the content's :func:`content_digest` next to the
+    file's ``(mtime_ns, size)``.  Digests are far smaller than contents, so
+    they are kept in a separate, longer LRU and usually outlive the text they
+    were computed from.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_CONTENT_CACHE_BYTES,
+        max_digests: int = DIGEST_CACHE_ENTRIES,
+    ) -> None:
+        self._max_bytes = max_bytes
+        self._max_digests = max_digests
+        self._lock = threading.Lock()
+        self._entries: collections.OrderedDict[Path, tuple[int, int, str]] = (
+            collections.OrderedDict()
+        )
+        self._digests: collections.OrderedDict[Path, tuple[int, int, str]] = (
+            collections.OrderedDict()
+        )
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def read(self, path: Path) -> str:
+        """Return the UTF-8 content of *path*, from the cache when it is current.
+
+        Raises:
+            FileNotFoundError: If *path* does not exist
+        """
+        st = os.stat(path)
+        with self._lock:
+            cached = self._entries.get(path)
+            if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+                self._entries.move_to_end(path)
+                self._hits += 1
+                return cached[2]
+            self._misses += 1
+        return self._load(path, st)[0]
+
+    def digest(self, path: Path) -> str:
+        """Return the :func:`content_digest` of *path*, reading it only if it changed.
+
+        When this version of the file has been read before, this costs one
+        ``stat`` and no read.
+
+        Raises:
+            FileNotFoundError: If *path* does not exist
+        """
+        st = os.stat(path)
+        with self._lock:
+            cached = self._digests.get(path)
+            if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+                self._digests.move_to_end(path)
+                return cached[2]
+        return self._load(path, st)[1]
+
+    def _load(self, path: Path, st: os.stat_result) -> tuple[str, str]:
+        text = path.read_text(encoding="utf-8")
+        digest = content_digest(text)
+        self._store(path, st.st_mtime_ns, st.st_size, text, digest)
+        return text, digest
+
+    def _store(self, path: Path, mtime_ns: int, size: int, text: str, digest: str) -> None:
+        with self._lock:
+            self._digests[path] = (mtime_ns, size, digest)
+            self._digests.move_to_end(path)
+            while len(self._digests) > self._max_digests:
+                self._digests.popitem(last=False)
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self._bytes -= old[1]
+            if size > self._max_bytes:
+                return
+            self._entries[path] = (mtime_ns, size, text)
+            self._bytes += size
+            while self._bytes > self._max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._evictions += 1
+
+    def invalidate(self, path: Path) -> None:
+        """Drop any cached content and digest for *path*."""
+        with self._lock:
+            self._digests.pop(path, None)
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self._bytes -= old[1]
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                entries=len(self._entries),
+                bytes=self._bytes,
+                max_bytes=self._max_bytes,
+            )
+
+
+# Shared by get_location_details and get_character_details (resized in main)
+_content_cache = ContentCache()
+
+
+# ---------------------------------------------------------------------------
+# Note outlines
+# ---------------------------------------------------------------------------
+
+# Line starts that matter to the outline: code fences and ATX headings
+_OUTLINE_LINE_RE = re.compile(rb"^(?:```|~~~|#{1,6}[ \t])", re.MULTILINE)
+
+# Optional closing sequence of an ATX heading ("## Title ##")
+_CLOSING_HASHES_RE = re.compile(r"[ \t]+#+$")
+
+# Upper bound on files whose outline is kept in memory
+OUTLINE_CACHE_ENTRIES = 4096
+
+
+@dataclass(frozen=True)
+class Section:
+    """A heading and the bytes it covers, up to the next heading of the same or higher level."""
+
+    level: int
+    title: str
+    start: int
+    end: int
+
+
+@dataclass(frozen=True)
+class Outline:
+    """Every heading of a markdown file, in document order, with byte offsets."""
+
+    sections: tuple[Section, ...]
+    size: int
+
+    def top_level(self) -> list[Section]:
+        """Return the sections a reader would call chapters.
+
+        That is the shallowest heading level used more than once, so a single
+        ``# Title`` heading above ``## Session N`` headings is looked through.
+        """
+        counts = collections.Counter(s.level for s in self.sections)
+        repeated = [level for level, count in counts.items() if count > 1]
+        if not counts:
+            return []
+        level = min(repeated) if repeated else min(counts)
+        return [s for s in self.sections if s.level == level]
+
+    def find(self, title: str) -> list[Section]:
+        """Return the sections titled *title*, or failing that, whose title starts with it.
+
+        Matching is case-insensitive.
+        """
+        wanted = title.strip().casefold()
+        exact = [s for s in self.sections if s.title.casefold() == wanted]
+        if exact or not wanted:
+            return exact
+        return [s for s in self.sections if s.title.casefold().startswith(wanted)]
+
+    def select(self, titles: Iterable[str]) -> list[Section]:
+        """Return the sections matching any of *titles*, in document order.
+
+        A section nested inside another selected section is not repeated.
+
+        Raises:
+            ValueError: If a title matches no heading
+        """
+        chosen: set[Section] = set()
+        missing: list[str] = []
+        for title in titles:
+            found = self.find(title)
+            if not found:
+                missing.append(title)
+            chosen.update(found)
+        if missing:
+            available = ", ".join(s.title for s in self.sections) or "none"
+            raise ValueError(
+                f"Section(s) not found: {', '.join(missing)}. Available sections: {available}"
+            )
+        selected: list[Section] = []
+        for section in sorted(chosen, key=lambda s: (s.start, -s.end)):
+            if selected and section.end <= selected[-1].end:
+                continue
+            selected.append(section)
+        return selected
+
+    def last(self, count: int) -> list[Section]:
+        """Return the last *count* top-level sections."""
+        return self.top_level()[-count:] if count > 0 else []
+
+    def since(self, title: str) -> Section | None:
+        """Return everything from the first heading matching *title* to the end of the file."""
+        matches = self.find(title)
+        if not matches:
+            return None
+        first = matches[0]
+        return Section(first.level, first.title, first.start, self.size)
+
+
+def _frontmatter_end(data: bytes | mmap.mmap) -> int:
+    """Return the offset just past a leading ``---`` frontmatter block, or 0."""
+    if not (data[:4] == b"---\n" or data[:5] == b"---\r\n"):
+        return 0
+    closing = re.compile(rb"^---[ \t]*\r?$", re.MULTILINE).search(data, 4)
+    if closing is None:
+        return 0
+    newline = data.find(b"\n", closing.end())
+    return len(data) if newline == -1 else newline + 1
+
+
+def parse_outline(data: bytes | mmap.mmap) -> Outline:
+    """Index the ATX headings of a markdown file without decoding its body.
+
+    Headings inside fenced code blocks and YAML frontmatter are ignored.  Each
+    section ends where the next heading of the same or a higher level starts.
+    """
+    size = len(data)
+    headings: list[tuple[int, str, int]] = []
+    fence: bytes | None = None
+    for match in _OUTLINE_LINE_RE.finditer(data, _frontmatter_end(data)):
+        marker = match.group()
+        if marker in (b"```", b"~~~"):
+            if fence is None:
+                fence = marker
+            elif fence == marker:
+                fence = None
+            continue
+        if fence is not None:
+            continue
+        line_end = data.find(b"\n", match.end())
+        raw = data[match.end() : size if line_end == -1 else line_end]
+        title = _CLOSING_HASHES_RE.sub("", raw.decode("utf-8", errors="replace").strip())
+        headings.append((len(marker) - 1, title.strip(), match.start()))
+
+    sections: list[Section | None] = [None] * len(headings)
+    open_sections: list[int] = []
+    for i, (level, _, start) in enumerate(headings):
+        while open_sections and headings[open_sections[-1]][0] >= level:
+            j = open_sections.pop()
+            sections[j] = Section(headings[j][0], headings[j][1], headings[j][2], start)
+        open_sections.append(i)
+    for j in open_sections:
+        sections[j] = Section(headings[j][0], headings[j][1], headings[j][2], size)
+    return Outline(tuple(s for s in sections if s is not None), size)
+
+
+class OutlineCache:
+    """Per-file heading outlines, parsed once per file version.
+
+    Files are memory-mapped, so building an outline touches only the heading
+    lines and reading a section copies and decodes only that section's bytes.
+    Outlines are validated against ``(mtime_ns, size)`` taken from the open
+    file descriptor, so offsets always match the bytes they are applied to.
+    """
+
+    def __init__(self, max_entries: int = OUTLINE_CACHE_ENTRIES) -> None:
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: collections.OrderedDict[Path, tuple[int, int, Outline]] = (
+            collections.OrderedDict()
+        )
+
+    def read(self, path: Path, pick: Callable[[Outline], Iterable[Section]]) -> list[str]:
+        """Return the text of the sections *pick* selects from the outline of *path*.
+
+        Raises:
+            FileNotFoundError: If *path* does not exist
+        """
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            if st.st_size == 0:
+                return ["" for _ in pick(Outline((), 0))]
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                outline = self._outline(path, st.st_mtime_ns, st.st_size, mm)
+                return [mm[s.start : s.end].decode("utf-8") for s in pick(outline)]
+
+    def _outline(self, path: Path, mtime_ns: int, size: int, mm: mmap.mmap) -> Outline:
+        with self._lock:
+            cached = self._entries.get(path)
+            if cached is not None and cached[0] == mtime_ns and cached[1] == size:
+                self._entries.move_to_end(path)
+                return cached[2]
+        outline = parse_outline(mm)
+        with self._lock:
+            self._entries[path] = (mtime_ns, size, outline)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return outline
+
+    def invalidate(self, path: Path) -> None:
+        """Drop any cached outline for *path*."""
+        with self._lock:
+            self._entries.pop(path, None)
+
+
+# Shared by the section-addressed reads in the data-access layer
+_outline_cache = OutlineCache()
+
+
+def read_note_sections(path: Path, titles: Iterable[str]) -> str:
+    """Return only the sections of *path* whose headings match *titles*.
+
+    Raises:
+        ValueError: If a title matches no heading in the file
+        FileNotFoundError: If *path* does not exist
+    """
+    wanted = list(titles)
+    texts = _outline_cache.read(path, lambda outline: outline.select(wanted))
+    return "\n\n".join(text.rstrip() for text in texts)
+
+
 # ---------------------------------------------------------------------------
 # Data-access layer
 # ---------------------------------------------------------------------------
 
+# Directory names every vault walk skips besides hidden ones (set from MCP_IGNORE_DIRS)
+_ignored_dirs: frozenset[str] = frozenset()
+
+
+def _is_ignored_dir(name: str) -> bool:
+    """Whether vault walks skip, and never descend into, a directory called *name*.
+
+    Hidden directories (``.obsidian``, ``.trash``, ``.git``, ...) are always
+    skipped, as are the names listed in ``MCP_IGNORE_DIRS``.
+    """
+    return name.startswith(".") or name in _ignored_dirs
+
 
 def get_all_locations(locations_dir: Path) -> list[str]:
     """Get a list of all location names from the Locations directory.
@@ -332,27 +807,65 @@ def get_all_locations(locations_dir: Path) -> list[str]:
     return sorted(locations)
 
 
-def get_location_details(location_name: str, locations_dir: Path) -> str:
+def location_path(location_name: str, locations_dir: Path) -> Path:
+    """Return the file of the location called *location_name*.
+
+    Raises:
+        ValueError: If location_name contains path-traversal sequences
+    """
+    _validate_flat_name(location_name, "location name")
+    return _safe_join(locations_dir, f"{location_name}.md")
+
+
+def character_path(character_name: str, organization: str, characters_dir: Path) -> Path:
+    """Return the file of the character *character_name* in *organization*.
+
+    Raises:
+        ValueError: If character_name or organization contain path-traversal
+            sequences
+    """
+    _validate_flat_name(character_name, "character name")
+    _validate_nested_name(organization, "organization")
+    return _safe_join(characters_dir, organization, f"{character_name}.md")
+
+
+def note_digest(path: Path) -> str | None:
+    """Return the content hash of the note at *path*, or None if it does not exist.
+
+    Served from the content cache: unless the file changed since it was last
+    read, this costs a ``stat`` and no read.
+    """
+    try:
+        return _content_cache.digest(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+
+def get_location_details(
+    location_name: str, locations_dir: Path, sections: list[str] | None = None
+) -> str:
     """Get the full markdown content of a specific location.
 
     Args:
         location_name: Name of the location (without .md extension)
         locations_dir: Path to the directory containing location markdown files
+        sections: If given, return only the sections under these headings
 
     Returns:
         The markdown content of the location file
 
     Raises:
-        ValueError: If location_name contains path-traversal sequences
+        ValueError: If location_name contains path-traversal sequences or a
+            requested section doesn't exist
         FileNotFoundError: If the location file doesn't exist
     """
-    _validate_flat_name(location_name, "location name")
-    file_path = _safe_join(locations_dir, f"{location_name}.md")
-
-    if not file_path.exists():
-        raise FileNotFoundError(f"Location '{location_name}' not found")
-
-    return file_path.read_text(encoding="utf-8")
+    file_path = location_path(location_name, locations_dir)
+    try:
+        if sections:
+            return read_note_sections(file_path, sections)
+        return _content_cache.read(file_path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise FileNotFoundError(f"Location '{location_name}' not found") from None
 
 
 def get_all_characters(characters_dir: Path) -> list[dict[str, str]]:
@@ -364,372 +877,4630 @@ def get_all_characters(characters_dir: Path) -> list[dict[str, str]]:
     Returns:
         List of dictionaries with 'name' and 'organization' keys, sorted by organization then name
     """
-    if not characters_dir.exists():
-        return []
+    return sorted(iter_characters(characters_dir), key=lambda x: (x["organization"], x["name"]))
 
-    characters = []
 
-    # Recursively walk through all subdirectories
-    for subdir in characters_dir.rglob("*"):
-        if subdir.is_dir():
-            # Get the relative path from characters_dir to determine organization
-            rel_path = subdir.relative_to(characters_dir)
-            organization = str(rel_path)
+def iter_characters(characters_dir: Path) -> Iterator[dict[str, str]]:
+    """Yield every character under *characters_dir* as it is found, in no particular order.
 
-            # Find all .md files in this directory
-            for file_path in subdir.glob("*.md"):
-                # Skip files starting with __
-                if file_path.name.startswith("__"):
+    The tree is walked once, iteratively, with :func:`os.scandir`: every
+    directory is listed a single time, entry types come from the listing
+    rather than a ``stat`` per entry, and hidden or ignored directories (see
+    :func:`_is_ignored_dir`) are pruned before they are descended into.
+    Symlinked directories are not followed, and files directly in
+    *characters_dir* belong to no organization and are skipped.
+    """
+    pending = [(os.fspath(characters_dir), "")]
+    while pending:
+        directory, organization = pending.pop()
+        try:
+            scanner = os.scandir(directory)
+        except OSError:
+            continue
+        with scanner:
+            for entry in scanner:
+                name = entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not _is_ignored_dir(name):
+                            child = f"{organization}/{name}" if organization else name
+                            pending.append((entry.path, child))
+                        continue
+                    if (
+                        not organization
+                        or not _is_note_name(name, NoteKind.CHARACTER)
+                        or not entry.is_file()
+                    ):
+                        continue
+                except OSError:
                     continue
+                yield {"name": name[:-3], "organization": organization}
 
-                characters.append(
-                    {
-                        "name": file_path.stem,
-                        "organization": organization,
-                    }
-                )
-
-    # Sort by organization first, then by name
-    return sorted(characters, key=lambda x: (x["organization"], x["name"]))
 
-
-def get_character_details(character_name: str, organization: str, characters_dir: Path) -> str:
+def get_character_details(
+    character_name: str,
+    organization: str,
+    characters_dir: Path,
+    sections: list[str] | None = None,
+) -> str:
     """Get the full markdown content of a specific character.
 
     Args:
         character_name: Name of the character (without .md extension)
         organization: Organization/subfolder the character belongs to
         characters_dir: Path to the directory containing character subdirectories
+        sections: If given, return only the sections under these headings
 
     Returns:
         The markdown content of the character file
 
     Raises:
-        ValueError: If character_name or organization contain path-traversal sequences
+        ValueError: If character_name or organization contain path-traversal
+            sequences or a requested section doesn't exist
         FileNotFoundError: If the character file doesn't exist
     """
-    _validate_flat_name(character_name, "character name")
-    _validate_nested_name(organization, "organization")
-    file_path = _safe_join(characters_dir, organization, f"{character_name}.md")
-
-    if not file_path.exists():
+    file_path = character_path(character_name, organization, characters_dir)
+    try:
+        if sections:
+            return read_note_sections(file_path, sections)
+        return _content_cache.read(file_path)
+    except (FileNotFoundError, NotADirectoryError):
         raise FileNotFoundError(
             f"Character '{character_name}' in organization '{organization}' not found"
-        )
+        ) from None
 
-    return file_path.read_text(encoding="utf-8")
 
-
-def get_story_so_far(sessions_dir: Path) -> str:
+def get_story_so_far(
+    sessions_dir: Path,
+    *,
+    section: str | None = None,
+    last_n_sections: int | None = None,
+    since_heading: str | None = None,
+) -> str:
     """Get the story so far from the __result.md file in the sessions directory.
 
+    With no selector the whole file is returned.  Otherwise only the selected
+    slices are read, through the file's cached heading outline.
+
     Args:
         sessions_dir: Path to the directory containing session notes
+        section: Return the section(s) with this heading (or heading prefix)
+        last_n_sections: Return the last N top-level sections
+        since_heading: Return everything from this heading to the end
 
     Returns:
         The content of the __result.md file containing the story so far
 
     Raises:
+        ValueError: If more than one selector is given or a heading doesn't exist
         FileNotFoundError: If the __result.md file doesn't exist
     """
     file_path = sessions_dir / "__result.md"
+    selectors = [section is not None, last_n_sections is not None, since_heading is not None]
+    if sum(selectors) > 1:
+        raise ValueError("Use only one of 'section', 'last_n_sections' and 'since_heading'")
+
+    def pick(outline: Outline) -> list[Section]:
+        if last_n_sections is not None:
+            return outline.last(last_n_sections)
+        if section is not None:
+            found = outline.find(section)
+        else:
+            assert since_heading is not None
+            start = outline.since(since_heading)
+            found = [start] if start is not None else []
+        if not found:
+            heading = section if section is not None else since_heading
+            available = ", ".join(s.title for s in outline.top_level()) or "none"
+            raise ValueError(f"Heading '{heading}' not found. Top-level headings: {available}")
+        return found
 
-    if not file_path.exists():
-        raise FileNotFoundError(f"Story file '__result.md' not found in {sessions_dir}")
+    try:
+        if not any(selectors):
+            return _content_cache.read(file_path)
+        return "\n\n".join(text.rstrip() for text in _outline_cache.read(file_path, pick))
+    except (FileNotFoundError, NotADirectoryError):
+        raise FileNotFoundError(f"Story file '__result.md' not found in {sessions_dir}") from None
 
-    return file_path.read_text(encoding="utf-8")
 
+# ---------------------------------------------------------------------------
+# Vault index
+# ---------------------------------------------------------------------------
 
-def calculate_victims_resonance(mood: Mood) -> ResonanceResult:
-    """Calculate victims resonance based on the mood.
 
-    Args:
-        mood: The mood type (Choleric, Melancholic, Phlegmatic, or Sanguine)
+class NoteKind(Enum):
+    """The kinds of note tracked by the :class:`VaultIndex`."""
 
-    Returns:
-        ResonanceResult with level and optional dyscrasia
-    """
-    # First roll: 1-10
-    first_roll = random.randint(1, 10)
+    LOCATION = "location"
+    CHARACTER = "character"
+    SESSION = "session"
 
-    if first_roll <= 5:
-        level = ResonanceLevel.NEGLIGIBLE
-    elif first_roll <= 8:
-        level = ResonanceLevel.FLEETING
-    else:
-        # Roll again for Intense or Acute
-        second_roll = random.randint(1, 10)
-        if second_roll <= 8:
-            level = ResonanceLevel.INTENSE
-        else:
-            level = ResonanceLevel.ACUTE
 
-    # Dyscrasia only occurs for Acute level
-    dyscrasia = None
-    if level == ResonanceLevel.ACUTE:
-        dyscrasia = random.choice(DYSCRASIA_OPTIONS[mood])
+@dataclass(frozen=True)
+class NoteEntry:
+    """A markdown note discovered in the vault, with the stat data seen at scan time."""
 
-    return ResonanceResult(level=level, dyscrasia=dyscrasia)
+    kind: NoteKind
+    name: str
+    organization: str
+    path: Path
+    size: int
+    mtime_ns: int
 
 
-# ---------------------------------------------------------------------------
-# MCP server
-# ---------------------------------------------------------------------------
+class ChangeKind(Enum):
+    """How a note changed between two views of the vault."""
 
-# Global directories (initialised in main before the server starts)
-_locations_dir: Path | None = None
-_characters_dir: Path | None = None
-_sessions_dir: Path | None = None
+    ADDED = "added"
+    MODIFIED = "modified"
+    DELETED = "deleted"
 
-# Create the MCP server
-app = Server("rpg-campaign-server")
 
+@dataclass(frozen=True)
+class VaultChange:
+    """A note-level change reported to :class:`VaultIndex` subscribers.
 
-@app.list_tools()
-async def list_tools() -> list[Tool]:
-    """List available tools for the RPG campaign server."""
-    return [
-        Tool(
-            name="list_locations",
-            description="Get a list of all available campaign locations",
-            inputSchema={
-                "type": "object",
-                "properties": {},
-                "required": [],
-            },
-        ),
-        Tool(
-            name="get_location",
-            description="Get detailed information about a specific location by name",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "name": {
-                        "type": "string",
-                        "description": "The name of the location to retrieve",
-                    }
-                },
-                "required": ["name"],
-            },
-        ),
-        Tool(
-            name="list_characters",
-            description="Get a list of all available characters with their organizations",
-            inputSchema={
-                "type": "object",
-                "properties": {},
-                "required": [],
-            },
-        ),
-        Tool(
-            name="get_character",
-            description=(
-                "Get detailed information about a specific character by name and organization"
-            ),
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "name": {
-                        "type": "string",
-                        "description": "The name of the character to retrieve",
-                    },
-                    "organization": {
-                        "type": "string",
-                        "description": "The organization/faction the character belongs to",
-                    },
-                },
-                "required": ["name", "organization"],
-            },
-        ),
-        Tool(
-            name="get_story_so_far",
-            description="Get the story so far from previous session notes",
-            inputSchema={
-                "type": "object",
-                "properties": {},
-                "required": [],
-            },
-        ),
-        Tool(
-            name="victims_resonance",
-            description=(
-                "Roll for victims resonance based on mood type. "
-                "Returns a resonance level (Negligible, Fleeting, Intense, or Acute) "
-                "and potentially a dyscrasia."
-            ),
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "mood": {
-                        "type": "string",
-                        "description": "The mood type of the victim",
-                        "enum": ["Choleric", "Melancholic", "Phlegmatic", "Sanguine"],
-                    }
-                },
-                "required": ["mood"],
-            },
-        ),
-    ]
+    For deletions *entry* is the last entry the index held for the note.
+    """
 
+    kind: ChangeKind
+    entry: NoteEntry
 
-@app.call_tool()
-async def call_tool(name: str, arguments: Any) -> list[TextContent]:
-    """Handle tool calls for the RPG campaign server.
 
-    Args:
-        name: Name of the tool to call
-        arguments: Arguments passed to the tool
+def _scan_markdown_files(
+    directory: Path, kind: NoteKind, organization: str
+) -> tuple[list[NoteEntry], list[Path]]:
+    """List one directory (non-recursively) with a single ``os.scandir`` pass.
 
     Returns:
-        List of text content results
-
-    Raises:
-        ValueError: If the tool name is unknown
-        RuntimeError: If locations directory is not initialized
+        The ``.md`` files in *directory* as :class:`NoteEntry` objects, and the
+        real (non-symlinked) subdirectories found alongside them, leaving out
+        hidden and ignored ones (see :func:`_is_ignored_dir`).  Character
+        files starting with ``__`` are skipped, as in :func:`get_all_characters`.
     """
-    if _locations_dir is None or _characters_dir is None or _sessions_dir is None:
-        raise RuntimeError("Directories not initialized")
-
-    if name == "list_locations":
-        locations = get_all_locations(_locations_dir)
-        if not locations:
-            return [
-                TextContent(
-                    type="text",
-                    text=(
-                        f"No locations found in {_locations_dir}. "
-                        "Add markdown files to this directory."
-                    ),
+    notes: list[NoteEntry] = []
+    subdirs: list[Path] = []
+    try:
+        scanner = os.scandir(directory)
+    except OSError:
+        return notes, subdirs
+    with scanner:
+        for entry in scanner:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if not _is_ignored_dir(entry.name):
+                        subdirs.append(Path(entry.path))
+                    continue
+                if not _is_note_name(entry.name, kind) or not entry.is_file():
+                    continue
+                st = entry.stat()
+            except OSError:
+                continue
+            notes.append(
+                NoteEntry(
+                    kind=kind,
+                    name=entry.name[:-3],
+                    organization=organization,
+                    path=Path(entry.path),
+                    size=st.st_size,
+                    mtime_ns=st.st_mtime_ns,
                 )
-            ]
-
-        location_list = "\n".join(f"- {loc}" for loc in locations)
-        return [
-            TextContent(
-                type="text",
-                text=f"Available locations ({len(locations)}):\n{location_list}",
             )
-        ]
+    return notes, subdirs
 
-    elif name == "get_location":
-        location_name = arguments.get("name")
-        if not location_name:
-            return [
-                TextContent(
-                    type="text",
-                    text="Error: 'name' parameter is required",
+
+def _is_note_name(filename: str, kind: NoteKind) -> bool:
+    if not filename.endswith(".md"):
+        return False
+    return not (kind is NoteKind.CHARACTER and filename.startswith("__"))
+
+
+class _NoteTree:
+    """The notes of one kind under a single vault root, grouped by organization.
+
+    In a *recursive* tree every real subdirectory is tracked and a note's
+    organization is its directory relative to the root.  Files directly in
+    the root only count as notes when *root_notes* is set.  Every mutating
+    method appends the resulting note-level changes to *changes*.
+    """
+
+    def __init__(self, kind: NoteKind, root: Path, recursive: bool, root_notes: bool) -> None:
+        self.kind = kind
+        self.root = root
+        self.recursive = recursive
+        self.root_notes = root_notes
+        self.orgs: dict[str, dict[str, NoteEntry]] = {}
+        self.dir_mtimes: dict[Path, int] = {}
+
+    def get(self, organization: str, name: str) -> NoteEntry | None:
+        return self.orgs.get(organization, {}).get(name)
+
+    def keys(self) -> list[tuple[str, str]]:
+        return [(org, name) for org, notes in self.orgs.items() for name in notes]
+
+    def organization_for(self, directory: Path) -> str:
+        return "" if directory == self.root else directory.relative_to(self.root).as_posix()
+
+    def scan(self, directory: Path, changes: list[VaultChange]) -> None:
+        """Relist *directory* and descend into any subdirectories not yet tracked."""
+        pending = [directory]
+        while pending:
+            pending.extend(self._rescan_dir(pending.pop(), changes))
+
+    def refresh(self, changes: list[VaultChange]) -> None:
+        """Rescan every tracked directory whose mtime changed since it was listed."""
+        for directory, known_mtime in list(self.dir_mtimes.items()):
+            if directory not in self.dir_mtimes:
+                continue  # Dropped while handling a removed parent
+            mtime = _dir_mtime_ns(directory)
+            if mtime is None:
+                self.drop_tree(directory, changes)
+            elif mtime != known_mtime:
+                self.scan(directory, changes)
+
+    def restat_notes(self, changes: list[VaultChange]) -> None:
+        """Stat every known note and pick up in-place modifications and deletions."""
+        for notes in list(self.orgs.values()):
+            for entry in list(notes.values()):
+                try:
+                    st = os.stat(entry.path)
+                except OSError:
+                    pass
+                else:
+                    if (
+                        st.st_size == entry.size
+                        and st.st_mtime_ns == entry.mtime_ns
+                        and stat.S_ISREG(st.st_mode)
+                    ):
+                        continue  # Unchanged: skip building and comparing a new entry
+                self.apply_file(entry.path, changes)
+
+    def apply_path(self, path: Path, changes: list[VaultChange]) -> None:
+        """Bring the tree up to date with whatever now exists at *path*."""
+        if path in self.dir_mtimes:
+            self.scan(path, changes)  # Drops the directory if it has vanished
+        elif path.is_dir():
+            if self.recursive:
+                self.scan(self._nearest_tracked(path), changes)
+        elif path.parent in self.dir_mtimes:
+            self.apply_file(path, changes)
+        elif self.recursive and path.parent.is_dir():
+            self.scan(self._nearest_tracked(path.parent), changes)
+
+    def _nearest_tracked(self, path: Path) -> Path:
+        while path not in self.dir_mtimes and path != self.root:
+            path = path.parent
+        return path
+
+    def apply_file(self, path: Path, changes: list[VaultChange]) -> None:
+        directory = path.parent
+        if not _is_note_name(path.name, self.kind):
+            return
+        if directory == self.root and not self.root_notes:
+            return
+        organization = self.organization_for(directory)
+        name = path.name[:-3]
+        notes = self.orgs.get(organization, {})
+        old = notes.get(name)
+        try:
+            st = path.stat()
+            is_file = stat.S_ISREG(st.st_mode)
+        except OSError:
+            is_file = False
+        if not is_file:
+            if old is not None:
+                del notes[name]
+                if not notes:
+                    self.orgs.pop(organization, None)
+                changes.append(VaultChange(ChangeKind.DELETED, old))
+            return
+        new = NoteEntry(self.kind, name, organization, path, st.st_size, st.st_mtime_ns)
+        if old == new:
+            return
+        self.orgs.setdefault(organization, {})[name] = new
+        kind = ChangeKind.ADDED if old is None else ChangeKind.MODIFIED
+        changes.append(VaultChange(kind, new))
+
+    def drop_tree(self, directory: Path, changes: list[VaultChange]) -> None:
+        """Forget *directory*, its subdirectories and every note inside them."""
+        for tracked in list(self.dir_mtimes):
+            if tracked == directory or tracked.is_relative_to(directory):
+                del self.dir_mtimes[tracked]
+        if directory == self.root:
+            stale = list(self.orgs)
+        else:
+            organization = self.organization_for(directory)
+            prefix = organization + "/"
+            stale = [org for org in self.orgs if org == organization or org.startswith(prefix)]
+        for org in stale:
+            for entry in self.orgs.pop(org).values():
+                changes.append(VaultChange(ChangeKind.DELETED, entry))
+
+    def _rescan_dir(self, directory: Path, changes: list[VaultChange]) -> list[Path]:
+        """Relist one directory; returns subdirectories that are not tracked yet."""
+        mtime = _dir_mtime_ns(directory)
+        if mtime is None:
+            self.drop_tree(directory, changes)
+            return []
+        self.dir_mtimes[directory] = mtime
+
+        organization = self.organization_for(directory)
+        notes, subdirs = _scan_markdown_files(directory, self.kind, organization)
+        if directory != self.root or self.root_notes:
+            old = self.orgs.pop(organization, {})
+            new = {note.name: note for note in notes}
+            for name, entry in new.items():
+                previous = old.get(name)
+                if previous is None:
+                    changes.append(VaultChange(ChangeKind.ADDED, entry))
+                elif previous != entry:
+                    changes.append(VaultChange(ChangeKind.MODIFIED, entry))
+            for name, entry in old.items():
+                if name not in new:
+                    changes.append(VaultChange(ChangeKind.DELETED, entry))
+            if new:
+                self.orgs[organization] = new
+
+        if not self.recursive:
+            return []
+        return [d for d in subdirs if d not in self.dir_mtimes]
+
+
+class VaultIndex:
+    """Process-wide in-memory listing of location, character and session notes.
+
+    The index is built once with a full scan.  Afterwards :meth:`refresh`
+    revalidates it cheaply: it stats every known directory and rescans only
+    the directories whose mtime changed, i.e. where a file was added, removed
+    or renamed.  A :class:`VaultWatcher` can instead push changed paths in
+    through :meth:`apply_changes`.  Reads are served from memory and are safe
+    to call from any thread.
+
+    Callables registered with :meth:`subscribe` receive every batch of
+    :class:`VaultChange` objects produced after the initial :meth:`build`.
+    """
+
+    def __init__(
+        self, locations_dir: Path, characters_dir: Path, sessions_dir: Path | None = None
+    ) -> None:
+        self._lock = threading.RLock()
+        self._trees: dict[NoteKind, _NoteTree] = {
+            NoteKind.LOCATION: _NoteTree(
+                NoteKind.LOCATION, locations_dir, recursive=False, root_notes=True
+            ),
+            NoteKind.CHARACTER: _NoteTree(
+                NoteKind.CHARACTER, characters_dir, recursive=True, root_notes=False
+            ),
+        }
+        if sessions_dir is not None:
+            self._trees[NoteKind.SESSION] = _NoteTree(
+                NoteKind.SESSION, sessions_dir, recursive=True, root_notes=True
+            )
+        self._sorted: dict[NoteKind, list[NoteEntry]] = {}
+        self._sorted_keys: dict[NoteKind, list[tuple[str, str]]] = {}
+        self._listeners: list[Callable[[list[VaultChange]], None]] = []
+
+    # --- building and revalidation -----------------------------------------
+
+    def roots(self) -> list[tuple[Path, bool]]:
+        """Return each indexed root directory and whether it is indexed recursively."""
+        return [(tree.root, tree.recursive) for tree in self._trees.values()]
+
+    def subscribe(self, listener: Callable[[list[VaultChange]], None]) -> None:
+        """Register *listener* to be called with each non-empty batch of changes."""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def build(self) -> None:
+        """Discard the current contents and rescan every root from scratch.
+
+        Subscribers are not notified; they are expected to bootstrap from the
+        entry listings after the build.
+        """
+        with self._lock:
+            for tree in self._trees.values():
+                tree.orgs.clear()
+                tree.dir_mtimes.clear()
+                tree.scan(tree.root, [])
+            self._sorted.clear()
+
+    def export_listing(self) -> tuple[dict[str, Any], list[NoteEntry]]:
+        """Return the listing and directory mtimes as plain, marshal-able data.
+
+        Also returns the entries in the order the listing holds them, which
+        is the order :meth:`restore_listing` returns them in.
+        """
+        with self._lock:
+            entries = [
+                entry
+                for tree in self._trees.values()
+                for notes in tree.orgs.values()
+                for entry in notes.values()
+            ]
+            listing = {
+                kind.value: (
+                    str(tree.root),
+                    {str(directory): mtime for directory, mtime in tree.dir_mtimes.items()},
+                    [
+                        (entry.organization, entry.name, entry.size, entry.mtime_ns)
+                        for notes in tree.orgs.values()
+                        for entry in notes.values()
+                    ],
+                )
+                for kind, tree in self._trees.items()
+            }
+            return listing, entries
+
+    def restore_listing(self, state: dict[str, Any]) -> list[NoteEntry]:
+        """Replace the contents with :meth:`export_listing` output, without scanning.
+
+        Subscribers are not notified, as with :meth:`build`.  A
+        :meth:`refresh` afterwards picks up anything that changed since.
+
+        Returns:
+            The restored entries, in listing order
+
+        Raises:
+            ValueError: If *state* was exported for different root directories
+        """
+        restored: list[NoteEntry] = []
+        with self._lock:
+            if set(state) != {kind.value for kind in self._trees} or any(
+                state[kind.value][0] != str(tree.root) for kind, tree in self._trees.items()
+            ):
+                raise ValueError("Listing was exported for different vault roots")
+            for kind, tree in self._trees.items():
+                _, dir_mtimes, notes = state[kind.value]
+                tree.dir_mtimes = {Path(d): mtime for d, mtime in dir_mtimes.items()}
+                tree.orgs = {}
+                root = str(tree.root)
+                for organization, name, size, mtime_ns in notes:
+                    # One Path parse per note; joining with "/" costs two
+                    directory = f"{root}/{organization}" if organization else root
+                    path = Path(f"{directory}/{name}.md")
+                    entry = NoteEntry(kind, name, organization, path, size, mtime_ns)
+                    tree.orgs.setdefault(organization, {})[name] = entry
+                    restored.append(entry)
+            self._sorted.clear()
+        return restored
+
+    def refresh(self, deep: bool = False) -> bool:
+        """Revalidate the index against directory mtimes.
+
+        Args:
+            deep: Also stat every known note, to catch files edited in place
+                (which does not change their directory's mtime).
+
+        Returns:
+            True if anything changed.
+        """
+        changes: list[VaultChange] = []
+        with self._lock:
+            for tree in self._trees.values():
+                tree.refresh(changes)
+                if deep:
+                    tree.restat_notes(changes)
+            self._invalidate(changes)
+        self._notify(changes)
+        return bool(changes)
+
+    def apply_changes(self, paths: Iterable[Path]) -> list[VaultChange]:
+        """Update the index for paths reported as added, modified, deleted or renamed.
+
+        Each path may be a note or a directory; directories are rescanned and
+        vanished directories are dropped together with their notes.
+        """
+        changes: list[VaultChange] = []
+        with self._lock:
+            for path in sorted(paths, key=lambda p: len(p.parts)):
+                for tree in self._trees.values():
+                    if path.is_relative_to(tree.root):
+                        tree.apply_path(path, changes)
+            self._invalidate(changes)
+        self._notify(changes)
+        return changes
+
+    def _invalidate(self, changes: list[VaultChange]) -> None:
+        for kind in {change.entry.kind for change in changes}:
+            self._sorted.pop(kind, None)
+
+    def _notify(self, changes: list[VaultChange]) -> None:
+        if not changes:
+            return
+        for listener in list(self._listeners):
+            try:
+                listener(changes)
+            except Exception:
+                logger.exception("Vault index listener failed")
+
+    # --- queries -------------------------------------------------------------
+
+    def entries(self, kind: NoteKind) -> list[NoteEntry]:
+        """Return all entries of *kind* sorted by organization, then name."""
+        with self._lock:
+            listing = self._sorted.get(kind)
+            if listing is None:
+                tree = self._trees.get(kind)
+                keys = sorted(tree.keys()) if tree is not None else []
+                listing = [self._trees[kind].orgs[org][name] for org, name in keys]
+                self._sorted[kind] = listing
+                self._sorted_keys[kind] = keys
+            return listing
+
+    def location_entries(self) -> list[NoteEntry]:
+        """Return all location entries sorted by name."""
+        return self.entries(NoteKind.LOCATION)
+
+    def character_entries(self) -> list[NoteEntry]:
+        """Return all character entries sorted by organization, then name."""
+        return self.entries(NoteKind.CHARACTER)
+
+    def session_entries(self) -> list[NoteEntry]:
+        """Return all session notes sorted by folder, then name."""
+        return self.entries(NoteKind.SESSION)
+
+    def character_page(
+        self,
+        limit: int,
+        after: tuple[str, str] | None = None,
+        organization: str | None = None,
+    ) -> tuple[list[NoteEntry], tuple[str, str] | None]:
+        """Return one page of characters in (organization, name) order.
+
+        Pages are located by binary search over the sorted keys, so fetching
+        page N costs the same as fetching the first page.
+
+        Args:
+            limit: Maximum number of entries to return
+            after: Key of the last entry of the previous page, if any
+            organization: Only return characters in exactly this organization
+
+        Returns:
+            The page, and the key to resume after (None on the last page).
+        """
+        with self._lock:
+            entries = self.character_entries()
+            keys = self._sorted_keys[NoteKind.CHARACTER]
+            start = 0 if after is None else bisect.bisect_right(keys, after)
+            end = len(keys)
+            if organization is not None:
+                start = max(start, bisect.bisect_left(keys, (organization, "")))
+                end = bisect.bisect_right(keys, (organization, "\U0010ffff"), lo=start)
+            stop = min(start + limit, end)
+            page = entries[start:stop]
+            next_key = keys[stop - 1] if page and stop < end else None
+            return page, next_key
+
+    def locations(self) -> list[str]:
+        """Return location names, matching :func:`get_all_locations`."""
+        return [note.name for note in self.location_entries()]
+
+    def characters(self) -> list[dict[str, str]]:
+        """Return characters as dicts, matching :func:`get_all_characters`."""
+        return [
+            {"name": note.name, "organization": note.organization}
+            for note in self.character_entries()
+        ]
+
+    def get(self, kind: NoteKind, name: str, organization: str = "") -> NoteEntry | None:
+        """Look up an entry of *kind* by name and organization."""
+        with self._lock:
+            tree = self._trees.get(kind)
+            return tree.get(organization, name) if tree is not None else None
+
+    def get_location(self, name: str) -> NoteEntry | None:
+        """Look up a location entry by name."""
+        return self.get(NoteKind.LOCATION, name)
+
+    def get_character(self, name: str, organization: str) -> NoteEntry | None:
+        """Look up a character entry by name and organization."""
+        return self.get(NoteKind.CHARACTER, name, organization)
+
+
+def _dir_mtime_ns(directory: Path) -> int | None:
+    """Return the mtime of *directory* in nanoseconds, or None if it is gone."""
+    try:
+        return os.stat(directory).st_mtime_ns
+    except OSError:
+        return None
+
+
+# Threads in the shared pool that reads notes in bulk while indexing
+BULK_READ_WORKERS = 8
+
+# Shared by the note pipeline and SQLite syncs; threads are started on first use
+_bulk_read_executor = ThreadPoolExecutor(
+    max_workers=BULK_READ_WORKERS, thread_name_prefix="vault-read"
+)
+
+
+def _read_entry(entry: NoteEntry) -> str | None:
+    try:
+        return entry.path.read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return None
+    except (OSError, UnicodeDecodeError) as e:
+        logger.warning("Skipping unreadable note %s: %s", entry.path, e)
+        return None
+
+
+def read_note_files(
+    entries: list[NoteEntry], executor: ThreadPoolExecutor | None = None
+) -> list[str | None]:
+    """Read the content of many indexed notes.
+
+    The paths come from our own directory walk, so the name validation and
+    :func:`_safe_join` checks done by :func:`get_character_details` are skipped.
+
+    Args:
+        entries: Notes to read, typically from :meth:`VaultIndex.character_entries`
+        executor: Pool to read on concurrently.  Without one the notes are read
+            one after another on the calling thread, which is what callers
+            already running on the :class:`IODispatcher` want: its limit then
+            bounds their disk reads too.
+
+    Returns:
+        The content of each note, in the same order as *entries*.  Notes deleted
+        since they were indexed, and notes that cannot be read or are not
+        valid UTF-8, come back as None.
+    """
+    if executor is None or len(entries) <= 1:
+        return [_read_entry(entry) for entry in entries]
+    return list(executor.map(_read_entry, entries))
+
+
+# ---------------------------------------------------------------------------
+# Note analysis
+# ---------------------------------------------------------------------------
+
+
+class NoteAnalyzer(Protocol):
+    """Something that derives a lookup structure from note contents."""
+
+    def add_note(self, entry: NoteEntry, text: str) -> None:
+        """Index *text* for *entry*, replacing anything held for the same path."""
+
+    def remove_note(self, entry: NoteEntry) -> None:
+        """Forget everything held for *entry*'s path."""
+
+
+class SnapshotAnalyzer(NoteAnalyzer, Protocol):
+    """An in-memory analyzer whose state can be saved to and restored from a snapshot."""
+
+    def export_state(self, ids: Mapping[Path, int]) -> Any:
+        """Return everything held as plain, marshal-able data.
+
+        Notes are referred to by their number in *ids*; notes missing from
+        it are left out.
+        """
+
+    def import_state(self, entries: Sequence[NoteEntry], state: Any) -> None:
+        """Replace everything held with :meth:`export_state` output, without reading files.
+
+        Note number ``i`` in *state* is ``entries[i]``.
+        """
+
+
+def _pack_ints(values: Iterable[int]) -> bytes:
+    """Pack non-negative ints into bytes for :meth:`SnapshotAnalyzer.export_state`."""
+    return array("I", values).tobytes()
+
+
+def _unpack_ints(data: bytes) -> "array[int]":
+    return array("I", data)
+
+
+class NotePipeline:
+    """Feed note contents to registered :class:`NoteAnalyzer` objects.
+
+    :meth:`bootstrap` reads every indexed note once; afterwards the pipeline
+    listens to the :class:`VaultIndex` and re-reads only the notes named in
+    each change batch, so every analyzer is updated incrementally from a
+    single read per changed file.
+    """
+
+    def __init__(self, index: VaultIndex) -> None:
+        self._index = index
+        self._analyzers: list[NoteAnalyzer] = []
+        index.subscribe(self._on_changes)
+
+    def register(self, analyzer: NoteAnalyzer) -> None:
+        self._analyzers.append(analyzer)
+
+    @property
+    def analyzers(self) -> list[NoteAnalyzer]:
+        return list(self._analyzers)
+
+    def bootstrap(self) -> None:
+        """Read every note in the index and hand it to each analyzer."""
+        entries = [entry for kind in NoteKind for entry in self._index.entries(kind)]
+        self._feed(entries)
+
+    def _on_changes(self, changes: list[VaultChange]) -> None:
+        updated: list[NoteEntry] = []
+        for change in changes:
+            if change.kind is ChangeKind.DELETED:
+                for analyzer in self._analyzers:
+                    analyzer.remove_note(change.entry)
+            else:
+                updated.append(change.entry)
+        self._feed(updated)
+
+    def _feed(self, entries: list[NoteEntry]) -> None:
+        if not entries or not self._analyzers:
+            return
+        texts = read_note_files(entries, _bulk_read_executor)
+        for entry, text in zip(entries, texts, strict=True):
+            for analyzer in self._analyzers:
+                if text is None:
+                    analyzer.remove_note(entry)
+                else:
+                    analyzer.add_note(entry, text)
+
+
+# ---------------------------------------------------------------------------
+# Full-text search
+# ---------------------------------------------------------------------------
+
+_TOKEN_RE = re.compile(r"\w+")
+
+# Words too common in campaign notes to be worth a posting list
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have he her his i in is it its of on or "
+    "she that the their them they this to was were who whom with".split()
+)
+
+
+def _tokenize(text: str) -> list[str]:
+    """Split *text* into lower-cased word tokens, dropping stopwords."""
+    return [t for t in _TOKEN_RE.findall(text.casefold()) if t not in _STOPWORDS]
+
+
+@dataclass(frozen=True)
+class SearchHit:
+    """A ranked search result."""
+
+    entry: NoteEntry
+    score: float
+
+
+class SearchIndex:
+    """In-process inverted index over note contents, ranked with Okapi BM25.
+
+    Each note's terms are kept alongside the posting lists so that a changed
+    note can be removed and re-added without touching any other document.
+    Notes are numbered and posting lists are keyed by number, which keeps
+    scoring clear of ``Path`` hashing.  After :meth:`import_state`, posting
+    lists and note terms stay in their packed form until a query or an
+    update first touches them, so restoring a large index costs little more
+    than reading it.
+    The note's name (and organization) is indexed as part of its text, with
+    the name counted twice so title matches rank above passing mentions.
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._postings: dict[str, dict[int, int]] = {}
+        self._doc_ids: dict[Path, int] = {}
+        self._docs: dict[int, NoteEntry] = {}
+        self._doc_terms: dict[int, tuple[str, ...]] = {}
+        self._doc_lengths: dict[int, int] = {}
+        self._next_doc = 0
+        self._total_length = 0
+        # Imported but not yet unpacked: term -> (note numbers, counts), and
+        # note number -> numbers of its terms in _packed_terms
+        self._packed_postings: dict[str, tuple[bytes, bytes]] = {}
+        self._packed_doc_terms: dict[int, bytes] = {}
+        self._packed_terms: list[str] = []
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def add_note(self, entry: NoteEntry, text: str) -> None:
+        tokens = _tokenize(entry.name) * 2 + _tokenize(entry.organization) + _tokenize(text)
+        self._insert(entry, collections.Counter(tokens))
+
+    def export_state(self, ids: Mapping[Path, int]) -> Any:
+        with self._lock:
+            exported = {doc for doc, entry in self._docs.items() if entry.path in ids}
+            everything = len(exported) == len(self._docs)
+            terms: list[str] = []
+            postings: list[tuple[bytes, bytes]] = []
+            for term, packed in self._packed_postings.items():
+                if not everything:
+                    pairs = zip(_unpack_ints(packed[0]), _unpack_ints(packed[1]), strict=True)
+                    packed = _pack_postings({d: c for d, c in pairs if d in exported})
+                if packed[0]:
+                    terms.append(term)
+                    postings.append(packed)
+            for term, docs in self._postings.items():
+                if not everything:
+                    docs = {doc: count for doc, count in docs.items() if doc in exported}
+                if docs:
+                    terms.append(term)
+                    postings.append(_pack_postings(docs))
+            term_ids = {term: i for i, term in enumerate(terms)}
+            documents = [
+                (
+                    doc,
+                    ids[self._docs[doc].path],
+                    self._doc_lengths[doc],
+                    _pack_ints(map(term_ids.__getitem__, self._terms_of(doc))),
+                )
+                for doc in exported
+            ]
+        return terms, postings, documents
+
+    def import_state(self, entries: Sequence[NoteEntry], state: Any) -> None:
+        terms, postings, documents = state
+        with self._lock:
+            self._postings = {}
+            self._doc_terms = {}
+            self._packed_postings = dict(zip(terms, postings, strict=True))
+            self._packed_doc_terms = {doc: doc_terms for doc, _, _, doc_terms in documents}
+            self._packed_terms = terms
+            self._docs = {doc: entries[i] for doc, i, _, _ in documents}
+            self._doc_ids = {entry.path: doc for doc, entry in self._docs.items()}
+            self._doc_lengths = {doc: length for doc, _, length, _ in documents}
+            self._next_doc = max(self._docs, default=-1) + 1
+            self._total_length = sum(self._doc_lengths.values())
+
+    def _posting_list(self, term: str) -> dict[int, int] | None:
+        """Return the posting list for *term*, unpacking it if it is still packed."""
+        packed = self._packed_postings.pop(term, None)
+        if packed is not None:
+            docs, counts = packed
+            self._postings[term] = dict(zip(_unpack_ints(docs), _unpack_ints(counts), strict=True))
+        return self._postings.get(term)
+
+    def _terms_of(self, doc: int) -> tuple[str, ...]:
+        packed = self._packed_doc_terms.get(doc)
+        if packed is None:
+            return self._doc_terms[doc]
+        return tuple(map(self._packed_terms.__getitem__, _unpack_ints(packed)))
+
+    def _insert(self, entry: NoteEntry, terms: collections.Counter[str]) -> None:
+        length = sum(terms.values())
+        with self._lock:
+            self._remove(entry.path)
+            doc = self._next_doc
+            self._next_doc += 1
+            self._doc_ids[entry.path] = doc
+            self._docs[doc] = entry
+            self._doc_terms[doc] = tuple(terms)
+            self._doc_lengths[doc] = length
+            self._total_length += length
+            for term, count in terms.items():
+                postings = self._posting_list(term)
+                if postings is None:
+                    self._postings[term] = {doc: count}
+                else:
+                    postings[doc] = count
+
+    def remove_note(self, entry: NoteEntry) -> None:
+        with self._lock:
+            self._remove(entry.path)
+
+    def _remove(self, path: Path) -> None:
+        doc = self._doc_ids.pop(path, None)
+        if doc is None:
+            return
+        terms = self._terms_of(doc)
+        del self._docs[doc]
+        self._doc_terms.pop(doc, None)
+        self._packed_doc_terms.pop(doc, None)
+        self._total_length -= self._doc_lengths.pop(doc)
+        for term in terms:
+            postings = self._posting_list(term)
+            assert postings is not None
+            del postings[doc]
+            if not postings:
+                del self._postings[term]
+
+    def search(self, query: str, limit: int = 10, kind: NoteKind | None = None) -> list[SearchHit]:
+        """Return up to *limit* notes ranked by BM25 score for *query*."""
+        terms = set(_tokenize(query))
+        with self._lock:
+            doc_count = len(self._docs)
+            if not terms or not doc_count:
+                return []
+            avg_length = self._total_length / doc_count
+            scores: dict[int, float] = collections.defaultdict(float)
+            for term in terms:
+                postings = self._posting_list(term)
+                if not postings:
+                    continue
+                df = len(postings)
+                idf = math.log(1.0 + (doc_count - df + 0.5) / (df + 0.5))
+                for doc, tf in postings.items():
+                    norm = self.K1 * (1.0 - self.B + self.B * self._doc_lengths[doc] / avg_length)
+                    scores[doc] += idf * tf * (self.K1 + 1.0) / (tf + norm)
+            if kind is not None:
+                scores = {d: s for d, s in scores.items() if self._docs[d].kind is kind}
+            best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+            return [SearchHit(self._docs[doc], score) for doc, score in best]
+
+
+def _pack_postings(docs: dict[int, int]) -> tuple[bytes, bytes]:
+    return _pack_ints(docs), _pack_ints(docs.values())
+
+
+def make_snippet(text: str, query: str, width: int = 200) -> str:
+    """Return a window of *text* around the first occurrence of a query term."""
+    flat = " ".join(text.split())
+    terms = _tokenize(query)
+    match = None
+    if terms:
+        pattern = r"\b(?:" + "|".join(re.escape(t) for t in terms) + r")\b"
+        match = re.search(pattern, flat, re.IGNORECASE)
+    if match is None:
+        return flat[:width] + ("…" if len(flat) > width else "")
+    start = max(0, match.start() - width // 3)
+    end = min(len(flat), start + width)
+    return ("…" if start else "") + flat[start:end] + ("…" if end < len(flat) else "")
+
+
+def search_vault(
+    index: SearchIndex, query: str, limit: int = 10, kind: NoteKind | None = None
+) -> list[tuple[SearchHit, str]]:
+    """Search the vault and attach a snippet to each hit.
+
+    Only the top hits are read from disk, to cut their snippets.
+    """
+    hits = index.search(query, limit, kind)
+    texts = read_note_files([hit.entry for hit in hits])
+    return [
+        (hit, make_snippet(text, query))
+        for hit, text in zip(hits, texts, strict=True)
+        if text is not None
+    ]
+
+
+def _entry_label(entry: NoteEntry) -> str:
+    """Return a human-readable label such as ``Adrian Rook (camarilla)``."""
+    return f"{entry.name} ({entry.organization})" if entry.organization else entry.name
+
+
+# ---------------------------------------------------------------------------
+# Frontmatter
+# ---------------------------------------------------------------------------
+
+_FRONTMATTER_RE = re.compile(r"\A---[ \t]*\r?\n(.*?)\r?\n(?:---|\.\.\.)[ \t]*(?:\r?\n|\Z)", re.S)
+_FRONTMATTER_KEY_RE = re.compile(r"^([^\s:#][^:]*?):(?:\s+(.*))?$")
+# Plain decimal numbers; anything else (nan, inf, 1_000, 0x1f) stays a string
+_NUMBER_RE = re.compile(r"-?\d+(\.\d+)?([eE][-+]?\d+)?")
+
+
+def _parse_scalar(raw: str) -> Any:
+    """Convert a YAML scalar to str, int, float, bool or None."""
+    value = raw.strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'":
+        return value[1:-1]
+    if " #" in value:
+        value = value.split(" #", 1)[0].rstrip()
+    lowered = value.lower()
+    if lowered in ("", "~", "null"):
+        return None
+    if lowered in ("true", "yes"):
+        return True
+    if lowered in ("false", "no"):
+        return False
+    match = _NUMBER_RE.fullmatch(value)
+    if match is None:
+        return value
+    if match.group(1) is None and match.group(2) is None:
+        return int(value)
+    number = float(value)
+    return number if math.isfinite(number) else value
+
+
+def parse_frontmatter(text: str) -> dict[str, Any]:
+    """Parse the YAML frontmatter block at the top of an Obsidian note.
+
+    Supports the subset Obsidian's property editor writes: ``key: scalar``,
+    flow lists (``tags: [a, b]``) and block lists (``- item`` lines).  Nested
+    mappings are skipped.  Notes without frontmatter yield an empty dict.
+    """
+    match = _FRONTMATTER_RE.match(text)
+    if match is None:
+        return {}
+    properties: dict[str, Any] = {}
+    current: str | None = None
+    for line in match.group(1).splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#"):
+            continue
+        if stripped.startswith("- ") or stripped == "-":
+            if current is not None:
+                if not isinstance(properties[current], list):
+                    properties[current] = []
+                properties[current].append(_parse_scalar(stripped[1:]))
+            continue
+        if line[:1].isspace():
+            continue  # Nested mapping
+        key_match = _FRONTMATTER_KEY_RE.match(line)
+        if key_match is None:
+            current = None
+            continue
+        current = key_match.group(1).strip()
+        raw = (key_match.group(2) or "").strip()
+        if raw.startswith("[") and raw.endswith("]"):
+            items = [item for item in raw[1:-1].split(",") if item.strip()]
+            properties[current] = [_parse_scalar(item) for item in items]
+        else:
+            properties[current] = _parse_scalar(raw)
+    return properties
+
+
+def _property_key(value: Any) -> tuple[str, Any] | None:
+    """Normalize a property value for indexing; strings compare case-insensitively."""
+    if isinstance(value, bool):
+        return ("b", value)
+    if isinstance(value, int | float):
+        try:
+            number = float(value)
+        except OverflowError:
+            return None
+        return ("n", number) if math.isfinite(number) else None
+    if isinstance(value, str):
+        return ("s", value.casefold())
+    return None
+
+
+_RANGE_OPERATORS = ("gt", "gte", "lt", "lte")
+QUERY_OPERATORS = ("eq", "in", "exists", *_RANGE_OPERATORS)
+
+
+class FrontmatterIndex:
+    """Parsed frontmatter for every note, with per-property lookup structures.
+
+    Frontmatter is parsed once per file version (the :class:`NotePipeline`
+    only re-feeds changed notes).  For each property the index keeps a hash
+    map from normalized value to notes, for equality and membership, and a
+    sorted list of ``(value, path)`` pairs per value type, for ranges.  New
+    pairs are appended and a list is only re-sorted when a range query or a
+    removal next needs it, so loading many notes costs one sort per list.
+    List properties are indexed once per element.  Queries never touch the
+    disk.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._properties: dict[Path, dict[str, Any]] = {}
+        self._entries: dict[Path, NoteEntry] = {}
+        self._by_value: dict[str, dict[tuple[str, Any], set[Path]]] = {}
+        self._sorted: dict[tuple[str, str], list[tuple[Any, Path]]] = {}
+        self._unsorted: set[tuple[str, str]] = set()
+
+    def add_note(self, entry: NoteEntry, text: str) -> None:
+        self._insert(entry, parse_frontmatter(text))
+
+    def export_state(self, ids: Mapping[Path, int]) -> Any:
+        with self._lock:
+            notes = [
+                (ids[path], self._properties.get(path, {})) for path in self._entries if path in ids
+            ]
+            by_value = [
+                (
+                    name,
+                    [(key, _pack_ints(ids[p] for p in ps if p in ids)) for key, ps in keys.items()],
+                )
+                for name, keys in self._by_value.items()
+            ]
+            ranges = []
+            for key in list(self._sorted):
+                known = [(value, ids[path]) for value, path in self._ordered(key) if path in ids]
+                ranges.append((key, [v for v, _ in known], _pack_ints(i for _, i in known)))
+        return notes, by_value, ranges
+
+    def import_state(self, entries: Sequence[NoteEntry], state: Any) -> None:
+        notes, by_value, ranges = state
+        paths = [entry.path for entry in entries]
+        with self._lock:
+            self._entries = {paths[i]: entries[i] for i, _ in notes}
+            self._properties = {paths[i]: properties for i, properties in notes if properties}
+            self._by_value = {
+                name: {
+                    key: set(map(paths.__getitem__, _unpack_ints(numbers)))
+                    for key, numbers in values
+                }
+                for name, values in by_value
+            }
+            self._sorted = {
+                key: list(zip(values, map(paths.__getitem__, _unpack_ints(numbers)), strict=True))
+                for key, values, numbers in ranges
+            }
+            self._unsorted = set()
+
+    def _insert(self, entry: NoteEntry, properties: dict[str, Any]) -> None:
+        with self._lock:
+            self._remove(entry.path)
+            self._add(entry, properties)
+
+    def _add(self, entry: NoteEntry, properties: dict[str, Any]) -> None:
+        self._entries[entry.path] = entry
+        if not properties:
+            return
+        self._properties[entry.path] = properties
+        for name, key in self._index_keys(properties):
+            self._by_value.setdefault(name, {}).setdefault(key, set()).add(entry.path)
+            self._sorted.setdefault((name, key[0]), []).append((key[1], entry.path))
+            self._unsorted.add((name, key[0]))
+
+    def remove_note(self, entry: NoteEntry) -> None:
+        with self._lock:
+            self._remove(entry.path)
+
+    def properties(self, path: Path) -> dict[str, Any]:
+        """Return the parsed frontmatter cached for *path* (empty if none)."""
+        with self._lock:
+            return self._properties.get(path, {})
+
+    @staticmethod
+    def _index_keys(properties: dict[str, Any]) -> set[tuple[str, tuple[str, Any]]]:
+        keys = set()
+        for name, value in properties.items():
+            for item in value if isinstance(value, list) else [value]:
+                key = _property_key(item)
+                if key is not None:
+                    keys.add((name.casefold(), key))
+        return keys
+
+    def _remove(self, path: Path) -> None:
+        self._entries.pop(path, None)
+        properties = self._properties.pop(path, None)
+        if properties is None:
+            return
+        for name, key in self._index_keys(properties):
+            paths = self._by_value[name][key]
+            paths.discard(path)
+            if not paths:
+                del self._by_value[name][key]
+                if not self._by_value[name]:
+                    del self._by_value[name]
+            ordered = self._ordered((name, key[0]))
+            i = bisect.bisect_left(ordered, (key[1], path))
+            del ordered[i]
+            if not ordered:
+                del self._sorted[(name, key[0])]
+
+    def _ordered(self, key: tuple[str, str]) -> list[tuple[Any, Path]]:
+        """The range list for (property, value type) *key*, sorted."""
+        ordered = self._sorted.get(key, [])
+        if key in self._unsorted:
+            ordered.sort()
+            self._unsorted.discard(key)
+        return ordered
+
+    def query(
+        self,
+        where: dict[str, Any],
+        kind: NoteKind | None = None,
+        limit: int | None = None,
+    ) -> list[tuple[NoteEntry, dict[str, Any]]]:
+        """Return notes whose frontmatter satisfies every condition in *where*.
+
+        A condition is either a plain value (equality, or membership for list
+        properties), a list of values (any of them), or an object of
+        operators: ``eq``, ``in``, ``exists``, ``gt``, ``gte``, ``lt``, ``lte``.
+        Results are ordered by kind, organization and name.
+
+        Raises:
+            ValueError: If a condition is malformed
+        """
+        with self._lock:
+            matched: set[Path] | None = None
+            for name, condition in where.items():
+                paths = self._match(name.casefold(), condition)
+                matched = paths if matched is None else matched & paths
+                if not matched:
+                    return []
+            if matched is None:
+                matched = set(self._properties)
+            results = [
+                (self._entries[path], self._properties.get(path, {}))
+                for path in matched
+                if kind is None or self._entries[path].kind is kind
+            ]
+        results.sort(key=lambda r: (r[0].kind.value, r[0].organization, r[0].name))
+        return results[:limit] if limit is not None else results
+
+    def _match(self, name: str, condition: Any) -> set[Path]:
+        condition = _query_condition(name, condition)
+        by_value = self._by_value.get(name, {})
+        result: set[Path] | None = None
+
+        def narrow(paths: set[Path]) -> None:
+            nonlocal result
+            result = set(paths) if result is None else result & paths
+
+        if "exists" in condition:
+            present = {p for paths in by_value.values() for p in paths}
+            if condition["exists"]:
+                narrow(present)
+            else:
+                narrow(set(self._entries) - present)
+        if "eq" in condition:
+            narrow(by_value.get(_lookup_key(condition["eq"]), set()))
+        if "in" in condition:
+            narrow(set().union(*(by_value.get(_lookup_key(v), set()) for v in condition["in"])))
+        ranges = {op: condition[op] for op in _RANGE_OPERATORS if op in condition}
+        if ranges:
+            narrow(self._range(name, ranges))
+        return result if result is not None else set()
+
+    def _range(self, name: str, bounds: dict[str, Any]) -> set[Path]:
+        value_kind, values = _range_bounds(name, bounds)
+        ordered = self._ordered((name, value_kind))
+        lo, hi = 0, len(ordered)
+        for op, bound in values.items():
+            if op in ("gt", "lte"):
+                cut = bisect.bisect_right(ordered, bound, key=_first)
+            else:
+                cut = bisect.bisect_left(ordered, bound, key=_first)
+            if op in ("gt", "gte"):
+                lo = max(lo, cut)
+            else:
+                hi = min(hi, cut)
+        return {path for _, path in ordered[lo:hi]}
+
+
+def _query_condition(name: str, condition: Any) -> dict[str, Any]:
+    """Spell out one ``where`` condition as an object of operators.
+
+    Raises:
+        ValueError: If it uses an unknown operator or ``in`` is not a list
+    """
+    operators: dict[str, Any]
+    if isinstance(condition, list):
+        operators = {"in": condition}
+    elif isinstance(condition, dict):
+        operators = condition
+    else:
+        operators = {"eq": condition}
+    unknown = set(operators) - set(QUERY_OPERATORS)
+    if unknown:
+        raise ValueError(f"Unknown operator(s) for '{name}': {', '.join(sorted(unknown))}")
+    if "in" in operators and not isinstance(operators["in"], list):
+        raise ValueError(f"'in' for '{name}' must be a list")
+    return operators
+
+
+def _lookup_key(value: Any) -> tuple[str, Any]:
+    key = _property_key(value)
+    if key is None:
+        raise ValueError(f"Unsupported value: {value!r}")
+    return key
+
+
+def _range_bounds(name: str, bounds: dict[str, Any]) -> tuple[str, dict[str, Any]]:
+    """Return the value type shared by range *bounds* and each bound normalized.
+
+    Raises:
+        ValueError: If a bound is not a number or string, or they mix the two
+    """
+    keys: dict[str, tuple[str, Any]] = {}
+    for op, value in bounds.items():
+        key = _property_key(value)
+        if key is None or key[0] == "b":
+            raise ValueError(f"Range bound '{op}' for '{name}' must be a number or string")
+        keys[op] = key
+    value_kinds = {key[0] for key in keys.values()}
+    if len(value_kinds) != 1:
+        raise ValueError(f"Range bounds for '{name}' must all be numbers or all strings")
+    return value_kinds.pop(), {op: key[1] for op, key in keys.items()}
+
+
+def _first(item: tuple[Any, Path]) -> Any:
+    return item[0]
+
+
+def _format_properties(properties: dict[str, Any]) -> str:
+    parts = []
+    for name, value in properties.items():
+        shown = ", ".join(str(v) for v in value) if isinstance(value, list) else value
+        parts.append(f"{name}: {shown}")
+    return "; ".join(parts)
+
+
+# ---------------------------------------------------------------------------
+# Wikilink graph
+# ---------------------------------------------------------------------------
+
+# Matches [[Target]], [[Target|alias]], [[Target#Heading]] and ![[embeds]]
+_WIKILINK_RE = re.compile(r"\[\[([^\[\]|#^]+)(?:[#^][^\[\]|]*)?(?:\|[^\[\]]*)?\]\]")
+
+# Bounds for get_related traversals
+RELATED_MAX_DEPTH = 3
+RELATED_DEFAULT_LIMIT = 25
+RELATED_MAX_LIMIT = 100
+
+
+def _link_key(target: str) -> str:
+    """Normalize a link target or note name the way Obsidian resolves it."""
+    target = target.strip().rsplit("/", 1)[-1]
+    if target.lower().endswith(".md"):
+        target = target[:-3]
+    return target.casefold()
+
+
+def parse_wikilinks(text: str) -> set[str]:
+    """Return the normalized targets of every wikilink in *text*."""
+    return {key for key in map(_link_key, _WIKILINK_RE.findall(text)) if key}
+
+
+class LinkDirection(Enum):
+    """Which edges of the link graph to follow."""
+
+    OUT = "out"
+    IN = "in"
+    BOTH = "both"
+
+
+@dataclass(frozen=True)
+class RelatedNote:
+    """A note reached from the start of a :meth:`LinkGraph.related` traversal."""
+
+    entry: NoteEntry
+    depth: int
+    links_to: bool
+    linked_from: bool
+
+
+class LinkGraph:
+    """Forward and backward wikilink adjacency over every note in the vault.
+
+    Links are stored by normalized target name and resolved against the
+    current set of note names at query time, so a link to a note that does
+    not exist yet starts resolving as soon as the note is created.  Updated
+    incrementally through the :class:`NotePipeline`.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._entries: dict[Path, NoteEntry] = {}
+        self._outgoing: dict[Path, set[str]] = {}
+        self._incoming: dict[str, set[Path]] = {}
+        self._by_name: dict[str, set[Path]] = {}
+
+    def add_note(self, entry: NoteEntry, text: str) -> None:
+        targets = parse_wikilinks(text)
+        targets.discard(_link_key(entry.name))
+        self._insert(entry, targets)
+
+    def export_state(self, ids: Mapping[Path, int]) -> Any:
+        with self._lock:
+            notes = [
+                (ids[path], list(self._outgoing[path])) for path in self._entries if path in ids
+            ]
+            incoming = [
+                (target, _pack_ints(ids[p] for p in paths if p in ids))
+                for target, paths in self._incoming.items()
+            ]
+            by_name = [
+                (name, _pack_ints(ids[p] for p in paths if p in ids))
+                for name, paths in self._by_name.items()
+            ]
+        return notes, incoming, by_name
+
+    def import_state(self, entries: Sequence[NoteEntry], state: Any) -> None:
+        notes, incoming, by_name = state
+        paths = [entry.path for entry in entries]
+        with self._lock:
+            self._entries = {paths[i]: entries[i] for i, _ in notes}
+            self._outgoing = {paths[i]: set(targets) for i, targets in notes}
+            self._incoming = {
+                target: set(map(paths.__getitem__, _unpack_ints(numbers)))
+                for target, numbers in incoming
+            }
+            self._by_name = {
+                name: set(map(paths.__getitem__, _unpack_ints(numbers)))
+                for name, numbers in by_name
+            }
+            for mapping in (self._incoming, self._by_name):
+                for key in [key for key, found in mapping.items() if not found]:
+                    del mapping[key]
+
+    def _insert(self, entry: NoteEntry, targets: set[str]) -> None:
+        with self._lock:
+            self._remove(entry.path)
+            self._add(entry, targets)
+
+    def _add(self, entry: NoteEntry, targets: set[str]) -> None:
+        self._entries[entry.path] = entry
+        self._by_name.setdefault(_link_key(entry.name), set()).add(entry.path)
+        self._outgoing[entry.path] = targets
+        for target in targets:
+            self._incoming.setdefault(target, set()).add(entry.path)
+
+    def remove_note(self, entry: NoteEntry) -> None:
+        with self._lock:
+            self._remove(entry.path)
+
+    def _remove(self, path: Path) -> None:
+        entry = self._entries.pop(path, None)
+        if entry is None:
+            return
+        _discard(self._by_name, _link_key(entry.name), path)
+        for target in self._outgoing.pop(path, set()):
+            _discard(self._incoming, target, path)
+
+    def find(self, name: str) -> list[NoteEntry]:
+        """Return every note whose name resolves from a link to *name*."""
+        with self._lock:
+            paths = self._by_name.get(_link_key(name), set())
+            return sorted((self._entries[p] for p in paths), key=_entry_sort_key)
+
+    def outgoing(self, path: Path) -> set[Path]:
+        with self._lock:
+            return self._outgoing_locked(path)
+
+    def incoming(self, path: Path) -> set[Path]:
+        with self._lock:
+            return self._incoming_locked(path)
+
+    def _outgoing_locked(self, path: Path) -> set[Path]:
+        resolved: set[Path] = set()
+        for target in self._outgoing.get(path, ()):
+            resolved.update(self._by_name.get(target, ()))
+        return resolved
+
+    def _incoming_locked(self, path: Path) -> set[Path]:
+        entry = self._entries.get(path)
+        if entry is None:
+            return set()
+        return set(self._incoming.get(_link_key(entry.name), ())) - {path}
+
+    def related(
+        self,
+        start: Path,
+        depth: int = 1,
+        direction: LinkDirection = LinkDirection.BOTH,
+        limit: int | None = None,
+    ) -> list[RelatedNote]:
+        """Breadth-first traversal from *start* up to *depth* links away.
+
+        Results are ordered by distance, then kind, organization and name.
+        """
+        with self._lock:
+            seen = {start}
+            frontier = [start]
+            found: list[RelatedNote] = []
+            for level in range(1, depth + 1):
+                reached: list[RelatedNote] = []
+                for path in frontier:
+                    out = (
+                        self._outgoing_locked(path) if direction is not LinkDirection.IN else set()
+                    )
+                    back = (
+                        self._incoming_locked(path) if direction is not LinkDirection.OUT else set()
+                    )
+                    for neighbour in (out | back) - seen:
+                        seen.add(neighbour)
+                        reached.append(
+                            RelatedNote(
+                                entry=self._entries[neighbour],
+                                depth=level,
+                                links_to=neighbour in out,
+                                linked_from=neighbour in back,
+                            )
+                        )
+                reached.sort(key=lambda r: _entry_sort_key(r.entry))
+                found.extend(reached)
+                if limit is not None and len(found) >= limit:
+                    return found[:limit]
+                frontier = [r.entry.path for r in reached]
+            return found
+
+
+def _discard(mapping: dict[str, set[Path]], key: str, path: Path) -> None:
+    paths = mapping.get(key)
+    if paths is None:
+        return
+    paths.discard(path)
+    if not paths:
+        del mapping[key]
+
+
+def _entry_sort_key(entry: NoteEntry) -> tuple[str, str, str]:
+    return (entry.kind.value, entry.organization, entry.name)
+
+
+# ---------------------------------------------------------------------------
+# Note summaries
+# ---------------------------------------------------------------------------
+
+# Longest first paragraph kept in a note summary, in characters
+SUMMARY_PARAGRAPH_CHARS = 160
+
+# A word for the word count: any run of non-space characters with a letter or digit in it
+_SUMMARY_WORD_RE = re.compile(r"[^\s\w]*\w\S*")
+
+
+@dataclass(frozen=True)
+class NoteSummary:
+    """A short digest of a note, enough to decide whether to read the rest."""
+
+    first_paragraph: str
+    properties: tuple[str, ...]
+    headings: tuple[str, ...]
+    words: int
+
+
+def _first_paragraph(body: str) -> str:
+    """Return the first run of prose lines in *body*, skipping headings and code blocks."""
+    lines: list[str] = []
+    fence: str | None = None
+    for line in body.splitlines():
+        stripped = line.strip()
+        marker = stripped[:3]
+        if marker in ("```", "~~~"):
+            if lines:
+                break
+            fence = marker if fence is None else (None if fence == marker else fence)
+            continue
+        if fence is not None:
+            continue
+        if not stripped or stripped.startswith("#"):
+            if lines:
+                break
+            continue
+        lines.append(stripped)
+    paragraph = " ".join(" ".join(lines).split())
+    if len(paragraph) > SUMMARY_PARAGRAPH_CHARS:
+        paragraph = paragraph[: SUMMARY_PARAGRAPH_CHARS - 1].rstrip() + "…"
+    return paragraph
+
+
+def summarize_note(text: str) -> NoteSummary:
+    """Digest *text* into its first paragraph, frontmatter keys, headings and word count."""
+    match = _FRONTMATTER_RE.match(text)
+    body = text[match.end() :] if match is not None else text
+    outline = parse_outline(text.encode("utf-8", errors="replace"))
+    return NoteSummary(
+        first_paragraph=_first_paragraph(body),
+        properties=tuple(parse_frontmatter(text)),
+        headings=tuple(section.title for section in outline.sections),
+        words=len(_SUMMARY_WORD_RE.findall(body)),
+    )
+
+
+def format_summary(summary: NoteSummary) -> str:
+    """Render *summary* as the list tools' summary mode shows it."""
+    lines = []
+    if summary.first_paragraph:
+        lines.append(summary.first_paragraph)
+    details = []
+    if summary.properties:
+        details.append("properties: " + ", ".join(summary.properties))
+    if summary.headings:
+        details.append("headings: " + ", ".join(summary.headings))
+    details.append(f"{summary.words} word" if summary.words == 1 else f"{summary.words} words")
+    lines.append(" | ".join(details))
+    return "\n".join(lines)
+
+
+class SummaryIndex:
+    """A :class:`NoteSummary` for every note, computed once per file version.
+
+    Summaries are built from the text the :class:`NotePipeline` already
+    reads, so they cost no extra I/O and are only rebuilt for notes named in
+    a change batch.  Looking one up never touches the disk.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._summaries: dict[Path, NoteSummary] = {}
+
+    def __len__(self) -> int:
+        return len(self._summaries)
+
+    def add_note(self, entry: NoteEntry, text: str) -> None:
+        summary = summarize_note(text)
+        with self._lock:
+            self._summaries[entry.path] = summary
+
+    def remove_note(self, entry: NoteEntry) -> None:
+        with self._lock:
+            self._summaries.pop(entry.path, None)
+
+    def get(self, path: Path) -> NoteSummary | None:
+        """Return the summary of the note at *path*, if it has been analyzed."""
+        with self._lock:
+            return self._summaries.get(path)
+
+    def export_state(self, ids: Mapping[Path, int]) -> Any:
+        with self._lock:
+            return [
+                (ids[path], s.first_paragraph, s.properties, s.headings, s.words)
+                for path, s in self._summaries.items()
+                if path in ids
+            ]
+
+    def import_state(self, entries: Sequence[NoteEntry], state: Any) -> None:
+        summaries = {
+            entries[i].path: NoteSummary(paragraph, tuple(properties), tuple(headings), words)
+            for i, paragraph, properties, headings, words in state
+        }
+        with self._lock:
+            self._summaries = summaries
+
+
+# ---------------------------------------------------------------------------
+# Name suggestions
+# ---------------------------------------------------------------------------
+
+# Minimum trigram similarity for a name to be offered as a suggestion
+SUGGESTION_MIN_SIMILARITY = 0.3
+
+
+def _trigrams(word: str) -> frozenset[str]:
+    padded = f"  {word.casefold()} "
+    return frozenset(padded[i : i + 3] for i in range(len(padded) - 2))
+
+
+class _TrigramBucket:
+    """Posting lists from trigram to the words that contain it."""
+
+    def __init__(self) -> None:
+        self.postings: dict[str, set[str]] = {}
+        self.words: dict[str, frozenset[str]] = {}
+
+    def add(self, word: str) -> None:
+        if word in self.words:
+            return
+        grams = self.words[word] = _trigrams(word)
+        for gram in grams:
+            self.postings.setdefault(gram, set()).add(word)
+
+    def remove(self, word: str) -> None:
+        grams = self.words.pop(word, None)
+        for gram in grams or ():
+            words = self.postings[gram]
+            words.discard(word)
+            if not words:
+                del self.postings[gram]
+
+    def scored(self, grams: frozenset[str]) -> list[tuple[float, str]]:
+        """Return (Dice similarity, word) for every word sharing a trigram with *grams*."""
+        shared: collections.Counter[str] = collections.Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        return [
+            (2.0 * count / (len(grams) + len(self.words[word])), word)
+            for word, count in shared.items()
+        ]
+
+
+def _closest_words(candidates: list[tuple[float, str]], limit: int) -> list[str]:
+    """The *limit* most similar words of scored *candidates* that are similar enough."""
+    best = heapq.nsmallest(
+        limit,
+        (c for c in candidates if c[0] >= SUGGESTION_MIN_SIMILARITY),
+        key=lambda c: (-c[0], c[1]),
+    )
+    return [word for _, word in best]
+
+
+class NameSuggester:
+    """Trigram index over note and organization names for "did you mean" hints.
+
+    Suggestions are only needed when a name fails to resolve, so the
+    trigrams are computed on the first lookup rather than at startup.  From
+    then on the index is updated from the :class:`VaultIndex` change
+    batches, so suggestions never trigger a rescan.  Names are bucketed per
+    (kind, organization), which keeps lookups within an organization
+    proportional to the size of that organization.
+    """
+
+    def __init__(self, index: VaultIndex) -> None:
+        self._lock = threading.Lock()
+        self._index = index
+        self._built = False
+        self._names: dict[tuple[NoteKind, str], _TrigramBucket] = {}
+        self._organizations: dict[NoteKind, _TrigramBucket] = {}
+        index.subscribe(self._on_changes)
+
+    def _build(self) -> None:
+        """Index every name the first time it is needed (call with the lock held)."""
+        if self._built:
+            return
+        for kind in NoteKind:
+            for entry in self._index.entries(kind):
+                self._add(entry)
+        self._built = True
+
+    def _on_changes(self, changes: list[VaultChange]) -> None:
+        with self._lock:
+            if not self._built:
+                return  # The first lookup indexes the names as they are then
+            for change in changes:
+                if change.kind is ChangeKind.DELETED:
+                    self._remove(change.entry)
+                else:
+                    self._add(change.entry)
+
+    def _add(self, entry: NoteEntry) -> None:
+        bucket = self._names.setdefault((entry.kind, entry.organization), _TrigramBucket())
+        bucket.add(entry.name)
+        if entry.organization:
+            self._organizations.setdefault(entry.kind, _TrigramBucket()).add(entry.organization)
+
+    def _remove(self, entry: NoteEntry) -> None:
+        key = (entry.kind, entry.organization)
+        bucket = self._names.get(key)
+        if bucket is None:
+            return
+        bucket.remove(entry.name)
+        if not bucket.words:
+            del self._names[key]
+            orgs = self._organizations.get(entry.kind)
+            if orgs is not None:
+                orgs.remove(entry.organization)
+
+    def suggest(
+        self,
+        kind: NoteKind,
+        name: str,
+        organization: str | None = None,
+        limit: int = 5,
+    ) -> list[tuple[str, str]]:
+        """Return up to *limit* ``(organization, name)`` pairs closest to *name*.
+
+        With *organization*, only names in that organization are considered.
+        """
+        grams = _trigrams(name)
+        with self._lock:
+            self._build()
+            if organization is not None:
+                bucket = self._names.get((kind, organization))
+                buckets = [(organization, bucket)] if bucket is not None else []
+            else:
+                buckets = [(org, b) for (k, org), b in self._names.items() if k is kind]
+            candidates = [
+                (score, org, word)
+                for org, bucket in buckets
+                for score, word in bucket.scored(grams)
+                if score >= SUGGESTION_MIN_SIMILARITY
+            ]
+        best = heapq.nsmallest(limit, candidates, key=lambda c: (-c[0], c[1], c[2]))
+        return [(org, word) for _, org, word in best]
+
+    def suggest_organizations(self, kind: NoteKind, organization: str, limit: int = 5) -> list[str]:
+        """Return up to *limit* existing organizations closest to *organization*."""
+        with self._lock:
+            self._build()
+            bucket = self._organizations.get(kind)
+            candidates = bucket.scored(_trigrams(organization)) if bucket is not None else []
+        return _closest_words(candidates, limit)
+
+    def has_organization(self, kind: NoteKind, organization: str) -> bool:
+        with self._lock:
+            self._build()
+            return (kind, organization) in self._names
+
+
+# ---------------------------------------------------------------------------
+# Change journal
+# ---------------------------------------------------------------------------
+
+# Upper bound on note changes the journal remembers
+CHANGE_JOURNAL_ENTRIES = 10_000
+
+
+@dataclass(frozen=True)
+class JournalChange:
+    """One note change recorded by the :class:`ChangeJournal`."""
+
+    generation: int
+    kind: ChangeKind
+    entry: NoteEntry
+
+
+class ChangeJournal:
+    """A monotonic vault generation number and the recent changes that advanced it.
+
+    Every change batch from the :class:`VaultIndex` bumps the generation by
+    one and is recorded under it.  The journal keeps the last *max_entries*
+    changes; older ones are dropped and :meth:`since` then reports that a
+    client that last looked before them must resynchronize.
+
+    A journal created from scratch starts counting at the current Unix time
+    in milliseconds, so generations keep increasing across restarts even
+    without the index cache; a generation from an earlier run is then simply
+    older than anything the journal holds.  With the cache, the journal is
+    restored and carries on where it left off.
+    """
+
+    def __init__(
+        self, index: VaultIndex | None = None, max_entries: int = CHANGE_JOURNAL_ENTRIES
+    ) -> None:
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+        self._generation = time.time_ns() // 1_000_000
+        self._floor = self._generation
+        self._changes: collections.deque[JournalChange] = collections.deque()
+        if index is not None:
+            index.subscribe(self.record)
+
+    @property
+    def generation(self) -> int:
+        with self._lock:
+            return self._generation
+
+    def record(self, changes: list[VaultChange]) -> None:
+        """Record one change batch under a new generation."""
+        with self._lock:
+            self._generation += 1
+            for change in changes:
+                self._changes.append(JournalChange(self._generation, change.kind, change.entry))
+            while len(self._changes) > self._max_entries:
+                self._floor = self._changes.popleft().generation
+
+    def since(self, generation: int) -> list[JournalChange] | None:
+        """Return the net change to each note after *generation*, oldest first.
+
+        A note added and then edited is reported as added, one that existed
+        before and still does (edited, or deleted and re-created) as modified,
+        and one added and then deleted not at all.
+
+        Returns:
+            The changes, or None if the journal no longer reaches back to
+            *generation* (or never did), so the caller must resynchronize.
+        """
+        with self._lock:
+            if generation < self._floor or generation > self._generation:
+                return None
+            first: dict[Path, ChangeKind] = {}
+            last: dict[Path, JournalChange] = {}
+            for change in reversed(self._changes):
+                if change.generation <= generation:
+                    break
+                path = change.entry.path
+                first[path] = change.kind
+                last.setdefault(path, change)
+        net = []
+        for path, change in last.items():
+            kind = _net_change_kind(first[path], change.kind)
+            if kind is not None:
+                net.append(JournalChange(change.generation, kind, change.entry))
+        net.reverse()  # *last* was filled newest first
+        return net
+
+    def export_state(self) -> Any:
+        with self._lock:
+            return (
+                self._generation,
+                self._floor,
+                [
+                    (
+                        change.generation,
+                        change.kind.value,
+                        change.entry.kind.value,
+                        change.entry.name,
+                        change.entry.organization,
+                        str(change.entry.path),
+                        change.entry.size,
+                        change.entry.mtime_ns,
+                    )
+                    for change in self._changes
+                ],
+            )
+
+    def import_state(self, state: Any) -> None:
+        generation, floor, changes = state
+        with self._lock:
+            self._generation = generation
+            self._floor = floor
+            self._changes = collections.deque(
+                JournalChange(
+                    gen,
+                    ChangeKind(kind),
+                    NoteEntry(NoteKind(note_kind), name, organization, Path(path), size, mtime),
+                )
+                for gen, kind, note_kind, name, organization, path, size, mtime in changes
+            )
+
+
+def _net_change_kind(first: ChangeKind, last: ChangeKind) -> ChangeKind | None:
+    """Combine the first and last change to a note into the change a client must apply."""
+    if first is ChangeKind.ADDED:
+        return None if last is ChangeKind.DELETED else ChangeKind.ADDED
+    if last is ChangeKind.DELETED:
+        return ChangeKind.DELETED
+    return ChangeKind.MODIFIED  # The client had the note before and still does
+
+
+# ---------------------------------------------------------------------------
+# Vault state and snapshots
+# ---------------------------------------------------------------------------
+
+# File signature and layout version of snapshot files
+SNAPSHOT_MAGIC = b"CMPSNAP\x00"
+SNAPSHOT_FORMAT = 4
+_SNAPSHOT_PREFIX = struct.Struct("<8sI")  # magic, header length
+
+# Seconds between checks for a newer snapshot generation in worker processes
+SNAPSHOT_POLL_SECONDS = 0.25
+
+# Subdirectory of the user cache directory that holds index caches
+INDEX_CACHE_DIRNAME = "local-campaign-mcp-obsidian"
+
+
+@dataclass
+class VaultState:
+    """A vault listing, every analyzer derived from it and its change journal.
+
+    With *stored* set, search, frontmatter queries and link traversal are
+    answered by the :class:`SQLiteStore`, so those three analyzers stay
+    empty: they are neither fed nor written to snapshots.
+    """
+
+    index: VaultIndex
+    search: SearchIndex
+    frontmatter: FrontmatterIndex
+    links: LinkGraph
+    summaries: SummaryIndex
+    journal: ChangeJournal
+    stored: bool = False
+    suggester: NameSuggester = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self.suggester = NameSuggester(self.index)
+
+    @classmethod
+    def empty(
+        cls, locations_dir: Path, characters_dir: Path, sessions_dir: Path, stored: bool = False
+    ) -> "VaultState":
+        index = VaultIndex(locations_dir, characters_dir, sessions_dir)
+        return cls(
+            index,
+            SearchIndex(),
+            FrontmatterIndex(),
+            LinkGraph(),
+            SummaryIndex(),
+            ChangeJournal(index),
+            stored,
+        )
+
+    @property
+    def analyzers(self) -> list[SnapshotAnalyzer]:
+        """The analyzers in use, in the order their state is stored in snapshots."""
+        if self.stored:
+            return [self.summaries]
+        return [self.search, self.frontmatter, self.links, self.summaries]
+
+
+@dataclass(frozen=True)
+class VaultSnapshot:
+    """The decoded body of a snapshot file."""
+
+    generation: int
+    listing: dict[str, Any]
+    analyzers: list[Any]
+    journal: Any
+
+
+def _snapshot_header(generation: int, analyzers: list[SnapshotAnalyzer]) -> dict[str, Any]:
+    return {
+        "format": SNAPSHOT_FORMAT,
+        "python": list(sys.version_info[:2]),
+        "byteorder": sys.byteorder,
+        "generation": generation,
+        "analyzers": [type(analyzer).__name__ for analyzer in analyzers],
+        "ignored_dirs": sorted(_ignored_dirs),
+    }
+
+
+def write_snapshot(path: Path, state: VaultState, generation: int) -> int:
+    """Write the listing, per-note analyzer state and change journal of *state* to *path*.
+
+    The file is written under a temporary name and renamed over *path*, so a
+    reader sees either the previous generation or the new one in full.
+    Readers that still map the previous file keep a consistent view of it.
+
+    Returns:
+        The size of the snapshot in bytes.
+    """
+    analyzers = state.analyzers
+    listing, entries = state.index.export_listing()
+    ids = {entry.path: i for i, entry in enumerate(entries)}
+    header = marshal.dumps(_snapshot_header(generation, analyzers))
+    body = marshal.dumps(
+        (
+            listing,
+            [analyzer.export_state(ids) for analyzer in analyzers],
+            state.journal.export_state(),
+        )
+    )
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(_SNAPSHOT_PREFIX.pack(SNAPSHOT_MAGIC, len(header)))
+        f.write(header)
+        f.write(body)
+    os.replace(tmp, path)
+    return _SNAPSHOT_PREFIX.size + len(header) + len(body)
+
+
+def read_snapshot(path: Path, analyzers: list[SnapshotAnalyzer]) -> VaultSnapshot:
+    """Decode the snapshot in *path*.
+
+    The file is mapped only to spare a copy of its raw bytes: the decoded
+    listing and analyzer state are ordinary objects owned by the caller.
+
+    Raises:
+        FileNotFoundError: If *path* does not exist
+        ValueError: If the file is not a snapshot this process can use (another
+            format version, Python version or set of analyzers)
+    """
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if len(mm) < _SNAPSHOT_PREFIX.size:
+            raise ValueError(f"{path} is truncated")
+        magic, header_length = _SNAPSHOT_PREFIX.unpack_from(mm)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a vault snapshot")
+        with memoryview(mm) as view:
+            header_end = _SNAPSHOT_PREFIX.size + header_length
+            header = marshal.loads(view[_SNAPSHOT_PREFIX.size : header_end])
+            expected = _snapshot_header(header.get("generation", 0), analyzers)
+            if header != expected:
+                raise ValueError(f"{path} was written by an incompatible version")
+            listing, analyzer_states, journal = marshal.loads(view[header_end:])
+    return VaultSnapshot(header["generation"], listing, analyzer_states, journal)
+
+
+def restore_snapshot(snapshot: VaultSnapshot, state: VaultState) -> None:
+    """Load *snapshot* into the (empty) index and analyzers of *state*.
+
+    Raises:
+        ValueError: If the snapshot was taken of different vault directories
+    """
+    # Restoring allocates containers by the million, none of them garbage;
+    # letting the cyclic collector rescan them all along the way more than
+    # doubles the time this takes.
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        entries = state.index.restore_listing(snapshot.listing)
+        for analyzer, analyzer_state in zip(state.analyzers, snapshot.analyzers, strict=True):
+            analyzer.import_state(entries, analyzer_state)
+        state.journal.import_state(snapshot.journal)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+class SnapshotPublisher:
+    """Keep a snapshot file in step with a live :class:`VaultState`.
+
+    Used by the indexer process in multi-worker mode.  The publisher
+    subscribes to the index after the :class:`NotePipeline`, so by the time
+    it runs for a change batch every analyzer has already absorbed it.
+    """
+
+    def __init__(self, path: Path, state: VaultState) -> None:
+        self.path = path
+        self.generation = 0
+        self._state = state
+        self._lock = threading.Lock()
+        state.index.subscribe(self._on_changes)
+
+    def publish(self) -> None:
+        with self._lock:
+            self.generation += 1
+            started = time.monotonic()
+            size = write_snapshot(self.path, self._state, self.generation)
+            logger.info(
+                "Published vault snapshot generation %d (%d bytes) in %.2fs",
+                self.generation,
+                size,
+                time.monotonic() - started,
+            )
+
+    def _on_changes(self, changes: list[VaultChange]) -> None:
+        self.publish()
+
+
+def vault_cache_file(
+    locations_dir: Path, characters_dir: Path, sessions_dir: Path, suffix: str
+) -> Path | None:
+    """Return the file with *suffix* that belongs to this vault in the cache directory.
+
+    The directory is ``MCP_CACHE_DIR``, by default
+    ``$XDG_CACHE_HOME/local-campaign-mcp-obsidian``; files are keyed by the
+    vault directories, so several vaults can share it.  Returns None when
+    ``MCP_CACHE_DIR`` is ``off``.
+    """
+    configured = os.environ.get("MCP_CACHE_DIR", "").strip()
+    if configured.lower() == "off":
+        return None
+    if configured:
+        cache_dir = Path(configured).expanduser()
+    else:
+        base = os.environ.get("XDG_CACHE_HOME", "").strip() or Path.home() / ".cache"
+        cache_dir = Path(base) / INDEX_CACHE_DIRNAME
+    roots = "\0".join(str(d) for d in (locations_dir, characters_dir, sessions_dir))
+    digest = hashlib.sha256(roots.encode()).hexdigest()[:16]
+    return cache_dir / f"vault-{digest}{suffix}"
+
+
+class IndexCache:
+    """The vault index kept on disk between runs, so a restart revalidates instead of rescanning.
+
+    The file is a snapshot (see :func:`write_snapshot`) of the listing and
+    every analyzer.  On startup it is restored and then checked against the
+    vault by directory mtime and note size and mtime, so only notes that
+    changed while the server was down are read again.  It is rewritten only
+    when the index has changed since it was last loaded or saved.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._state: VaultState | None = None
+        self._dirty = False
+
+    @classmethod
+    def from_env(
+        cls, locations_dir: Path, characters_dir: Path, sessions_dir: Path
+    ) -> "IndexCache | None":
+        """The cache for this vault under ``MCP_CACHE_DIR`` (None if that is ``off``)."""
+        path = vault_cache_file(locations_dir, characters_dir, sessions_dir, ".snapshot")
+        return cls(path) if path is not None else None
+
+    def load(
+        self, locations_dir: Path, characters_dir: Path, sessions_dir: Path, stored: bool = False
+    ) -> VaultState | None:
+        """Restore a :class:`VaultState` from the cache file, or None if there is no usable one.
+
+        The state is restored as it was saved; :meth:`VaultIndex.refresh`
+        brings it up to date.  A cache saved with the other value of
+        *stored* holds other analyzers and is not usable.
+        """
+        state = VaultState.empty(locations_dir, characters_dir, sessions_dir, stored)
+        try:
+            restore_snapshot(read_snapshot(self.path, state.analyzers), state)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, EOFError, TypeError) as e:
+            logger.warning("Ignoring unusable index cache %s: %s", self.path, e)
+            return None
+        return state
+
+    def attach(self, state: VaultState, dirty: bool) -> None:
+        """Track *state* from now on; *dirty* says whether the file is already behind it."""
+        self._state = state
+        self._dirty = dirty
+        state.index.subscribe(self._on_changes)
+
+    def save(self) -> bool:
+        """Write the attached state if it changed since it was loaded or last saved.
+
+        Failures are logged rather than raised: the cache only saves time.
+        """
+        if self._state is None or not self._dirty:
+            return False
+        self._dirty = False
+        started = time.monotonic()
+        try:
+            self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+            size = write_snapshot(self.path, self._state, generation=0)
+        except OSError as e:
+            logger.warning("Could not write index cache %s: %s", self.path, e)
+            return False
+        logger.info(
+            "Saved index cache %s (%d bytes) in %.2fs",
+            self.path,
+            size,
+            time.monotonic() - started,
+        )
+        return True
+
+    def _on_changes(self, changes: list[VaultChange]) -> None:
+        self._dirty = True
+
+
+class SnapshotFollower:
+    """Load the snapshot published by the indexer and follow newer generations.
+
+    Each generation is loaded into a fresh :class:`VaultState` off the event
+    loop and handed to *install* on the loop in a single step, so a request
+    sees either the old generation or the new one, never a mix.
+
+    Every worker holds its own full copy of the index and analyzers, and
+    loading a generation costs time in proportion to the whole vault, not to
+    what changed.  Nothing is read from the snapshot file in place.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        locations_dir: Path,
+        characters_dir: Path,
+        sessions_dir: Path,
+        install: Callable[[VaultState], None],
+        stored: bool = False,
+    ) -> None:
+        self.path = path
+        self.generation = 0
+        self._dirs = (locations_dir, characters_dir, sessions_dir)
+        self._install = install
+        self._stored = stored
+        self._seen: tuple[int, int, int] | None = None
+
+    def _stamp(self) -> tuple[int, int, int]:
+        st = os.stat(self.path)
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def load(self) -> VaultState:
+        """Read the current snapshot into a new :class:`VaultState`."""
+        stamp = self._stamp()
+        state = VaultState.empty(*self._dirs, stored=self._stored)
+        snapshot = read_snapshot(self.path, state.analyzers)
+        restore_snapshot(snapshot, state)
+        self._seen = stamp
+        self.generation = snapshot.generation
+        return state
+
+    def load_and_install(self) -> None:
+        self._install(self.load())
+
+    async def follow(self, parent_pid: int | None = None) -> None:
+        """Poll for new generations until cancelled (or *parent_pid* goes away)."""
+        while True:
+            await asyncio.sleep(SNAPSHOT_POLL_SECONDS)
+            if parent_pid is not None and os.getppid() != parent_pid:
+                logger.error("Indexer process exited; stopping worker")
+                os.kill(os.getpid(), signal.SIGTERM)
+                return
+            try:
+                if self._stamp() == self._seen:
+                    continue
+                state = await asyncio.to_thread(self.load)
+            except (OSError, ValueError, EOFError) as e:
+                logger.warning("Could not load vault snapshot %s: %s", self.path, e)
+                continue
+            self._install(state)
+            logger.info("Switched to vault snapshot generation %d", self.generation)
+
+
+# ---------------------------------------------------------------------------
+# SQLite storage engine
+# ---------------------------------------------------------------------------
+
+# Bumped whenever the schema changes; a database with another version is rebuilt
+SQLITE_SCHEMA_VERSION = 1
+
+# Notes read and written per transaction while syncing a database with the vault
+SQLITE_SYNC_BATCH = 500
+
+# Bytes of the database file memory-mapped by each connection
+SQLITE_MMAP_BYTES = 256 * 1024 * 1024
+
+_SQLITE_SCHEMA = """
+CREATE TABLE notes (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    organization TEXT NOT NULL,
+    name TEXT NOT NULL,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    link_key TEXT NOT NULL,
+    properties TEXT NOT NULL,
+    body TEXT NOT NULL,
+    UNIQUE (kind, organization, name)
+);
+CREATE INDEX notes_link_key ON notes (link_key);
+CREATE VIEW organizations AS
+    SELECT kind, organization AS name, count(*) AS notes
+    FROM notes WHERE organization != '' GROUP BY kind, organization;
+CREATE TABLE properties (
+    note_id INTEGER NOT NULL REFERENCES notes (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value NOT NULL,
+    PRIMARY KEY (note_id, name, type, value)
+) WITHOUT ROWID;
+CREATE INDEX properties_value ON properties (name, type, value);
+CREATE TABLE links (
+    source_id INTEGER NOT NULL REFERENCES notes (id) ON DELETE CASCADE,
+    target_key TEXT NOT NULL,
+    PRIMARY KEY (source_id, target_key)
+) WITHOUT ROWID;
+CREATE INDEX links_target ON links (target_key);
+CREATE VIRTUAL TABLE notes_fts USING fts5 (
+    name, organization, body, content='notes', content_rowid='id'
+);
+-- Like SearchIndex, rank with BM25 and count a match in a note's name double
+INSERT INTO notes_fts (notes_fts, rank) VALUES ('rank', 'bm25(2.0, 1.0, 1.0)');
+CREATE TRIGGER notes_fts_insert AFTER INSERT ON notes BEGIN
+    INSERT INTO notes_fts (rowid, name, organization, body)
+    VALUES (new.id, new.name, new.organization, new.body);
+END;
+CREATE TRIGGER notes_fts_delete AFTER DELETE ON notes BEGIN
+    INSERT INTO notes_fts (notes_fts, rowid, name, organization, body)
+    VALUES ('delete', old.id, old.name, old.organization, old.body);
+END;
+"""
+
+_NOTE_COLUMNS = "notes.kind, notes.name, notes.organization, notes.path, notes.size, notes.mtime_ns"
+
+
+# Link targets resolve against note names when queried, like in LinkGraph
+_SQL_LINKS_OUT = (
+    "SELECT links.source_id, notes.id FROM links JOIN notes ON notes.link_key = links.target_key"
+    " WHERE links.source_id IN (SELECT value FROM json_each(?))"
+)
+_SQL_LINKS_IN = (
+    "SELECT notes.id, links.source_id FROM notes JOIN links ON links.target_key = notes.link_key"
+    " WHERE notes.id IN (SELECT value FROM json_each(?)) AND links.source_id != notes.id"
+)
+
+_SQL_RANGE_OPERATORS = {"gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+
+def _property_selects(name: str, condition: Any, selects: list[str], params: list[Any]) -> None:
+    """Append a query for the ids of the notes matching each operator of *condition*.
+
+    Raises:
+        ValueError: If the condition is malformed
+    """
+    condition = _query_condition(name, condition)
+    present = "SELECT note_id FROM properties WHERE name = ?"
+    if "exists" in condition:
+        if condition["exists"]:
+            selects.append(present)
+        else:
+            selects.append(f"SELECT id FROM notes WHERE id NOT IN ({present})")
+        params.append(name)
+    if "eq" in condition:
+        selects.append(f"{present} AND type = ? AND value = ?")
+        params.extend([name, *_lookup_key(condition["eq"])])
+    if "in" in condition:
+        keys = [_lookup_key(value) for value in condition["in"]]
+        values = ", ".join(["(?, ?)"] * len(keys))
+        selects.append(
+            f"{present} AND (type, value) IN (VALUES {values})" if keys else f"{present} AND 0"
+        )
+        params.append(name)
+        params.extend(part for key in keys for part in key)
+    ranges = {op: condition[op] for op in _RANGE_OPERATORS if op in condition}
+    if ranges:
+        value_kind, bounds = _range_bounds(name, ranges)
+        tests = "".join(f" AND value {_SQL_RANGE_OPERATORS[op]} ?" for op in bounds)
+        selects.append(f"{present} AND type = ?{tests}")
+        params.extend([name, value_kind, *bounds.values()])
+
+
+class SQLiteStore:
+    """A SQLite mirror of the vault for the listing, lookup, search, query and link tools.
+
+    Selected with ``MCP_STORAGE=sqlite``.  Notes and their text,
+    organizations, frontmatter properties and wikilinks are kept in indexed
+    tables, and note text in an FTS5 table ranked with BM25, so those tools
+    run as indexed queries instead of walking in-memory structures, and the
+    in-memory search, frontmatter and link analyzers are not built.
+
+    The store is a :class:`NoteAnalyzer`: the :class:`NotePipeline` feeds it
+    the same change batches as the in-memory analyzers.  On startup
+    :meth:`sync` brings a database left by an earlier run up to date,
+    reading only notes whose size or mtime differ from their row.  One
+    connection is shared by every thread and serialized by a lock; HTTP
+    worker processes open the indexer's database read-only.
+    """
+
+    def __init__(self, path: Path | str, readonly: bool = False) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._readonly = readonly
+        self._conn = self._connect()
+        if not readonly:
+            self._prepare()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._readonly:
+            uri = f"{Path(self.path).resolve().as_uri()}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False, isolation_level=None)
+        else:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_BYTES}")
+        return conn
+
+    def _prepare(self) -> None:
+        """Create the schema, rebuilding a database of another version (or not a database)."""
+        try:
+            (version,) = self._conn.execute("PRAGMA user_version").fetchone()
+        except sqlite3.DatabaseError:
+            version = -1
+        if version == SQLITE_SCHEMA_VERSION:
+            return
+        if version != 0 and self.path != ":memory:":
+            logger.info("Rebuilding SQLite database %s (schema %d)", self.path, version)
+            self._conn.close()
+            for suffix in ("", "-wal", "-shm"):
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(f"{self.path}{suffix}")
+            self._conn = self._connect()
+        try:
+            self._conn.execute("PRAGMA journal_mode = WAL")
+            self._conn.executescript(
+                f"BEGIN; {_SQLITE_SCHEMA} PRAGMA user_version = {SQLITE_SCHEMA_VERSION}; COMMIT;"
+            )
+        except sqlite3.OperationalError as e:
+            raise RuntimeError(f"Could not create SQLite database {self.path}: {e}") from e
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def add_note(self, entry: NoteEntry, text: str) -> None:
+        with self._lock, self._transaction():
+            self._replace(entry, text)
+
+    def remove_note(self, entry: NoteEntry) -> None:
+        with self._lock, self._transaction():
+            self._delete(str(entry.path))
+
+    def sync(self, index: VaultIndex) -> int:
+        """Bring the database in line with *index*, reading only notes that differ.
+
+        Returns:
+            The number of notes written or deleted.
+        """
+        entries = {str(entry.path): entry for kind in NoteKind for entry in index.entries(kind)}
+        with self._lock:
+            rows = self._conn.execute("SELECT path, size, mtime_ns FROM notes").fetchall()
+        known = {path: (size, mtime_ns) for path, size, mtime_ns in rows}
+        stale = [path for path in known if path not in entries]
+        changed = [
+            entry
+            for path, entry in entries.items()
+            if known.get(path) != (entry.size, entry.mtime_ns)
+        ]
+        with self._lock, self._transaction():
+            for path in stale:
+                self._delete(path)
+        for start in range(0, len(changed), SQLITE_SYNC_BATCH):
+            batch = changed[start : start + SQLITE_SYNC_BATCH]
+            texts = read_note_files(batch, _bulk_read_executor)
+            with self._lock, self._transaction():
+                for entry, text in zip(batch, texts, strict=True):
+                    self._replace(entry, text)
+        return len(stale) + len(changed)
+
+    @contextlib.contextmanager
+    def _transaction(self) -> Iterator[None]:
+        self._conn.execute("BEGIN")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def _delete(self, path: str) -> None:
+        self._conn.execute("DELETE FROM notes WHERE path = ?", (path,))
+
+    def _replace(self, entry: NoteEntry, text: str | None) -> None:
+        """Swap the rows of *entry* for ones built from *text*, inside the open transaction.
+
+        A note whose rows cannot be stored is logged and left out of the
+        database rather than rolling back the rest of the transaction.
+        """
+        path = str(entry.path)
+        self._conn.execute("SAVEPOINT note")
+        try:
+            self._delete(path)
+            if text is not None:
+                self._insert(entry, text)
+        except (sqlite3.IntegrityError, sqlite3.InterfaceError, sqlite3.DataError) as e:
+            self._conn.execute("ROLLBACK TO note")
+            self._delete(path)
+            logger.warning("Could not store note %s in SQLite: %s", path, e)
+        self._conn.execute("RELEASE note")
+
+    def _insert(self, entry: NoteEntry, text: str) -> None:
+        properties = parse_frontmatter(text)
+        targets = parse_wikilinks(text)
+        targets.discard(_link_key(entry.name))
+        cursor = self._conn.execute(
+            "INSERT INTO notes (kind, organization, name, path, size, mtime_ns, link_key,"
+            " properties, body) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                entry.kind.value,
+                entry.organization,
+                entry.name,
+                str(entry.path),
+                entry.size,
+                entry.mtime_ns,
+                _link_key(entry.name),
+                json.dumps(properties, default=str),
+                text,
+            ),
+        )
+        note_id = cursor.lastrowid
+        self._conn.executemany(
+            "INSERT INTO properties VALUES (?, ?, ?, ?)",
+            [
+                (note_id, name, key[0], key[1])
+                for name, key in FrontmatterIndex._index_keys(properties)
+            ],
+        )
+        self._conn.executemany(
+            "INSERT INTO links VALUES (?, ?)", [(note_id, target) for target in targets]
+        )
+
+    def _query(self, sql: str, params: Sequence[Any] = ()) -> list[Any]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    @staticmethod
+    def _entry(row: Sequence[Any]) -> NoteEntry:
+        kind, name, organization, path, size, mtime_ns = row[:6]
+        return NoteEntry(NoteKind(kind), name, organization, Path(path), size, mtime_ns)
+
+    def __len__(self) -> int:
+        return int(self._query("SELECT count(*) FROM notes")[0][0])
+
+    def locations(self) -> list[str]:
+        """Return location names in sorted order."""
+        rows = self._query(
+            "SELECT name FROM notes WHERE kind = 'location' AND organization = '' ORDER BY name"
+        )
+        return [name for (name,) in rows]
+
+    def character_page(
+        self,
+        limit: int,
+        after: tuple[str, str] | None = None,
+        organization: str | None = None,
+    ) -> tuple[list[tuple[NoteEntry, str]], tuple[str, str] | None]:
+        """Return one page of characters and their text, like :meth:`VaultIndex.character_page`.
+
+        Pages are located through the (kind, organization, name) index, so
+        fetching page N costs the same as fetching the first page.
+        """
+        clauses = ["kind = 'character'"]
+        params: list[Any] = []
+        if after is not None:
+            clauses.append("(organization, name) > (?, ?)")
+            params.extend(after)
+        if organization is not None:
+            clauses.append("organization = ?")
+            params.append(organization)
+        rows = self._query(
+            f"SELECT {_NOTE_COLUMNS}, body FROM notes WHERE {' AND '.join(clauses)}"
+            " ORDER BY organization, name LIMIT ?",
+            [*params, limit + 1],
+        )
+        page = [(self._entry(row), row[6]) for row in rows[:limit]]
+        next_key = (page[-1][0].organization, page[-1][0].name) if len(rows) > limit else None
+        return page, next_key
+
+    def note(
+        self, kind: NoteKind, name: str, organization: str = ""
+    ) -> tuple[NoteEntry, str] | None:
+        """Return the entry and text of one note, or None if there is no such note."""
+        rows = self._query(
+            f"SELECT {_NOTE_COLUMNS}, body FROM notes"
+            " WHERE kind = ? AND organization = ? AND name = ?",
+            (kind.value, organization, name),
+        )
+        return (self._entry(rows[0]), rows[0][6]) if rows else None
+
+    def organizations(self, kind: NoteKind) -> list[str]:
+        """Return the organizations that hold notes of *kind*, in sorted order."""
+        rows = self._query(
+            "SELECT name FROM organizations WHERE kind = ? ORDER BY name", (kind.value,)
+        )
+        return [name for (name,) in rows]
+
+    def query(
+        self,
+        where: dict[str, Any],
+        kind: NoteKind | None = None,
+        limit: int | None = None,
+    ) -> list[tuple[NoteEntry, dict[str, Any]]]:
+        """Return notes whose frontmatter satisfies *where*, like :meth:`FrontmatterIndex.query`.
+
+        Each operator becomes a lookup on the ``properties_value`` index and
+        the matches of every condition are intersected in SQL.
+
+        Raises:
+            ValueError: If a condition is malformed
+        """
+        selects: list[str] = []
+        params: list[Any] = []
+        for name, condition in where.items():
+            _property_selects(name.casefold(), condition, selects, params)
+        if not selects:
+            selects.append("SELECT note_id FROM properties")
+        clauses = [f"id IN ({' INTERSECT '.join(selects)})"]
+        if kind is not None:
+            clauses.append("kind = ?")
+            params.append(kind.value)
+        sql = (
+            f"SELECT {_NOTE_COLUMNS}, properties FROM notes WHERE {' AND '.join(clauses)}"
+            " ORDER BY kind, organization, name"
+        )
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [(self._entry(row), json.loads(row[6])) for row in self._query(sql, params)]
+
+    def find(self, name: str) -> list[NoteEntry]:
+        """Return every note a link to *name* resolves to, like :meth:`LinkGraph.find`."""
+        rows = self._query(
+            f"SELECT {_NOTE_COLUMNS} FROM notes WHERE link_key = ?"
+            " ORDER BY kind, organization, name",
+            (_link_key(name),),
+        )
+        return [self._entry(row) for row in rows]
+
+    def related(
+        self,
+        start: Path,
+        depth: int = 1,
+        direction: LinkDirection = LinkDirection.BOTH,
+        limit: int | None = None,
+    ) -> list[RelatedNote]:
+        """Breadth-first traversal from *start*, like :meth:`LinkGraph.related`.
+
+        Each level takes one query per direction for the links of the whole
+        frontier and one for the notes it reaches.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id FROM notes WHERE path = ?", (str(start),)
+            ).fetchone()
+            if row is None:
+                return []
+            seen = {row[0]}
+            frontier = [row[0]]
+            found: list[RelatedNote] = []
+            for level in range(1, depth + 1):
+                ids = json.dumps(frontier)
+                out = self._links(_SQL_LINKS_OUT, ids) if direction is not LinkDirection.IN else {}
+                back = self._links(_SQL_LINKS_IN, ids) if direction is not LinkDirection.OUT else {}
+                reached: dict[int, tuple[bool, bool]] = {}
+                for note_id in frontier:
+                    links_to = out.get(note_id, set())
+                    linked_from = back.get(note_id, set())
+                    for neighbour in (links_to | linked_from) - seen:
+                        seen.add(neighbour)
+                        reached[neighbour] = (neighbour in links_to, neighbour in linked_from)
+                if not reached:
+                    break
+                rows = self._conn.execute(
+                    f"SELECT {_NOTE_COLUMNS}, id FROM notes"
+                    " WHERE id IN (SELECT value FROM json_each(?))"
+                    " ORDER BY kind, organization, name",
+                    (json.dumps(list(reached)),),
+                ).fetchall()
+                found.extend(
+                    RelatedNote(
+                        entry=self._entry(row),
+                        depth=level,
+                        links_to=reached[row[6]][0],
+                        linked_from=reached[row[6]][1],
+                    )
+                    for row in rows
+                )
+                if limit is not None and len(found) >= limit:
+                    return found[:limit]
+                frontier = [row[6] for row in rows]
+            return found
+
+    def _links(self, sql: str, ids: str) -> dict[int, set[int]]:
+        """Map each note in the JSON list *ids* to the notes *sql* pairs it with (lock held)."""
+        links: dict[int, set[int]] = {}
+        for note_id, other in self._conn.execute(sql, (ids,)):
+            links.setdefault(note_id, set()).add(other)
+        return links
+
+    def search(
+        self, query: str, limit: int = 10, kind: NoteKind | None = None
+    ) -> list[tuple[SearchHit, str]]:
+        """Return up to *limit* notes ranked by BM25 for *query*, with snippets.
+
+        Like :meth:`SearchIndex.search`, a note matches if it contains any of
+        the query's terms.
+        """
+        terms = dict.fromkeys(_tokenize(query))
+        if not terms:
+            return []
+        match = " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+        kind_clause = "AND notes.kind = ?" if kind is not None else ""
+        params: list[Any] = [match, *([kind.value] if kind is not None else []), limit, match]
+        # Rank in a subquery so snippets are only cut for the top hits
+        rows = self._query(
+            f"SELECT {_NOTE_COLUMNS}, hits.score, snippet(notes_fts, 2, '', '', '…', 32)"
+            " FROM (SELECT notes.id, -notes_fts.rank AS score"
+            " FROM notes_fts JOIN notes ON notes.id = notes_fts.rowid"
+            f" WHERE notes_fts MATCH ? {kind_clause} ORDER BY notes_fts.rank LIMIT ?) AS hits"
+            " JOIN notes ON notes.id = hits.id JOIN notes_fts ON notes_fts.rowid = hits.id"
+            " WHERE notes_fts MATCH ? ORDER BY hits.score DESC",
+            params,
+        )
+        return [(SearchHit(self._entry(row), row[6]), " ".join(row[7].split())) for row in rows]
+
+
+def sqlite_store_from_env(
+    locations_dir: Path, characters_dir: Path, sessions_dir: Path, readonly: bool = False
+) -> SQLiteStore | None:
+    """Open the SQLite store if ``MCP_STORAGE=sqlite`` (None for the default filesystem engine).
+
+    The database is ``MCP_SQLITE_PATH``, by default a file next to the
+    index cache.
+
+    Raises:
+        SystemExit: If MCP_STORAGE is unknown, or no database path can be
+            worked out
+    """
+    storage = os.environ.get("MCP_STORAGE", "filesystem").strip().lower()
+    if storage == "filesystem":
+        return None
+    if storage != "sqlite":
+        print(
+            f"Error: MCP_STORAGE must be 'filesystem' or 'sqlite', not '{storage}'", file=sys.stderr
+        )
+        sys.exit(1)
+    configured = os.environ.get("MCP_SQLITE_PATH", "").strip()
+    if configured:
+        path = Path(configured).expanduser()
+    else:
+        default = vault_cache_file(locations_dir, characters_dir, sessions_dir, ".sqlite3")
+        if default is None:
+            print(
+                "Error: MCP_STORAGE=sqlite needs MCP_SQLITE_PATH when MCP_CACHE_DIR=off",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+        path = default
+    if not readonly:
+        path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    try:
+        return SQLiteStore(path, readonly=readonly)
+    except (sqlite3.Error, RuntimeError) as e:
+        print(f"Error: could not open SQLite database {path}: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+# ---------------------------------------------------------------------------
+# Vault change watcher
+# ---------------------------------------------------------------------------
+
+# inotify(7) event bits
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+
+_INOTIFY_MASK = (
+    _IN_MODIFY
+    | _IN_ATTRIB
+    | _IN_CLOSE_WRITE
+    | _IN_MOVED_FROM
+    | _IN_MOVED_TO
+    | _IN_CREATE
+    | _IN_DELETE
+    | _IN_DELETE_SELF
+    | _IN_MOVE_SELF
+    | _IN_ONLYDIR
+)
+_INOTIFY_EVENT = struct.Struct("iIII")
+
+# Seconds between full stat sweeps when inotify is unavailable
+WATCH_POLL_INTERVAL = 2.0
+
+
+class _ChangeCoalescer:
+    """Collect changed paths and release them once a write burst has settled.
+
+    A batch is ready when no event has arrived for *quiet_period* seconds, or
+    once the oldest pending event is *max_delay* seconds old so that a long
+    sync is still applied periodically rather than only at its end.
+    """
+
+    def __init__(self, quiet_period: float = 0.25, max_delay: float = 2.0) -> None:
+        self._quiet_period = quiet_period
+        self._max_delay = max_delay
+        self._pending: set[Path] = set()
+        self._first_event = 0.0
+        self._last_event = 0.0
+
+    def add(self, paths: Iterable[Path], now: float) -> None:
+        before = len(self._pending)
+        self._pending.update(paths)
+        if len(self._pending) == before:
+            return
+        if before == 0:
+            self._first_event = now
+        self._last_event = now
+
+    def timeout(self, now: float) -> float | None:
+        """Seconds until the pending batch is ready, or None if nothing is pending."""
+        if not self._pending:
+            return None
+        due = min(self._last_event + self._quiet_period, self._first_event + self._max_delay)
+        return max(0.0, due - now)
+
+    def drain(self, now: float) -> set[Path]:
+        """Return the pending batch if it is ready, else an empty set."""
+        timeout = self.timeout(now)
+        if timeout is None or timeout > 0:
+            return set()
+        batch, self._pending = self._pending, set()
+        return batch
+
+
+class VaultWatcher:
+    """Background thread that keeps a :class:`VaultIndex` in step with the disk."""
+
+    def __init__(self, index: VaultIndex) -> None:
+        self._index = index
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=type(self).__name__, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _run(self) -> None:
+        raise NotImplementedError
+
+
+class PollingWatcher(VaultWatcher):
+    """Portable fallback: sweep directory and note mtimes every *interval* seconds.
+
+    Each sweep applies everything that changed since the previous one as a
+    single batch, so bursts are coalesced by construction.
+    """
+
+    def __init__(self, index: VaultIndex, interval: float = WATCH_POLL_INTERVAL) -> None:
+        super().__init__(index)
+        self._interval = interval
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self._interval):
+            try:
+                self._index.refresh(deep=True)
+            except Exception:
+                logger.exception("Vault poll failed")
+
+
+class InotifyWatcher(VaultWatcher):
+    """Linux watcher built on inotify(7) through :mod:`ctypes`.
+
+    Every directory under a recursively indexed root gets its own watch;
+    watches are added as directories appear.  Events are coalesced by a
+    :class:`_ChangeCoalescer` and applied with :meth:`VaultIndex.apply_changes`.
+    A queue overflow triggers a rescan of every root, which also watches any
+    directory whose creation event was lost.
+
+    Raises:
+        OSError: If inotify is unavailable or the watch limit is exhausted.
+    """
+
+    def __init__(
+        self, index: VaultIndex, quiet_period: float = 0.25, max_delay: float = 2.0
+    ) -> None:
+        super().__init__(index)
+        self._libc = _load_inotify()
+        self._coalescer = _ChangeCoalescer(quiet_period, max_delay)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self._wake_r, self._wake_w = os.pipe()
+        self._closed = False
+        self._resync = False
+        self._watches: dict[int, Path] = {}
+        self._recursive: dict[Path, bool] = dict(index.roots())
+        try:
+            for root, recursive in self._recursive.items():
+                self._watch_tree(root, recursive)
+        except OSError:
+            self._close()
+            raise
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        with contextlib.suppress(OSError):
+            os.write(self._wake_w, b"\0")
+        if self._thread.is_alive():
+            self._thread.join()
+        else:
+            self._close()
+
+    def _close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        for fd in (self._fd, self._wake_r, self._wake_w):
+            with contextlib.suppress(OSError):
+                os.close(fd)
+
+    def _watch_tree(self, top: Path, recursive: bool, watched: Container[Path] = ()) -> None:
+        """Watch *top* and, if *recursive*, every directory below it.
+
+        Directories in *watched* are descended into without being watched again.
+        """
+        pending = [top]
+        while pending:
+            directory = pending.pop()
+            if directory not in watched:
+                wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), _INOTIFY_MASK)
+                if wd < 0:
+                    errno = ctypes.get_errno()
+                    if errno in (ENOENT, ENOTDIR):
+                        continue  # Vanished before we got to it
+                    raise OSError(errno, os.strerror(errno), str(directory))
+                self._watches[wd] = directory
+            if not recursive:
+                continue
+            with contextlib.suppress(OSError), os.scandir(directory) as scanner:
+                for entry in scanner:
+                    if entry.is_dir(follow_symlinks=False) and not _is_ignored_dir(entry.name):
+                        pending.append(Path(entry.path))
+
+    def _is_recursive(self, path: Path) -> bool:
+        return any(
+            recursive and path.is_relative_to(root) for root, recursive in self._recursive.items()
+        )
+
+    def _rescan(self) -> None:
+        """Recover from a queue overflow: watch new directories, then rescan every root."""
+        watched = set(self._watches.values())
+        for root, recursive in self._recursive.items():
+            try:
+                self._watch_tree(root, recursive, watched)
+            except OSError as e:
+                logger.warning("Cannot watch %s: %s", root, e)
+        self._index.refresh(deep=True)
+
+    def _run(self) -> None:
+        try:
+            while not self._stop_event.is_set():
+                timeout = self._coalescer.timeout(time.monotonic())
+                readable, _, _ = select.select([self._fd, self._wake_r], [], [], timeout)
+                if self._fd in readable:
+                    self._coalescer.add(self._read_events(), time.monotonic())
+                batch = self._coalescer.drain(time.monotonic())
+                if not batch:
+                    continue
+                try:
+                    if self._resync:
+                        self._resync = False
+                        self._rescan()
+                    self._index.apply_changes(batch)
+                except Exception:
+                    logger.exception("Applying vault changes failed")
+        finally:
+            self._close()
+
+    def _read_events(self) -> set[Path]:
+        changed: set[Path] = set()
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        while offset + _INOTIFY_EVENT.size <= len(data):
+            wd, mask, _cookie, length = _INOTIFY_EVENT.unpack_from(data, offset)
+            offset += _INOTIFY_EVENT.size
+            raw_name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+
+            if mask & _IN_Q_OVERFLOW:
+                logger.warning("inotify queue overflowed; rescanning the vault")
+                self._resync = True
+                changed.update(self._recursive)
+                continue
+            directory = self._watches.get(wd)
+            if mask & _IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            if directory is None:
+                continue
+            if not raw_name:
+                changed.add(directory)  # DELETE_SELF / MOVE_SELF on the directory
+                continue
+            path = directory / os.fsdecode(raw_name)
+            changed.add(path)
+            if mask & _IN_ISDIR and mask & (_IN_CREATE | _IN_MOVED_TO):
+                if self._is_recursive(path) and not _is_ignored_dir(path.name):
+                    try:
+                        self._watch_tree(path, recursive=True)
+                    except OSError as e:
+                        logger.warning("Cannot watch %s: %s", path, e)
+        return changed
+
+
+def _load_inotify() -> ctypes.CDLL:
+    """Load libc and check that it exposes the inotify system calls.
+
+    Raises:
+        OSError: If not running on Linux or libc lacks inotify.
+    """
+    if not sys.platform.startswith("linux"):
+        raise OSError("inotify is only available on Linux")
+    libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    if not hasattr(libc, "inotify_init1"):
+        raise OSError("libc does not provide inotify")
+    libc.inotify_init1.argtypes = [ctypes.c_int]
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    return libc
+
+
+def start_vault_watcher(index: VaultIndex) -> VaultWatcher | None:
+    """Start the change watcher selected by ``MCP_WATCH``.
+
+    ``auto`` (the default) and ``inotify`` use :class:`InotifyWatcher` where
+    available and fall back to :class:`PollingWatcher`; ``poll`` forces
+    polling and ``off`` disables watching, leaving the index to be
+    revalidated on each request.
+    """
+    mode = os.environ.get("MCP_WATCH", "auto").strip().lower()
+    if mode == "off":
+        return None
+
+    watcher: VaultWatcher | None = None
+    if mode != "poll":
+        try:
+            watcher = InotifyWatcher(index)
+        except OSError as e:
+            logger.warning("inotify unavailable (%s); polling the vault instead", e)
+    if watcher is None:
+        watcher = PollingWatcher(index)
+    watcher.start()
+    logger.info("Watching the vault with %s", type(watcher).__name__)
+    return watcher
+
+
+def calculate_victims_resonance(mood: Mood) -> ResonanceResult:
+    """Calculate victims resonance based on the mood.
+
+    Args:
+        mood: The mood type (Choleric, Melancholic, Phlegmatic, or Sanguine)
+
+    Returns:
+        ResonanceResult with level and optional dyscrasia
+    """
+    # First roll: 1-10
+    first_roll = random.randint(1, 10)
+
+    if first_roll <= 5:
+        level = ResonanceLevel.NEGLIGIBLE
+    elif first_roll <= 8:
+        level = ResonanceLevel.FLEETING
+    else:
+        # Roll again for Intense or Acute
+        second_roll = random.randint(1, 10)
+        if second_roll <= 8:
+            level = ResonanceLevel.INTENSE
+        else:
+            level = ResonanceLevel.ACUTE
+
+    # Dyscrasia only occurs for Acute level
+    dyscrasia = None
+    if level == ResonanceLevel.ACUTE:
+        dyscrasia = random.choice(DYSCRASIA_OPTIONS[mood])
+
+    return ResonanceResult(level=level, dyscrasia=dyscrasia)
+
+
+# ---------------------------------------------------------------------------
+# Blocking I/O dispatch
+# ---------------------------------------------------------------------------
+
+_T = TypeVar("_T")
+
+# Defaults for MCP_IO_WORKERS and MCP_IO_MAX_CONCURRENT
+DEFAULT_IO_WORKERS = 8
+
+
+class IODispatcher:
+    """Run blocking data-access calls on a dedicated thread pool.
+
+    At most *max_concurrent* calls are handed to the pool at once; further
+    callers wait on an :class:`asyncio.Semaphore` on the event loop instead of
+    piling up in the executor queue.  A slow vault therefore delays only the
+    requests that touch it, while tools that do no I/O keep running on the
+    loop at full speed.
+    """
+
+    def __init__(self, workers: int = DEFAULT_IO_WORKERS, max_concurrent: int | None = None):
+        self.workers = workers
+        self.max_concurrent = max_concurrent or workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vault-io")
+        self._semaphores: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, asyncio.Semaphore
+        ] = weakref.WeakKeyDictionary()
+
+    async def run(self, func: Callable[..., _T], *args: Any) -> _T:
+        """Call ``func(*args)`` on the I/O pool and return its result."""
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrent)
+        async with semaphore:
+            return await loop.run_in_executor(self._executor, functools.partial(func, *args))
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# ---------------------------------------------------------------------------
+# Metrics
+# ---------------------------------------------------------------------------
+
+# Histogram bucket upper bounds (the implicit +Inf bucket is added on render)
+LATENCY_BUCKETS_SECONDS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)  # fmt: skip
+RESPONSE_SIZE_BUCKETS_BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Distinct tool labels kept before further names are counted as "other"
+MAX_TOOL_LABELS = 64
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+
+    def __init__(self, buckets: Iterable[float]) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        """Return ``(le, count)`` pairs, ending with ``+Inf``."""
+        bounds = [_format_number(b) for b in self.buckets] + ["+Inf"]
+        return list(zip(bounds, itertools.accumulate(self.counts), strict=True))
+
+
+@dataclass
+class _ToolSeries:
+    calls: int
+    errors: int
+    latency: Histogram
+    response_bytes: Histogram
+
+
+class ToolMetrics:
+    """Per-tool call counts, error counts, latency and response-size histograms.
+
+    Updated from :func:`call_tool` on the event loop and rendered in the
+    Prometheus text exposition format for the ``/metrics`` endpoint.
+    """
+
+    def __init__(self, max_tools: int = MAX_TOOL_LABELS) -> None:
+        self._max_tools = max_tools
+        self._lock = threading.Lock()
+        self._series: dict[str, _ToolSeries] = {}
+
+    def observe(self, tool: str, seconds: float, response_bytes: int, error: bool) -> None:
+        with self._lock:
+            series = self._series.get(tool)
+            if series is None:
+                if len(self._series) >= self._max_tools:
+                    tool = "other"
+                series = self._series.setdefault(
+                    tool,
+                    _ToolSeries(
+                        0,
+                        0,
+                        Histogram(LATENCY_BUCKETS_SECONDS),
+                        Histogram(RESPONSE_SIZE_BUCKETS_BYTES),
+                    ),
+                )
+            series.calls += 1
+            series.errors += error
+            series.latency.observe(seconds)
+            series.response_bytes.observe(response_bytes)
+
+    def render(self) -> str:
+        """Return every series in the Prometheus text format (version 0.0.4)."""
+        with self._lock:
+            tools = sorted(self._series.items())
+            lines = [
+                "# HELP campaign_tool_calls_total Tool calls handled, by tool.",
+                "# TYPE campaign_tool_calls_total counter",
+            ]
+            lines += [
+                f'campaign_tool_calls_total{{tool="{_escape_label(t)}"}} {s.calls}'
+                for t, s in tools
+            ]
+            lines += [
+                "# HELP campaign_tool_errors_total Tool calls that raised or returned an error.",
+                "# TYPE campaign_tool_errors_total counter",
+            ]
+            lines += [
+                f'campaign_tool_errors_total{{tool="{_escape_label(t)}"}} {s.errors}'
+                for t, s in tools
+            ]
+            lines += _render_histograms(
+                "campaign_tool_latency_seconds",
+                "Time spent handling a tool call.",
+                [(t, s.latency) for t, s in tools],
+            )
+            lines += _render_histograms(
+                "campaign_tool_response_bytes",
+                "UTF-8 size of the text returned by a tool call.",
+                [(t, s.response_bytes) for t, s in tools],
+            )
+        return "\n".join(lines) + "\n"
+
+
+def _render_histograms(name: str, help_text: str, series: list[tuple[str, Histogram]]) -> list[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for tool, histogram in series:
+        label = f'tool="{_escape_label(tool)}"'
+        for le, count in histogram.cumulative():
+            lines.append(f'{name}_bucket{{{label},le="{le}"}} {count}')
+        lines.append(f"{name}_sum{{{label}}} {_format_number(histogram.sum)}")
+        lines.append(f"{name}_count{{{label}}} {histogram.count}")
+    return lines
+
+
+def _render_gauge(name: str, help_text: str, value: float, kind: str = "gauge") -> list[str]:
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {value}"]
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _response_size(result: list[TextContent]) -> int:
+    return sum(len(item.text.encode()) for item in result)
+
+
+# Process-wide tool metrics, exposed at /metrics in HTTP mode
+_tool_metrics = ToolMetrics()
+
+
+# ---------------------------------------------------------------------------
+# MCP server
+# ---------------------------------------------------------------------------
+
+# Global directories (initialised in main before the server starts)
+_locations_dir: Path | None = None
+_characters_dir: Path | None = None
+_sessions_dir: Path | None = None
+
+# The vault every tool call reads from (loaded in main before the server starts).
+# Worker processes replace it as a whole when they switch snapshot generations.
+_vault_state: VaultState | None = None
+_vault_watcher: VaultWatcher | None = None
+
+# Set in HTTP worker processes, whose vault state comes from the indexer's snapshots
+_snapshot_follower: SnapshotFollower | None = None
+# Set when MCP_STORAGE=sqlite; the listing, lookup and search tools then query it
+_sqlite_store: SQLiteStore | None = None
+_io_dispatcher: IODispatcher | None = None
+
+
+async def _run_io(func: Callable[..., _T], *args: Any) -> _T:
+    """Run a blocking data-access call on the shared :class:`IODispatcher`."""
+    global _io_dispatcher
+    if _io_dispatcher is None:
+        _io_dispatcher = IODispatcher()
+    return await _io_dispatcher.run(func, *args)
+
+
+_R = TypeVar("_R")
+
+
+def _attempt_read(
+    read: Callable[..., _R], args: tuple[Any, ...]
+) -> _R | ValueError | FileNotFoundError:
+    try:
+        return read(*args)
+    except (ValueError, FileNotFoundError) as e:
+        return e
+
+
+async def read_batch(
+    read: Callable[..., _R], calls: list[tuple[Any, ...]]
+) -> list[_R | ValueError | FileNotFoundError]:
+    """Call *read* once per argument tuple in *calls*, each as its own I/O dispatcher job.
+
+    Used by the batch tools to run :func:`get_location_details` and friends
+    concurrently, within the same ``MCP_IO_MAX_CONCURRENT`` limit as every
+    other vault read.  A call that fails with ValueError or FileNotFoundError
+    yields that exception in its slot instead of failing the batch.
+
+    Returns:
+        One result or exception per call, in the same order as *calls*.
+    """
+    return list(await asyncio.gather(*(_run_io(_attempt_read, read, args) for args in calls)))
+
+
+async def read_notes(entries: list[NoteEntry]) -> list[str | None]:
+    """Read many indexed notes, each as its own I/O dispatcher job.
+
+    The request-time counterpart of :func:`read_note_files`: the reads are
+    spread over the dispatcher's pool, within ``MCP_IO_MAX_CONCURRENT``.
+
+    Returns:
+        The content of each note, in the same order as *entries*, with None
+        for notes that are gone or unreadable.
+    """
+    return list(await asyncio.gather(*(_run_io(_read_entry, entry) for entry in entries)))
+
+
+# When the last request-time revalidation also restatted every note (monotonic)
+_last_deep_refresh = 0.0
+
+
+def _served_state() -> VaultState:
+    """Return the vault state for one tool call, revalidated unless a watcher keeps it current.
+
+    A tool call reads the state once, through this, and hands it to the
+    helpers below; a worker switching snapshot generations mid-call then
+    cannot mix the index of one generation with the analyzers of another.
+
+    Directory mtimes are checked on every call.  Notes edited in place leave
+    those unchanged, so every note is also restatted, like a
+    :class:`PollingWatcher` sweep, at most once per ``WATCH_POLL_INTERVAL``.
+    """
+    global _last_deep_refresh
+    state = _vault_state
+    if state is None:
+        raise RuntimeError("Vault not loaded")
+    if _vault_watcher is None and _snapshot_follower is None:
+        now = time.monotonic()
+        deep = now - _last_deep_refresh >= WATCH_POLL_INTERVAL
+        if deep:
+            _last_deep_refresh = now
+        state.index.refresh(deep=deep)
+    return state
+
+
+# The helpers below answer the listing, lookup, search, query and link tools
+# from whichever storage engine is configured.  The vault index is revalidated first either
+# way, through :func:`_served_state`, since it is what feeds the SQLite store
+# its changes.
+
+
+def _list_locations(state: VaultState) -> list[str]:
+    if _sqlite_store is not None:
+        return _sqlite_store.locations()
+    return state.index.locations()
+
+
+def _stored_character_page(
+    limit: int, after: tuple[str, str] | None, organization: str | None
+) -> tuple[list[tuple[NoteEntry, str | None]], tuple[str, str] | None]:
+    assert _sqlite_store is not None
+    rows, next_key = _sqlite_store.character_page(limit, after, organization)
+    return list(rows), next_key
+
+
+async def _character_page(
+    state: VaultState, limit: int, after: tuple[str, str] | None, organization: str | None
+) -> tuple[list[tuple[NoteEntry, str | None]], tuple[str, str] | None]:
+    if _sqlite_store is not None:
+        return await _run_io(_stored_character_page, limit, after, organization)
+    entries, next_key = state.index.character_page(limit, after, organization)
+    return list(zip(entries, await read_notes(entries), strict=True)), next_key
+
+
+def _read_location(location_name: str, sections: list[str] | None) -> str:
+    assert _locations_dir is not None
+    if _sqlite_store is None or sections:
+        return get_location_details(location_name, _locations_dir, sections)
+    _validate_flat_name(location_name, "location name")
+    _served_state()
+    found = _sqlite_store.note(NoteKind.LOCATION, location_name)
+    if found is None:
+        raise FileNotFoundError(f"Location '{location_name}' not found")
+    return found[1]
+
+
+def _read_character(character_name: str, organization: str, sections: list[str] | None) -> str:
+    assert _characters_dir is not None
+    if _sqlite_store is None or sections:
+        return get_character_details(character_name, organization, _characters_dir, sections)
+    _validate_flat_name(character_name, "character name")
+    _validate_nested_name(organization, "organization")
+    _served_state()
+    found = _sqlite_store.note(NoteKind.CHARACTER, character_name, organization)
+    if found is None:
+        raise FileNotFoundError(
+            f"Character '{character_name}' in organization '{organization}' not found"
+        )
+    return found[1]
+
+
+# The etag of a note has to describe the text served, so when that text comes
+# from the SQLite store its digest is taken from the same row rather than from
+# the file, which the store may not have caught up with.  The text read for it
+# is returned alongside so that it is not read twice.  A request for only part
+# of a note gets an etag that also covers which part it asked for.
+
+
+def _selection_digest(digest: str | None, selection: list[Any] | None) -> str | None:
+    """Combine the digest of a whole note with the normalized *selection* made from it."""
+    if digest is None or selection is None:
+        return digest
+    return content_digest(f"{digest}\0{json.dumps(selection)}")
+
+
+def _heading_key(title: str | None) -> str | None:
+    """A heading as :meth:`Outline.find` compares it."""
+    return title.strip().casefold() if title is not None else None
+
+
+def _sections_selection(sections: list[str] | None) -> list[Any] | None:
+    if not sections:
+        return None
+    return ["sections", sorted({_heading_key(title) for title in sections})]
+
+
+def _location_version(
+    location_name: str, sections: list[str] | None
+) -> tuple[str | None, str | None]:
+    assert _locations_dir is not None
+    if _sqlite_store is None or sections:
+        digest = note_digest(location_path(location_name, _locations_dir))
+        return _selection_digest(digest, _sections_selection(sections)), None
+    text = _read_location(location_name, None)
+    return content_digest(text), text
+
+
+def _character_version(
+    character_name: str, organization: str, sections: list[str] | None
+) -> tuple[str | None, str | None]:
+    assert _characters_dir is not None
+    if _sqlite_store is None or sections:
+        path = character_path(character_name, organization, _characters_dir)
+        return _selection_digest(note_digest(path), _sections_selection(sections)), None
+    text = _read_character(character_name, organization, None)
+    return content_digest(text), text
+
+
+def _search(
+    state: VaultState, query: str, limit: int, kind: NoteKind | None
+) -> list[tuple[SearchHit, str]]:
+    if _sqlite_store is not None:
+        return _sqlite_store.search(query, limit, kind)
+    return search_vault(state.search, query, limit, kind)
+
+
+def _query_notes(
+    state: VaultState, where: dict[str, Any], kind: NoteKind | None, limit: int
+) -> list[tuple[NoteEntry, dict[str, Any]]]:
+    if _sqlite_store is not None:
+        return _sqlite_store.query(where, kind, limit)
+    return state.frontmatter.query(where, kind, limit)
+
+
+def _find_notes(state: VaultState, name: str) -> list[NoteEntry]:
+    if _sqlite_store is not None:
+        return _sqlite_store.find(name)
+    return state.links.find(name)
+
+
+def _related_notes(
+    state: VaultState, start: Path, depth: int, direction: LinkDirection, limit: int
+) -> list[RelatedNote]:
+    if _sqlite_store is not None:
+        return _sqlite_store.related(start, depth, direction, limit)
+    return state.links.related(start, depth, direction, limit)
+
+
+def _character_hints(state: VaultState, character_name: str, organization: str) -> list[str]:
+    """ "Did you mean" lines for a character that was not found.
+
+    Organizations are listed by the SQLite store when there is one; names
+    always come from the :class:`NameSuggester`.
+    """
+    suggester = state.suggester
+    if _sqlite_store is not None:
+        organizations = _sqlite_store.organizations(NoteKind.CHARACTER)
+        known = organization in organizations
+    else:
+        known = suggester.has_organization(NoteKind.CHARACTER, organization)
+    hints = []
+    if known:
+        same_org = suggester.suggest(NoteKind.CHARACTER, character_name, organization)
+        if same_org:
+            names = ", ".join(name for _, name in same_org)
+            hints.append(f"Did you mean (in {organization}): {names}")
+    else:
+        if _sqlite_store is not None:
+            bucket = _TrigramBucket()
+            for candidate in organizations:
+                bucket.add(candidate)
+            orgs = _closest_words(bucket.scored(_trigrams(organization)), 5)
+        else:
+            orgs = suggester.suggest_organizations(NoteKind.CHARACTER, organization)
+        if orgs:
+            hints.append(f"Did you mean organization: {', '.join(orgs)}")
+    if not hints:
+        anywhere = suggester.suggest(NoteKind.CHARACTER, character_name)
+        if anywhere:
+            names = ", ".join(f"{name} ({org})" for org, name in anywhere)
+            hints.append(f"Did you mean: {names}")
+    if not hints:
+        hints.append("No similar characters found. Use list_characters to browse them.")
+    return hints
+
+
+# Summaries are always held in memory, whichever storage engine is configured.
+
+
+def _summary_texts(
+    state: VaultState, entries: list[NoteEntry]
+) -> list[tuple[NoteEntry, str | None]]:
+    texts = []
+    for entry in entries:
+        summary = state.summaries.get(entry.path)
+        texts.append((entry, None if summary is None else format_summary(summary)))
+    return texts
+
+
+def _location_summaries(state: VaultState) -> list[tuple[NoteEntry, str | None]]:
+    return _summary_texts(state, state.index.location_entries())
+
+
+def _character_summary_page(
+    state: VaultState, limit: int, after: tuple[str, str] | None, organization: str | None
+) -> tuple[list[tuple[NoteEntry, str | None]], tuple[str, str] | None]:
+    entries, next_key = state.index.character_page(limit, after, organization)
+    return _summary_texts(state, entries), next_key
+
+
+# Page size bounds for list_characters
+LIST_CHARACTERS_DEFAULT_LIMIT = 50
+LIST_CHARACTERS_MAX_LIMIT = 200
+
+# Result count bounds for search_vault
+SEARCH_DEFAULT_LIMIT = 10
+SEARCH_MAX_LIMIT = 50
+
+# Most notes fetched by one get_locations or get_characters call
+BATCH_MAX_ITEMS = 20
+
+# Result count bounds for query_notes
+QUERY_DEFAULT_LIMIT = 50
+QUERY_MAX_LIMIT = 200
+
+# Create the MCP server
+app = Server("rpg-campaign-server")
+
+
+def _encode_cursor(key: tuple[str, str]) -> str:
+    """Encode an (organization, name) key as an opaque pagination cursor."""
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode()
+
+
+def _sections_argument(arguments: dict[str, Any]) -> list[str] | None:
+    """Validate the optional ``sections`` argument of the get_* tools."""
+    sections = arguments.get("sections")
+    if sections is None:
+        return None
+    if not isinstance(sections, list) or not all(
+        isinstance(title, str) and title.strip() for title in sections
+    ):
+        raise ValueError("'sections' must be a list of heading names")
+    return sections or None
+
+
+def _int_argument(
+    arguments: dict[str, Any], name: str, default: int, minimum: int, maximum: int
+) -> int:
+    """Validate an optional integer argument and clamp it to [*minimum*, *maximum*]."""
+    value = arguments.get(name)
+    if value is None:
+        return default
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(f"'{name}' must be an integer")
+    return max(minimum, min(value, maximum))
+
+
+def _str_argument(arguments: dict[str, Any], name: str) -> str | None:
+    """Validate an optional string argument; an empty string counts as not given."""
+    value = arguments.get(name)
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f"'{name}' must be a string")
+    return value or None
+
+
+_E = TypeVar("_E", bound=Enum)
+
+
+def _enum_argument(arguments: dict[str, Any], name: str, enum: type[_E]) -> _E | None:
+    """Validate an optional argument that names a member of *enum* by value."""
+    value = arguments.get(name)
+    if not value:
+        return None
+    try:
+        return enum(value)
+    except ValueError:
+        choices = ", ".join(str(member.value) for member in enum)
+        raise ValueError(f"'{name}' must be one of: {choices}") from None
+
+
+def _detail_argument(arguments: dict[str, Any], choices: tuple[str, ...]) -> str:
+    """Validate the optional ``detail`` argument of the list_* tools (default: first choice)."""
+    detail = arguments.get("detail") or choices[0]
+    if detail not in choices:
+        raise ValueError(f"'detail' must be one of: {', '.join(choices)}")
+    return str(detail)
+
+
+def _etag_contents(digest: str | None) -> list[TextContent]:
+    """The trailer that tells the client which version of a note it was sent."""
+    if digest is None:
+        return []
+    return [TextContent(type="text", text=f"etag: {digest}")]
+
+
+def _unchanged_contents(arguments: dict[str, Any], digest: str | None) -> list[TextContent] | None:
+    """The short reply for a client whose ``if_none_match`` names the note's current version."""
+    if digest is None or arguments.get("if_none_match") != digest:
+        return None
+    return [TextContent(type="text", text=f"Unchanged (etag: {digest})")]
+
+
+def _decode_cursor(cursor: str) -> tuple[str, str]:
+    """Decode a cursor produced by :func:`_encode_cursor`.
+
+    Raises:
+        ValueError: If *cursor* is malformed.
+    """
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not (isinstance(key, list) and len(key) == 2 and all(isinstance(k, str) for k in key)):
+        raise ValueError("Invalid cursor")
+    return key[0], key[1]
+
+
+@app.list_tools()
+async def list_tools() -> list[Tool]:
+    """List available tools for the RPG campaign server."""
+    return [
+        Tool(
+            name="list_locations",
+            description="Get a list of all available campaign locations",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "detail": {
+                        "type": "string",
+                        "enum": ["names", "summary"],
+                        "description": (
+                            "'names' (default) lists location names; 'summary' adds each "
+                            "note's first paragraph, properties, headings and word count"
+                        ),
+                    },
+                },
+                "required": [],
+            },
+        ),
+        Tool(
+            name="get_location",
+            description="Get detailed information about a specific location by name",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "name": {
+                        "type": "string",
+                        "description": "The name of the location to retrieve",
+                    },
+                    "sections": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": (
+                            "Return only the sections under these headings "
+                            "(case-insensitive, prefixes match), e.g. ['Touchstones']"
+                        ),
+                    },
+                    "if_none_match": {
+                        "type": "string",
+                        "description": (
+                            "The etag returned by an earlier call; if the note has not "
+                            "changed since, only a short 'Unchanged' marker is returned"
+                        ),
+                    },
+                },
+                "required": ["name"],
+            },
+        ),
+        Tool(
+            name="list_characters",
+            description=(
+                "Get the available characters with their organizations, one page at a time. "
+                "Pass the returned cursor to fetch the next page."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "limit": {
+                        "type": "integer",
+                        "description": (
+                            "Maximum number of characters to return "
+                            f"(default {LIST_CHARACTERS_DEFAULT_LIMIT})"
+                        ),
+                        "minimum": 1,
+                        "maximum": LIST_CHARACTERS_MAX_LIMIT,
+                    },
+                    "cursor": {
+                        "type": "string",
+                        "description": "Cursor returned by the previous page",
+                    },
+                    "organization": {
+                        "type": "string",
+                        "description": "Only list characters in this organization/faction",
+                    },
+                    "detail": {
+                        "type": "string",
+                        "enum": ["full", "summary"],
+                        "description": (
+                            "'full' (default) returns each character's whole note; 'summary' "
+                            "returns its first paragraph, properties, headings and word count"
+                        ),
+                    },
+                },
+                "required": [],
+            },
+        ),
+        Tool(
+            name="get_character",
+            description=(
+                "Get detailed information about a specific character by name and organization"
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "name": {
+                        "type": "string",
+                        "description": "The name of the character to retrieve",
+                    },
+                    "organization": {
+                        "type": "string",
+                        "description": "The organization/faction the character belongs to",
+                    },
+                    "sections": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": (
+                            "Return only the sections under these headings "
+                            "(case-insensitive, prefixes match), e.g. ['Touchstones']"
+                        ),
+                    },
+                    "if_none_match": {
+                        "type": "string",
+                        "description": (
+                            "The etag returned by an earlier call; if the note has not "
+                            "changed since, only a short 'Unchanged' marker is returned"
+                        ),
+                    },
+                },
+                "required": ["name", "organization"],
+            },
+        ),
+        Tool(
+            name="get_locations",
+            description=(
+                "Get several locations in one call, e.g. to assemble a scene. Each location "
+                "is returned on its own, with an error in its place if it can't be read."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "names": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Names of the locations to retrieve",
+                        "minItems": 1,
+                        "maxItems": BATCH_MAX_ITEMS,
+                    },
+                    "sections": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": (
+                            "Return only the sections under these headings of every note "
+                            "(case-insensitive, prefixes match), e.g. ['Touchstones']"
+                        ),
+                    },
+                },
+                "required": ["names"],
+            },
+        ),
+        Tool(
+            name="get_characters",
+            description=(
+                "Get several characters in one call. Each character is returned on its "
+                "own, with an error in its place if it can't be read."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "characters": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "name": {"type": "string"},
+                                "organization": {"type": "string"},
+                            },
+                            "required": ["name", "organization"],
+                        },
+                        "description": "The characters to retrieve, by name and organization",
+                        "minItems": 1,
+                        "maxItems": BATCH_MAX_ITEMS,
+                    },
+                    "sections": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": (
+                            "Return only the sections under these headings of every note "
+                            "(case-insensitive, prefixes match), e.g. ['Touchstones']"
+                        ),
+                    },
+                },
+                "required": ["characters"],
+            },
+        ),
+        Tool(
+            name="get_story_so_far",
+            description=(
+                "Get the story so far from previous session notes. The chronicle can be "
+                "long: pass one of 'section', 'last_n_sections' or 'since_heading' to get "
+                "only the part you need."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "section": {
+                        "type": "string",
+                        "description": (
+                            "Return only the section with this heading (case-insensitive; "
+                            "a heading prefix such as 'Session 12' also matches)"
+                        ),
+                    },
+                    "last_n_sections": {
+                        "type": "integer",
+                        "description": "Return only the last N top-level sections",
+                        "minimum": 1,
+                    },
+                    "since_heading": {
+                        "type": "string",
+                        "description": "Return everything from this heading to the end",
+                    },
+                    "if_none_match": {
+                        "type": "string",
+                        "description": (
+                            "The etag returned by an earlier call; if the note has not "
+                            "changed since, only a short 'Unchanged' marker is returned"
+                        ),
+                    },
+                },
+                "required": [],
+            },
+        ),
+        Tool(
+            name="search_vault",
+            description=(
+                "Full-text search over location, character and session notes. "
+                "Returns the best-matching notes with a snippet of each."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "Words to search for",
+                    },
+                    "kind": {
+                        "type": "string",
+                        "description": "Only search notes of this kind",
+                        "enum": [kind.value for kind in NoteKind],
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": (
+                            f"Maximum number of results (default {SEARCH_DEFAULT_LIMIT})"
+                        ),
+                        "minimum": 1,
+                        "maximum": SEARCH_MAX_LIMIT,
+                    },
+                },
+                "required": ["query"],
+            },
+        ),
+        Tool(
+            name="query_notes",
+            description=(
+                "Find notes by their frontmatter properties (e.g. clan, status, generation, "
+                "district). Each condition in 'where' is a value to match, a list of accepted "
+                "values, or an object with operators eq, in, exists, gt, gte, lt, lte."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "where": {
+                        "type": "object",
+                        "description": (
+                            'Property conditions, e.g. {"clan": "Ventrue", '
+                            '"generation": {"lte": 9}, "status": ["alive", "torpor"]}'
+                        ),
+                    },
+                    "kind": {
+                        "type": "string",
+                        "description": "Only return notes of this kind",
+                        "enum": [kind.value for kind in NoteKind],
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": (
+                            f"Maximum number of results (default {QUERY_DEFAULT_LIMIT})"
+                        ),
+                        "minimum": 1,
+                        "maximum": QUERY_MAX_LIMIT,
+                    },
+                },
+                "required": ["where"],
+            },
+        ),
+        Tool(
+            name="get_related",
+            description=(
+                "Get the notes linked to or from a note through [[wikilinks]], up to a given "
+                "depth, optionally with their full content. Use it to pull in the context "
+                "around a location or character in one call."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "name": {
+                        "type": "string",
+                        "description": "Name of the note to start from",
+                    },
+                    "kind": {
+                        "type": "string",
+                        "description": "Kind of the starting note, if the name is ambiguous",
+                        "enum": [kind.value for kind in NoteKind],
+                    },
+                    "organization": {
+                        "type": "string",
+                        "description": "Organization of the starting character, if ambiguous",
+                    },
+                    "depth": {
+                        "type": "integer",
+                        "description": "How many links away to follow (default 1)",
+                        "minimum": 1,
+                        "maximum": RELATED_MAX_DEPTH,
+                    },
+                    "direction": {
+                        "type": "string",
+                        "description": (
+                            "'out' for notes it links to, 'in' for backlinks, 'both' (default)"
+                        ),
+                        "enum": [d.value for d in LinkDirection],
+                    },
+                    "include_content": {
+                        "type": "boolean",
+                        "description": "Also return the markdown of each related note",
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": (
+                            f"Maximum number of related notes (default {RELATED_DEFAULT_LIMIT})"
+                        ),
+                        "minimum": 1,
+                        "maximum": RELATED_MAX_LIMIT,
+                    },
+                },
+                "required": ["name"],
+            },
+        ),
+        Tool(
+            name="changes_since",
+            description=(
+                "List the notes added, modified or deleted since a vault generation, so you "
+                "only re-read what changed. Call it without 'generation' to learn the "
+                "current one."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "generation": {
+                        "type": "integer",
+                        "description": "The generation returned by an earlier changes_since call",
+                    },
+                },
+                "required": [],
+            },
+        ),
+        Tool(
+            name="victims_resonance",
+            description=(
+                "Roll for victims resonance based on mood type. "
+                "Returns a resonance level (Negligible, Fleeting, Intense, or Acute) "
+                "and potentially a dyscrasia."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "mood": {
+                        "type": "string",
+                        "description": "The mood type of the victim",
+                        "enum": ["Choleric", "Melancholic", "Phlegmatic", "Sanguine"],
+                    }
+                },
+                "required": ["mood"],
+            },
+        ),
+    ]
+
+
+@app.call_tool()
+async def call_tool(name: str, arguments: Any) -> list[TextContent]:
+    """Handle tool calls for the RPG campaign server.
+
+    Each call is recorded in :data:`_tool_metrics`.  A call counts as an
+    error if it raises or returns an ``Error:`` message.
+
+    Args:
+        name: Name of the tool to call
+        arguments: Arguments passed to the tool
+
+    Returns:
+        List of text content results
+
+    Raises:
+        ValueError: If the tool name is unknown
+        RuntimeError: If locations directory is not initialized
+    """
+    started = time.perf_counter()
+    try:
+        result = await _dispatch_tool(name, arguments)
+    except Exception:
+        _tool_metrics.observe(name, time.perf_counter() - started, 0, error=True)
+        raise
+    error = bool(result) and result[0].text.startswith("Error:")
+    _tool_metrics.observe(name, time.perf_counter() - started, _response_size(result), error)
+    return result
+
+
+async def _dispatch_tool(name: str, arguments: Any) -> list[TextContent]:
+    if _locations_dir is None or _characters_dir is None or _sessions_dir is None:
+        raise RuntimeError("Directories not initialized")
+
+    if name == "list_locations":
+        try:
+            detail = _detail_argument(arguments, ("names", "summary"))
+        except ValueError as e:
+            return [TextContent(type="text", text=f"Error: {e}")]
+
+        state = await _run_io(_served_state)
+        summaries = None
+        if detail == "summary":
+            summaries = _location_summaries(state)
+            locations = [entry.name for entry, _ in summaries]
+        else:
+            locations = await _run_io(_list_locations, state)
+        if not locations:
+            return [
+                TextContent(
+                    type="text",
+                    text=(
+                        f"No locations found in {_locations_dir}. "
+                        "Add markdown files to this directory."
+                    ),
+                )
+            ]
+
+        if summaries is not None:
+            location_list = "\n\n".join(
+                f"## {entry.name}\n{summary}" for entry, summary in summaries if summary is not None
+            )
+            return [
+                TextContent(
+                    type="text",
+                    text=f"Available locations ({len(locations)}):\n\n{location_list}",
+                )
+            ]
+
+        location_list = "\n".join(f"- {loc}" for loc in locations)
+        return [
+            TextContent(
+                type="text",
+                text=f"Available locations ({len(locations)}):\n{location_list}",
+            )
+        ]
+
+    elif name == "get_location":
+        location_name = arguments.get("name")
+        if not location_name:
+            return [
+                TextContent(
+                    type="text",
+                    text="Error: 'name' parameter is required",
+                )
+            ]
+
+        try:
+            sections = _sections_argument(arguments)
+            digest, content = await _run_io(_location_version, location_name, sections)
+            unchanged = _unchanged_contents(arguments, digest)
+            if unchanged is not None:
+                return unchanged
+            if content is None:
+                content = await _run_io(_read_location, location_name, sections)
+            return [
+                TextContent(
+                    type="text",
+                    text=f"# {location_name}\n\n{content}",
+                ),
+                *_etag_contents(digest),
+            ]
+        except ValueError as e:
+            return [TextContent(type="text", text=f"Error: {e}")]
+        except FileNotFoundError as e:
+            state = await _run_io(_served_state)
+            suggestions = state.suggester.suggest(NoteKind.LOCATION, location_name)
+            if suggestions:
+                hint = "Did you mean: " + ", ".join(name for _, name in suggestions)
+            else:
+                hint = "No similar locations found. Use list_locations to see them all."
+            return [
+                TextContent(
+                    type="text",
+                    text=f"Error: {e}\n\n{hint}",
+                )
+            ]
+
+    elif name == "list_characters":
+        try:
+            organization = _str_argument(arguments, "organization")
+            cursor = _str_argument(arguments, "cursor")
+            limit = _int_argument(
+                arguments, "limit", LIST_CHARACTERS_DEFAULT_LIMIT, 1, LIST_CHARACTERS_MAX_LIMIT
+            )
+            after = _decode_cursor(cursor) if cursor else None
+            detail = _detail_argument(arguments, ("full", "summary"))
+        except ValueError as e:
+            return [TextContent(type="text", text=f"Error: {e}")]
+
+        state = await _run_io(_served_state)
+        if detail == "summary":
+            page, next_key = _character_summary_page(state, limit, after, organization)
+        else:
+            page, next_key = await _character_page(state, limit, after, organization)
+        if not page and organization is not None and after is None:
+            return [
+                TextContent(
+                    type="text",
+                    text=f"No characters found in organization '{organization}'.",
+                )
+            ]
+        if not page and after is None:
+            return [
+                TextContent(
+                    type="text",
+                    text=(
+                        f"No characters found in {_characters_dir}. "
+                        "Add markdown files to subdirectories."
+                    ),
+                )
+            ]
+
+        character_details = [
+            TextContent(
+                type="text",
+                text=f"# {char.name} ({char.organization})\n\n{content}",
+            )
+            for char, content in page
+            if content is not None
+        ]
+        if next_key is not None:
+            character_details.append(
+                TextContent(
+                    type="text",
+                    text=f"More characters available. Next cursor: {_encode_cursor(next_key)}",
+                )
+            )
+        elif not character_details:
+            character_details.append(TextContent(type="text", text="No more characters."))
+        return character_details
+
+    elif name == "get_character":
+        character_name = arguments.get("name")
+        organization = arguments.get("organization")
+
+        if not character_name:
+            return [
+                TextContent(
+                    type="text",
+                    text="Error: 'name' parameter is required",
+                )
+            ]
+
+        if not organization:
+            return [
+                TextContent(
+                    type="text",
+                    text="Error: 'organization' parameter is required",
+                )
+            ]
+
+        try:
+            sections = _sections_argument(arguments)
+            digest, content = await _run_io(
+                _character_version, character_name, organization, sections
+            )
+            unchanged = _unchanged_contents(arguments, digest)
+            if unchanged is not None:
+                return unchanged
+            if content is None:
+                content = await _run_io(_read_character, character_name, organization, sections)
+            return [
+                TextContent(
+                    type="text",
+                    text=f"# {character_name} ({organization})\n\n{content}",
+                ),
+                *_etag_contents(digest),
+            ]
+        except ValueError as e:
+            return [TextContent(type="text", text=f"Error: {e}")]
+        except FileNotFoundError as e:
+            state = await _run_io(_served_state)
+            hints = await _run_io(_character_hints, state, character_name, organization)
+            return [
+                TextContent(
+                    type="text",
+                    text=f"Error: {e}\n\n" + "\n".join(hints),
+                )
+            ]
+
+    elif name == "get_locations":
+        names = arguments.get("names")
+        if (
+            not isinstance(names, list)
+            or not names
+            or not all(isinstance(n, str) and n for n in names)
+        ):
+            return [
+                TextContent(
+                    type="text",
+                    text="Error: 'names' must be a non-empty list of location names",
+                )
+            ]
+        if len(names) > BATCH_MAX_ITEMS:
+            return [
+                TextContent(
+                    type="text",
+                    text=f"Error: at most {BATCH_MAX_ITEMS} locations can be fetched at once",
+                )
+            ]
+        try:
+            sections = _sections_argument(arguments)
+        except ValueError as e:
+            return [TextContent(type="text", text=f"Error: {e}")]
+
+        replies = await read_batch(_read_location, [(n, sections) for n in names])
+        return [
+            TextContent(
+                type="text",
+                text=f"# {location_name}\n\n"
+                + (f"Error: {reply}" if isinstance(reply, Exception) else reply),
+            )
+            for location_name, reply in zip(names, replies, strict=True)
+        ]
+
+    elif name == "get_characters":
+        characters = arguments.get("characters")
+        if (
+            not isinstance(characters, list)
+            or not characters
+            or not all(
+                isinstance(c, dict)
+                and isinstance(c.get("name"), str)
+                and c["name"]
+                and isinstance(c.get("organization"), str)
+                and c["organization"]
+                for c in characters
+            )
+        ):
+            return [
+                TextContent(
+                    type="text",
+                    text=(
+                        "Error: 'characters' must be a non-empty list of "
+                        "{name, organization} objects"
+                    ),
+                )
+            ]
+        if len(characters) > BATCH_MAX_ITEMS:
+            return [
+                TextContent(
+                    type="text",
+                    text=f"Error: at most {BATCH_MAX_ITEMS} characters can be fetched at once",
                 )
             ]
-
         try:
-            content = get_location_details(location_name, _locations_dir)
+            sections = _sections_argument(arguments)
+        except ValueError as e:
+            return [TextContent(type="text", text=f"Error: {e}")]
+
+        calls = [(c["name"], c["organization"], sections) for c in characters]
+        replies = await read_batch(_read_character, calls)
+        return [
+            TextContent(
+                type="text",
+                text=f"# {character_name} ({organization})\n\n"
+                + (f"Error: {reply}" if isinstance(reply, Exception) else reply),
+            )
+            for (character_name, organization, _), reply in zip(calls, replies, strict=True)
+        ]
+
+    elif name == "get_story_so_far":
+        last_n = arguments.get("last_n_sections")
+        if last_n is not None and (
+            isinstance(last_n, bool) or not isinstance(last_n, int) or last_n < 1
+        ):
             return [
                 TextContent(
                     type="text",
-                    text=f"# {location_name}\n\n{content}",
+                    text="Error: 'last_n_sections' must be a positive integer",
                 )
             ]
+        try:
+            section = _str_argument(arguments, "section")
+            since_heading = _str_argument(arguments, "since_heading")
         except ValueError as e:
             return [TextContent(type="text", text=f"Error: {e}")]
-        except FileNotFoundError as e:
-            available = get_all_locations(_locations_dir)
-            available_text = ", ".join(available) if available else "none"
+        selection = None
+        if section or last_n or since_heading:
+            selection = ["story", _heading_key(section), last_n, _heading_key(since_heading)]
+        digest = _selection_digest(
+            await _run_io(note_digest, _sessions_dir / "__result.md"), selection
+        )
+        unchanged = _unchanged_contents(arguments, digest)
+        if unchanged is not None:
+            return unchanged
+        try:
+            content = await _run_io(
+                functools.partial(
+                    get_story_so_far,
+                    _sessions_dir,
+                    section=section,
+                    last_n_sections=last_n,
+                    since_heading=since_heading,
+                )
+            )
             return [
                 TextContent(
                     type="text",
-                    text=f"Error: {e}\n\nAvailable locations: {available_text}",
-                )
+                    text=f"# Story So Far\n\n{content}",
+                ),
+                *_etag_contents(digest),
             ]
-
-    elif name == "list_characters":
-        characters = get_all_characters(_characters_dir)
-        if not characters:
+        except ValueError as e:
+            return [TextContent(type="text", text=f"Error: {e}")]
+        except FileNotFoundError as e:
             return [
                 TextContent(
                     type="text",
                     text=(
-                        f"No characters found in {_characters_dir}. "
-                        "Add markdown files to subdirectories."
+                        f"Error: {e}\n\nPlease ensure the '__result.md'"
+                        f" file exists in {_sessions_dir}"
                     ),
                 )
             ]
 
-        character_details = []
-        for char in characters:
-            content = get_character_details(char["name"], char["organization"], _characters_dir)
-            character_details.append(
+    elif name == "search_vault":
+        try:
+            query = _str_argument(arguments, "query")
+        except ValueError as e:
+            return [TextContent(type="text", text=f"Error: {e}")]
+        if not query:
+            return [
                 TextContent(
                     type="text",
-                    text=f"# {char['name']} ({char['organization']})\n\n{content}",
+                    text="Error: 'query' parameter is required",
                 )
+            ]
+        try:
+            limit = _int_argument(arguments, "limit", SEARCH_DEFAULT_LIMIT, 1, SEARCH_MAX_LIMIT)
+            kind = _enum_argument(arguments, "kind", NoteKind)
+        except ValueError as e:
+            return [TextContent(type="text", text=f"Error: {e}")]
+        state = await _run_io(_served_state)
+        results = await _run_io(_search, state, query, limit, kind)
+        if not results:
+            return [TextContent(type="text", text=f"No notes match '{query}'.")]
+
+        lines = [f"Search results for '{query}' ({len(results)}):"]
+        for rank, (hit, snippet) in enumerate(results, start=1):
+            lines.append(
+                f"\n{rank}. [{hit.entry.kind.value}] {_entry_label(hit.entry)}"
+                f" (score {hit.score:.2f})\n   {snippet}"
             )
-        return character_details
-
-    elif name == "get_character":
-        character_name = arguments.get("name")
-        organization = arguments.get("organization")
+        return [TextContent(type="text", text="\n".join(lines))]
 
-        if not character_name:
+    elif name == "query_notes":
+        where = arguments.get("where")
+        if not isinstance(where, dict) or not where:
             return [
                 TextContent(
                     type="text",
-                    text="Error: 'name' parameter is required",
+                    text="Error: 'where' parameter is required",
                 )
             ]
+        try:
+            limit = _int_argument(arguments, "limit", QUERY_DEFAULT_LIMIT, 1, QUERY_MAX_LIMIT)
+            kind = _enum_argument(arguments, "kind", NoteKind)
+        except ValueError as e:
+            return [TextContent(type="text", text=f"Error: {e}")]
+        state = await _run_io(_served_state)
+        try:
+            matches = await _run_io(_query_notes, state, where, kind, limit + 1)
+        except ValueError as e:
+            return [TextContent(type="text", text=f"Error: {e}")]
+        if not matches:
+            return [TextContent(type="text", text="No notes match the query.")]
 
-        if not organization:
+        lines = [f"Matching notes ({min(len(matches), limit)}):"]
+        for entry, properties in matches[:limit]:
+            lines.append(
+                f"- [{entry.kind.value}] {_entry_label(entry)}: {_format_properties(properties)}"
+            )
+        if len(matches) > limit:
+            lines.append(f"(more than {limit} matches; narrow the query or raise 'limit')")
+        return [TextContent(type="text", text="\n".join(lines))]
+
+    elif name == "get_related":
+        try:
+            note_name = _str_argument(arguments, "name")
+        except ValueError as e:
+            return [TextContent(type="text", text=f"Error: {e}")]
+        if not note_name:
             return [
                 TextContent(
                     type="text",
-                    text="Error: 'organization' parameter is required",
+                    text="Error: 'name' parameter is required",
                 )
             ]
-
         try:
-            content = get_character_details(character_name, organization, _characters_dir)
+            kind = _enum_argument(arguments, "kind", NoteKind)
+            depth = _int_argument(arguments, "depth", 1, 1, RELATED_MAX_DEPTH)
+            direction = _enum_argument(arguments, "direction", LinkDirection) or LinkDirection.BOTH
+            limit = _int_argument(arguments, "limit", RELATED_DEFAULT_LIMIT, 1, RELATED_MAX_LIMIT)
+        except ValueError as e:
+            return [TextContent(type="text", text=f"Error: {e}")]
+        state = await _run_io(_served_state)
+
+        organization = arguments.get("organization")
+        candidates = [
+            entry
+            for entry in await _run_io(_find_notes, state, note_name)
+            if (kind is None or entry.kind is kind)
+            and (organization is None or entry.organization == organization)
+        ]
+        if not candidates:
+            return [TextContent(type="text", text=f"Error: Note '{note_name}' not found")]
+        if len(candidates) > 1:
+            options = ", ".join(f"{_entry_label(e)} [{e.kind.value}]" for e in candidates)
             return [
                 TextContent(
                     type="text",
-                    text=f"# {character_name} ({organization})\n\n{content}",
+                    text=(
+                        f"Error: '{note_name}' is ambiguous: {options}. "
+                        "Pass 'kind' and/or 'organization' to choose one."
+                    ),
                 )
             ]
-        except ValueError as e:
-            return [TextContent(type="text", text=f"Error: {e}")]
-        except FileNotFoundError as e:
-            characters = get_all_characters(_characters_dir)
-            # Show characters from the same organization if available
-            same_org = [c["name"] for c in characters if c["organization"] == organization]
-            if same_org:
-                available_text = f"Available in {organization}: {', '.join(same_org)}"
-            else:
-                all_orgs = sorted(set(c["organization"] for c in characters))
-                available_text = f"Available organizations: {', '.join(all_orgs)}"
+
+        start = candidates[0]
+        related = await _run_io(_related_notes, state, start.path, depth, direction, limit)
+        if not related:
             return [
                 TextContent(
                     type="text",
-                    text=f"Error: {e}\n\n{available_text}",
+                    text=f"No linked notes found for {_entry_label(start)}.",
                 )
             ]
 
-    elif name == "get_story_so_far":
-        try:
-            content = get_story_so_far(_sessions_dir)
+        lines = [f"# Related to {_entry_label(start)} ({start.kind.value})", ""]
+        for note in related:
+            relation = {
+                (True, True): "mutual link",
+                (True, False): "outgoing link",
+                (False, True): "backlink",
+                (False, False): "",
+            }[(note.links_to, note.linked_from)]
+            suffix = f", {relation}" if relation else ""
+            lines.append(
+                f"- [{note.entry.kind.value}] {_entry_label(note.entry)}"
+                f" (depth {note.depth}{suffix})"
+            )
+        output = [TextContent(type="text", text="\n".join(lines))]
+        if arguments.get("include_content"):
+            entries = [note.entry for note in related]
+            contents = await read_notes(entries)
+            output.extend(
+                TextContent(type="text", text=f"# {_entry_label(entry)}\n\n{content}")
+                for entry, content in zip(entries, contents, strict=True)
+                if content is not None
+            )
+        return output
+
+    elif name == "changes_since":
+        since = arguments.get("generation")
+        if since is not None and (isinstance(since, bool) or not isinstance(since, int)):
             return [
                 TextContent(
                     type="text",
-                    text=f"# Story So Far\n\n{content}",
+                    text="Error: 'generation' must be an integer",
                 )
             ]
-        except FileNotFoundError as e:
+        state = await _run_io(_served_state)
+        current = state.journal.generation
+        if since is None:
+            return [TextContent(type="text", text=f"Current vault generation: {current}")]
+        changes = state.journal.since(since)
+        if changes is None:
             return [
                 TextContent(
                     type="text",
                     text=(
-                        f"Error: {e}\n\nPlease ensure the '__result.md'"
-                        f" file exists in {_sessions_dir}"
+                        f"Resync required: changes since generation {since} are no longer "
+                        f"known. Re-list the vault; the current generation is {current}."
                     ),
                 )
             ]
+        if not changes:
+            return [
+                TextContent(
+                    type="text",
+                    text=f"No changes since generation {since}. Current generation: {current}",
+                )
+            ]
+        lines = [f"Changes since generation {since} ({len(changes)}), now at {current}:"]
+        lines.extend(
+            f"- {change.kind.value} [{change.entry.kind.value}] {_entry_label(change.entry)}"
+            f" (generation {change.generation})"
+            for change in changes
+        )
+        return [TextContent(type="text", text="\n".join(lines))]
 
     elif name == "victims_resonance":
         mood_str = arguments.get("mood")
@@ -778,40 +5549,166 @@ async def call_tool(name: str, arguments: Any) -> list[TextContent]:
 # ---------------------------------------------------------------------------
 
 
+# Upper bound on clients the rate limiter tracks at once
+RATE_LIMIT_MAX_CLIENTS = 100_000
+
+
 class _RateLimiter:
-    """Sliding-window in-memory rate limiter (per client IP)."""
+    """In-memory rate limiter (per client key) using the generic cell rate algorithm.
+
+    Each client costs a single float: its theoretical arrival time (TAT).
+    Units are spaced ``window_seconds / max_requests`` apart, with bursts of
+    up to *max_requests* units allowed; a request may cost more or less than
+    one unit.  A client whose TAT has passed is
+    indistinguishable from a new one, so such entries are dropped as they
+    reach the front of the LRU order.  At most *max_clients* are tracked; past
+    that, the least recently seen client is forgotten.  Every check is O(1)
+    amortized.
+    """
 
-    def __init__(self, max_requests: int = 60, window_seconds: int = 60) -> None:
-        self._max = max_requests
+    def __init__(
+        self,
+        max_requests: int = 60,
+        window_seconds: int = 60,
+        max_clients: int = RATE_LIMIT_MAX_CLIENTS,
+    ) -> None:
         self._window = float(window_seconds)
-        self._store: dict[str, collections.deque[float]] = {}
+        self._burst = float(max_requests)
+        self._interval = self._window / max_requests
+        self._max_clients = max_clients
+        self._store: collections.OrderedDict[str, float] = collections.OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._store)
 
-    def is_allowed(self, client_id: str) -> bool:
+    def wait_time(self, client_id: str, cost: float = 1.0) -> float:
+        """Seconds until a request costing *cost* units would be allowed (0.0 if now).
+
+        Costs above the burst size are clamped to it, so an expensive request
+        is admitted once the client is idle and then leaves it in debt.
+        """
         now = time.monotonic()
-        window = self._store.setdefault(client_id, collections.deque())
-        cutoff = now - self._window
-        while window and window[0] < cutoff:
-            window.popleft()
-        if len(window) >= self._max:
-            return False
-        window.append(now)
-        return True
+        tat = max(self._store.get(client_id, now), now)
+        return max(0.0, tat + min(cost, self._burst) * self._interval - now - self._window)
+
+    def charge(self, client_id: str, cost: float = 1.0) -> None:
+        """Record *cost* units against *client_id* unconditionally."""
+        now = time.monotonic()
+        store = self._store
+        store[client_id] = max(store.get(client_id, now), now) + cost * self._interval
+        store.move_to_end(client_id)
+        while len(store) > self._max_clients:
+            store.popitem(last=False)
+        while store:
+            oldest, oldest_tat = next(iter(store.items()))
+            if oldest_tat > now:
+                break
+            del store[oldest]
+
+    def retry_after(self, client_id: str, cost: float = 1.0) -> float:
+        """Record a request from *client_id* if allowed.
+
+        Returns 0.0 when the request is allowed, otherwise the number of
+        seconds until it would be.
+        """
+        wait = self.wait_time(client_id, cost)
+        if not wait:
+            self.charge(client_id, cost)
+        return wait
+
+    def is_allowed(self, client_id: str, cost: float = 1.0) -> bool:
+        return self.retry_after(client_id, cost) == 0.0
+
+
+# Rate-limit units charged per tool call; anything else costs one unit
+DEFAULT_TOOL_COSTS: dict[str, float] = {
+    "victims_resonance": 0.25,
+    "changes_since": 0.5,
+    "list_locations": 0.5,
+    "get_location": 1.0,
+    "get_character": 1.0,
+    "query_notes": 1.0,
+    "get_story_so_far": 2.0,
+    "get_locations": 3.0,
+    "get_characters": 3.0,
+    "search_vault": 2.0,
+    "get_related": 2.0,
+    "list_characters": 3.0,
+}
 
+# Largest request body inspected to find the tool being called; larger ones are refused
+MAX_INSPECTED_BODY_BYTES = 1024 * 1024
 
-class _APIKeyMiddleware:
-    """ASGI middleware: require a Bearer token and enforce per-IP rate limiting.
 
-    The token is compared with :func:`hmac.compare_digest` to prevent
-    timing-based side-channel attacks.
+@dataclass(frozen=True)
+class ToolCosts:
+    """How many rate-limit units an MCP request costs.
+
+    A ``tools/call`` message costs its tool's weight, and any other JSON-RPC
+    message costs *default*.  When *bytes_per_unit* is set, every that many
+    bytes of response body cost one more unit, charged once the response is
+    sent.
     """
 
-    def __init__(self, app: Any, api_key: str) -> None:
+    weights: dict[str, float]
+    default: float = 1.0
+    bytes_per_unit: int = 0
+
+    def request_cost(self, body: bytes) -> float:
+        """Return the cost of a JSON-RPC request (or batch) body."""
+        try:
+            payload = json.loads(body)
+        except (ValueError, UnicodeDecodeError):
+            return self.default
+        messages = payload if isinstance(payload, list) else [payload]
+        cost = 0.0
+        for message in messages:
+            tool = None
+            if isinstance(message, dict) and message.get("method") == "tools/call":
+                params = message.get("params")
+                tool = params.get("name") if isinstance(params, dict) else None
+            cost += self.weights.get(tool, self.default) if isinstance(tool, str) else self.default
+        return cost or self.default
+
+    def response_cost(self, size: int) -> float:
+        return size / self.bytes_per_unit if self.bytes_per_unit else 0.0
+
+
+class _APIKeyMiddleware:
+    """ASGI middleware: require a Bearer token and enforce cost-weighted rate limits.
+
+    Tokens are compared with :func:`hmac.compare_digest` to prevent
+    timing-based side-channel attacks.  *api_keys* is a single key or a
+    mapping of identity name to key; each identity gets its own quota on top
+    of the per-IP one, so a heavy client cannot starve another key's
+    session.  Requests are charged by :class:`ToolCosts`, and both quotas
+    must have room for a request to pass; a POST body too large to price
+    (over ``MAX_INSPECTED_BODY_BYTES``) is refused with 413.  Requests for *exempt_paths* are
+    passed through untouched; the endpoints mounted there enforce their own
+    policy.
+    """
+
+    def __init__(
+        self,
+        app: Any,
+        api_keys: str | Mapping[str, str],
+        exempt_paths: Iterable[str] = (),
+        *,
+        ip_limit: int = 60,
+        identity_limit: int = 120,
+        costs: ToolCosts | None = None,
+    ) -> None:
         self._app = app
-        self._api_key_bytes = api_key.encode()
-        self._limiter = _RateLimiter(max_requests=60, window_seconds=60)
+        if isinstance(api_keys, str):
+            api_keys = {"default": api_keys}
+        self._api_keys = [(name, key.encode()) for name, key in api_keys.items()]
+        self._limiter = _RateLimiter(max_requests=ip_limit, window_seconds=60)
+        self._identity_limiter = _RateLimiter(max_requests=identity_limit, window_seconds=60)
+        self._costs = costs or ToolCosts(DEFAULT_TOOL_COSTS)
+        self._exempt_paths = frozenset(exempt_paths)
 
     async def __call__(self, scope: _Scope, receive: _Receive, send: _Send) -> None:
-        if scope["type"] not in ("http", "websocket"):
+        if scope["type"] not in ("http", "websocket") or scope.get("path") in self._exempt_paths:
             # Pass lifespan and other non-HTTP events straight through
             await self._app(scope, receive, send)
             return
@@ -819,23 +5716,187 @@ class _APIKeyMiddleware:
         client = scope.get("client")
         client_ip = client[0] if client else "unknown"
 
-        # --- Rate limit ---
-        if not self._limiter.is_allowed(client_ip):
-            logger.warning("Rate limit exceeded for %s", client_ip)
-            await _json_error(send, 429, "Too Many Requests", {"Retry-After": "60"})
+        # --- Rate limit (before authenticating, so floods are cheap to reject) ---
+        wait = self._limiter.wait_time(client_ip)
+        if wait:
+            await self._reject(send, client_ip, wait)
             return
 
         # --- Bearer token ---
-        headers = {k.lower(): v for k, v in scope.get("headers", [])}
-        auth_header = headers.get(b"authorization", b"").decode("utf-8", errors="replace")
-        token = auth_header[7:].strip() if auth_header.startswith("Bearer ") else ""
-
-        if not token or not hmac.compare_digest(token.encode(), self._api_key_bytes):
+        identity = _match_api_key(_bearer_token(scope), self._api_keys)
+        if identity is None:
+            self._limiter.charge(client_ip)
             logger.warning("Unauthorized request from %s", client_ip)
             await _json_error(send, 401, "Unauthorized", {"WWW-Authenticate": "Bearer"})
             return
 
-        await self._app(scope, receive, send)
+        # --- Cost-weighted quotas, per IP and per API key ---
+        cost = self._costs.default
+        if scope["type"] == "http" and scope.get("method") == "POST":
+            body, receive = await _buffer_body(receive, MAX_INSPECTED_BODY_BYTES)
+            if body is None:
+                # Cannot be priced, and no real MCP message comes close to the limit
+                self._limiter.charge(client_ip)
+                logger.warning("Request body too large from %s", client_ip)
+                await _json_error(send, 413, "Payload Too Large")
+                return
+            cost = self._costs.request_cost(body)
+        wait = max(
+            self._limiter.wait_time(client_ip, cost),
+            self._identity_limiter.wait_time(identity, cost),
+        )
+        if wait:
+            await self._reject(send, f"{client_ip} ({identity})", wait)
+            return
+        self._limiter.charge(client_ip, cost)
+        self._identity_limiter.charge(identity, cost)
+
+        if not self._costs.bytes_per_unit:
+            await self._app(scope, receive, send)
+            return
+
+        sent_bytes = 0
+
+        async def counting_send(message: MutableMapping[str, Any]) -> None:
+            nonlocal sent_bytes
+            if message["type"] == "http.response.body":
+                sent_bytes += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self._app(scope, receive, counting_send)
+        finally:
+            extra = self._costs.response_cost(sent_bytes)
+            if extra:
+                self._limiter.charge(client_ip, extra)
+                self._identity_limiter.charge(identity, extra)
+
+    @staticmethod
+    async def _reject(send: _Send, client: str, wait: float) -> None:
+        logger.warning("Rate limit exceeded for %s", client)
+        retry_after = str(math.ceil(wait))
+        await _json_error(send, 429, "Too Many Requests", {"Retry-After": retry_after})
+
+
+async def _buffer_body(receive: _Receive, limit: int) -> tuple[bytes | None, _Receive]:
+    """Read a request body of up to *limit* bytes ahead of the application.
+
+    Returns the body (None if it is larger than *limit*) and a replacement
+    ``receive`` that replays everything read before deferring to the original.
+    """
+    buffered: list[MutableMapping[str, Any]] = []
+    size = 0
+    while True:
+        message = await receive()
+        buffered.append(message)
+        if message["type"] != "http.request":
+            break
+        size += len(message.get("body", b""))
+        if size > limit or not message.get("more_body", False):
+            break
+
+    body = None
+    if size <= limit and buffered[-1]["type"] == "http.request":
+        body = b"".join(m.get("body", b"") for m in buffered if m["type"] == "http.request")
+    pending = collections.deque(buffered)
+
+    async def replay() -> MutableMapping[str, Any]:
+        return pending.popleft() if pending else await receive()
+
+    return body, replay
+
+
+def _bearer_token(scope: _Scope) -> str:
+    headers = {k.lower(): v for k, v in scope.get("headers", [])}
+    auth_header = headers.get(b"authorization", b"").decode("utf-8", errors="replace")
+    return auth_header[7:].strip() if auth_header.startswith("Bearer ") else ""
+
+
+def _match_api_key(token: str, api_keys: list[tuple[str, bytes]]) -> str | None:
+    """Return the identity whose key is *token*, comparing against every key."""
+    if not token:
+        return None
+    token_bytes = token.encode()
+    identity = None
+    for name, key in api_keys:
+        if hmac.compare_digest(token_bytes, key) and identity is None:
+            identity = name
+    return identity
+
+
+def _has_bearer_token(scope: _Scope, expected: bytes) -> bool:
+    """Check the request's ``Authorization: Bearer`` token in constant time."""
+    token = _bearer_token(scope)
+    return bool(token) and hmac.compare_digest(token.encode(), expected)
+
+
+# Failed /metrics authentications allowed per minute per client IP
+METRICS_AUTH_FAILURES_PER_MINUTE = 10
+
+
+class _MetricsApp:
+    """ASGI endpoint serving :func:`render_metrics` to Prometheus scrapers.
+
+    Scrapes need their own Bearer token (``MCP_METRICS_TOKEN``) and bypass the
+    per-IP rate limiter, so a frequent scrape interval never locks out MCP
+    clients behind the same address.  Failed authentications are charged to
+    a small limiter of the endpoint's own, so the token cannot be guessed at
+    full speed.
+    """
+
+    def __init__(self, token: str, failure_limit: int = METRICS_AUTH_FAILURES_PER_MINUTE) -> None:
+        self._token_bytes = token.encode()
+        self._failures = _RateLimiter(max_requests=failure_limit, window_seconds=60)
+
+    async def __call__(self, scope: _Scope, receive: _Receive, send: _Send) -> None:
+        client = scope.get("client")
+        client_ip = client[0] if client else "unknown"
+        wait = self._failures.wait_time(client_ip)
+        if wait:
+            logger.warning("Too many failed metrics scrapes from %s", client_ip)
+            await _json_error(send, 429, "Too Many Requests", {"Retry-After": str(math.ceil(wait))})
+            return
+        if not _has_bearer_token(scope, self._token_bytes):
+            self._failures.charge(client_ip)
+            logger.warning("Unauthorized metrics scrape from %s", client_ip)
+            await _json_error(send, 401, "Unauthorized", {"WWW-Authenticate": "Bearer"})
+            return
+        body = render_metrics().encode()
+        headers = [
+            (b"content-type", b"text/plain; version=0.0.4; charset=utf-8"),
+            (b"content-length", str(len(body)).encode()),
+        ]
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": body, "more_body": False})
+
+
+def render_metrics() -> str:
+    """Tool metrics plus content-cache and vault gauges, in Prometheus text format."""
+    stats = _content_cache.stats()
+    lines = [_tool_metrics.render().rstrip("\n")]
+    lines += _render_gauge(
+        "campaign_content_cache_hits_total", "Content cache hits.", stats.hits, "counter"
+    )
+    lines += _render_gauge(
+        "campaign_content_cache_misses_total", "Content cache misses.", stats.misses, "counter"
+    )
+    lines += _render_gauge(
+        "campaign_content_cache_evictions_total",
+        "Content cache evictions.",
+        stats.evictions,
+        "counter",
+    )
+    lines += _render_gauge("campaign_content_cache_bytes", "Bytes held by the cache.", stats.bytes)
+    state = _vault_state
+    if state is not None:
+        lines += [
+            "# HELP campaign_vault_notes Indexed notes, by kind.",
+            "# TYPE campaign_vault_notes gauge",
+            f'campaign_vault_notes{{kind="location"}} {len(state.index.location_entries())}',
+            f'campaign_vault_notes{{kind="character"}} {len(state.index.character_entries())}',
+            f'campaign_vault_notes{{kind="session"}} {len(state.index.session_entries())}',
+        ]
+    return "\n".join(lines) + "\n"
 
 
 async def _json_error(
@@ -856,14 +5917,33 @@ async def _json_error(
     await send({"type": "http.response.body", "body": body, "more_body": False})
 
 
-def _require_api_key() -> str:
-    """Read and validate MCP_API_KEY from the environment.
+def _require_api_keys() -> dict[str, str]:
+    """Read and validate the API keys from MCP_API_KEY and MCP_API_KEYS.
+
+    MCP_API_KEY is the ``default`` identity.  MCP_API_KEYS adds named
+    identities as comma-separated ``name=key`` pairs, each rate-limited on
+    its own.  At least one key must be set.
 
     Raises:
-        SystemExit: If the key is missing or shorter than 32 characters.
+        SystemExit: If no key is set, a pair is malformed, or a key is
+            shorter than 32 characters.
     """
-    key = os.environ.get("MCP_API_KEY", "").strip()
-    if not key:
+    keys: dict[str, str] = {}
+    default_key = os.environ.get("MCP_API_KEY", "").strip()
+    if default_key:
+        keys["default"] = default_key
+    for pair in os.environ.get("MCP_API_KEYS", "").split(","):
+        if not pair.strip():
+            continue
+        name, sep, key = pair.partition("=")
+        if not sep or not name.strip() or not key.strip():
+            print(
+                f"Error: MCP_API_KEYS entries must look like name=key, got {pair.strip()!r}",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+        keys[name.strip()] = key.strip()
+    if not keys:
         print(
             "Error: MCP_API_KEY is not set.\n"
             "Set a strong random key before exposing the server.\n"
@@ -871,13 +5951,246 @@ def _require_api_key() -> str:
             file=sys.stderr,
         )
         sys.exit(1)
-    if len(key) < 32:
-        print(
-            "Error: MCP_API_KEY must be at least 32 characters long.",
-            file=sys.stderr,
+    for name, key in keys.items():
+        if len(key) < 32:
+            variable = "MCP_API_KEY" if name == "default" else f"The MCP_API_KEYS key for {name!r}"
+            print(
+                f"Error: {variable} must be at least 32 characters long.",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+    return keys
+
+
+def _metrics_token_from_env() -> str | None:
+    """Read MCP_METRICS_TOKEN; None (no /metrics endpoint) when it is unset.
+
+    Raises:
+        SystemExit: If the token is shorter than 32 characters.
+    """
+    token = os.environ.get("MCP_METRICS_TOKEN", "").strip()
+    if not token:
+        return None
+    if len(token) < 32:
+        print("Error: MCP_METRICS_TOKEN must be at least 32 characters long.", file=sys.stderr)
+        sys.exit(1)
+    return token
+
+
+def _tool_costs_from_env() -> ToolCosts:
+    """Build the rate-limit cost table from MCP_TOOL_COSTS and MCP_RESPONSE_BYTES_PER_UNIT.
+
+    Raises:
+        SystemExit: If a weight is malformed or negative.
+    """
+    weights = dict(DEFAULT_TOOL_COSTS)
+    for pair in os.environ.get("MCP_TOOL_COSTS", "").split(","):
+        if not pair.strip():
+            continue
+        tool, _, raw = pair.partition("=")
+        try:
+            weight = float(raw)
+        except ValueError:
+            weight = -1.0
+        if not tool.strip() or not math.isfinite(weight) or weight < 0:
+            print(
+                f"Error: MCP_TOOL_COSTS entries must look like tool=weight, got {pair.strip()!r}",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+        weights[tool.strip()] = weight
+    return ToolCosts(
+        weights,
+        bytes_per_unit=_int_from_env("MCP_RESPONSE_BYTES_PER_UNIT", 0, minimum=0),
+    )
+
+
+# ---------------------------------------------------------------------------
+# HTTP transport — response compression
+# ---------------------------------------------------------------------------
+
+# Defaults for MCP_COMPRESSION_LEVEL and MCP_COMPRESSION_MIN_BYTES.  On markdown
+# tool results level 1 gets within a few percent of level 6's ratio at a fifth
+# of the CPU time (see benchmarks/bench_compression.py)
+DEFAULT_COMPRESSION_LEVEL = 1
+DEFAULT_COMPRESSION_MIN_BYTES = 1024
+
+# Supported content codings, in order of preference, with their zlib window bits
+_CONTENT_CODINGS = {"gzip": 16 + zlib.MAX_WBITS, "deflate": zlib.MAX_WBITS}
+
+
+def _negotiate_encoding(accept_encoding: str) -> str | None:
+    """Pick the content coding to use for an ``Accept-Encoding`` header value.
+
+    Returns None when the client accepts neither gzip nor deflate.
+    """
+    weights: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            weights[coding] = quality
+    best = None
+    for coding in _CONTENT_CODINGS:
+        quality = weights.get(coding, weights.get("*", 0.0))
+        if quality > 0 and (best is None or quality > best[1]):
+            best = (coding, quality)
+    return best[0] if best else None
+
+
+class _CompressionMiddleware:
+    """ASGI middleware: gzip- or deflate-compress responses the client accepts.
+
+    The coding is negotiated from ``Accept-Encoding``.  Responses smaller
+    than *min_bytes* are sent as they are: a declared ``Content-Length`` is
+    checked up front, and bodies of unknown length are held only until
+    *min_bytes* have arrived or the body ends.  Past that point every chunk
+    is compressed as it arrives, so large tool results are never buffered
+    whole.  Event streams are flushed after every chunk so each event still
+    reaches the client when it is sent; the long-lived ``GET`` event stream
+    is compressed from its first byte, since holding it back would delay
+    notifications.
+    """
+
+    def __init__(
+        self,
+        app: Any,
+        level: int = DEFAULT_COMPRESSION_LEVEL,
+        min_bytes: int = DEFAULT_COMPRESSION_MIN_BYTES,
+    ) -> None:
+        self._app = app
+        self._level = level
+        self._min_bytes = min_bytes
+
+    async def __call__(self, scope: _Scope, receive: _Receive, send: _Send) -> None:
+        if scope["type"] != "http":
+            await self._app(scope, receive, send)
+            return
+        headers = {k.lower(): v for k, v in scope.get("headers", [])}
+        encoding = _negotiate_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self._app(scope, receive, send)
+            return
+        responder = _CompressingResponder(
+            send, encoding, self._level, self._min_bytes, scope.get("method") == "GET"
+        )
+        await self._app(scope, receive, responder.send)
+
+
+class _CompressingResponder:
+    """The ``send`` side of one response passing through :class:`_CompressionMiddleware`."""
+
+    def __init__(
+        self, send: _Send, encoding: str, level: int, min_bytes: int, is_get: bool
+    ) -> None:
+        self._send = send
+        self._encoding = encoding
+        self._level = level
+        self._min_bytes = min_bytes
+        self._is_get = is_get
+        self._start: MutableMapping[str, Any] | None = None
+        self._held: list[bytes] = []
+        self._held_bytes = 0
+        self._compressor: Any = None  # zlib.Compress, once compression has started
+        self._flush_each = False
+        self._passthrough = False
+
+    async def send(self, message: MutableMapping[str, Any]) -> None:
+        if self._passthrough:
+            await self._send(message)
+        elif message["type"] == "http.response.start":
+            await self._on_start(message)
+        elif message["type"] == "http.response.body":
+            await self._on_body(message.get("body", b""), message.get("more_body", False))
+        else:
+            await self._send(message)
+
+    async def _on_start(self, message: MutableMapping[str, Any]) -> None:
+        headers = {k.lower(): v for k, v in message.get("headers", [])}
+        length = headers.get(b"content-length")
+        event_stream = headers.get(b"content-type", b"").startswith(b"text/event-stream")
+        if (
+            b"content-encoding" in headers
+            or message["status"] in (204, 304)
+            or (length is not None and int(length) < self._min_bytes)
+        ):
+            self._passthrough = True
+            await self._send(message)
+            return
+        self._start = message
+        self._flush_each = event_stream
+        if event_stream and self._is_get:
+            await self._begin_compression()
+
+    async def _on_body(self, body: bytes, more_body: bool) -> None:
+        if self._compressor is None:
+            self._held.append(body)
+            self._held_bytes += len(body)
+            if self._held_bytes < self._min_bytes:
+                if more_body:
+                    return
+                # The whole body turned out to be small: send it as it is
+                await self._send_start(compressed=False)
+                await self._send_body(b"".join(self._held), more_body=False)
+                return
+            await self._begin_compression()
+            body = b"".join(self._held)
+            self._held = []
+        compressor = self._compressor
+        if not more_body:
+            data = compressor.compress(body) + compressor.flush(zlib.Z_FINISH)
+        elif self._flush_each:
+            data = compressor.compress(body) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        else:
+            data = compressor.compress(body)
+        if data or not more_body:
+            await self._send_body(data, more_body)
+
+    async def _begin_compression(self) -> None:
+        self._compressor = zlib.compressobj(
+            self._level, zlib.DEFLATED, _CONTENT_CODINGS[self._encoding]
         )
+        await self._send_start(compressed=True)
+
+    async def _send_start(self, compressed: bool) -> None:
+        assert self._start is not None
+        message = self._start
+        if compressed:
+            headers = [
+                (k, v) for k, v in message.get("headers", []) if k.lower() != b"content-length"
+            ]
+            headers.append((b"content-encoding", self._encoding.encode()))
+            headers.append((b"vary", b"Accept-Encoding"))
+            message = {**message, "headers": headers}
+        await self._send(message)
+
+    async def _send_body(self, body: bytes, more_body: bool) -> None:
+        await self._send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+
+def _compression_from_env(app: Any) -> Any:
+    """Wrap *app* in :class:`_CompressionMiddleware` unless MCP_COMPRESSION_LEVEL=0.
+
+    Raises:
+        SystemExit: If MCP_COMPRESSION_LEVEL is not between 0 and 9, or
+            MCP_COMPRESSION_MIN_BYTES is negative
+    """
+    level = _int_from_env("MCP_COMPRESSION_LEVEL", DEFAULT_COMPRESSION_LEVEL, minimum=0)
+    if level > 9:
+        print(f"Error: MCP_COMPRESSION_LEVEL must be between 0 and 9, got {level}", file=sys.stderr)
         sys.exit(1)
-    return key
+    min_bytes = _int_from_env("MCP_COMPRESSION_MIN_BYTES", DEFAULT_COMPRESSION_MIN_BYTES, minimum=0)
+    if level == 0:
+        return app
+    return _CompressionMiddleware(app, level, min_bytes)
 
 
 # ---------------------------------------------------------------------------
@@ -885,15 +6198,21 @@ def _require_api_key() -> str:
 # ---------------------------------------------------------------------------
 
 
-async def _run_http_server() -> None:
-    """Run the MCP server over Streamable HTTP with Bearer-token authentication."""
+async def _run_http_server(follower: SnapshotFollower | None = None) -> None:
+    """Run the MCP server over Streamable HTTP with Bearer-token authentication.
+
+    In a multi-worker deployment each worker calls this with the
+    :class:`SnapshotFollower` that keeps its vault state current, and binds
+    the shared port with ``SO_REUSEPORT`` so the kernel spreads connections
+    across the workers.
+    """
     import uvicorn
     from mcp.server.fastmcp.server import StreamableHTTPASGIApp
     from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
     from starlette.applications import Starlette
     from starlette.routing import Route
 
-    api_key = _require_api_key()
+    api_keys = _require_api_keys()
     host = os.environ.get("MCP_HOST", "0.0.0.0")
     port_str = os.environ.get("MCP_PORT", "8000")
     try:
@@ -913,17 +6232,121 @@ async def _run_http_server() -> None:
                 host,
                 port,
             )
-            yield
-
-    starlette_app = Starlette(
-        routes=[Route("/mcp", endpoint=mcp_asgi)],
-        lifespan=lifespan,
+            if follower is None:
+                yield
+                return
+            task = asyncio.create_task(follower.follow(parent_pid=os.getppid()))
+            try:
+                yield
+            finally:
+                task.cancel()
+
+    routes = [Route("/mcp", endpoint=mcp_asgi)]
+    metrics_token = _metrics_token_from_env()
+    if metrics_token is not None:
+        routes.append(Route("/metrics", endpoint=_MetricsApp(metrics_token), methods=["GET"]))
+    starlette_app = Starlette(routes=routes, lifespan=lifespan)
+    protected = _APIKeyMiddleware(
+        _compression_from_env(starlette_app),
+        api_keys,
+        exempt_paths={"/metrics"},
+        ip_limit=_int_from_env("MCP_RATE_LIMIT", 60),
+        identity_limit=_int_from_env("MCP_KEY_RATE_LIMIT", 120),
+        costs=_tool_costs_from_env(),
     )
-    protected = _APIKeyMiddleware(starlette_app, api_key)
 
     config = uvicorn.Config(app=protected, host=host, port=port, log_level="info")
     server = uvicorn.Server(config)
-    await server.serve()
+    if follower is None:
+        await server.serve()
+        return
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    await server.serve(sockets=[sock])
+
+
+def _http_worker(snapshot_path: str) -> None:
+    """Entry point of one HTTP worker process in multi-worker mode."""
+    global _locations_dir, _characters_dir, _sessions_dir, _snapshot_follower, _sqlite_store
+    _locations_dir = get_locations_directory()
+    _characters_dir = get_characters_directory()
+    _sessions_dir = get_sessions_directory()
+    _configure_io()
+    _sqlite_store = sqlite_store_from_env(
+        _locations_dir, _characters_dir, _sessions_dir, readonly=True
+    )
+    _snapshot_follower = SnapshotFollower(
+        Path(snapshot_path),
+        _locations_dir,
+        _characters_dir,
+        _sessions_dir,
+        install=_install_vault_state,
+        stored=_sqlite_store is not None,
+    )
+    _snapshot_follower.load_and_install()
+    logger.info(
+        "Worker %d serving vault snapshot generation %d",
+        os.getpid(),
+        _snapshot_follower.generation,
+    )
+    asyncio.run(_run_http_server(_snapshot_follower))
+
+
+async def _run_http_workers(workers: int, state: VaultState) -> None:
+    """Index the vault here and serve HTTP from *workers* child processes.
+
+    This process keeps the vault watched and publishes a snapshot of its
+    listing and analyzer state after every change; the workers map each new
+    generation and switch to it between requests.  The workers share the
+    port through ``SO_REUSEPORT``, so each one runs its own event loop and
+    GIL.
+    """
+    import multiprocessing
+
+    if not hasattr(socket, "SO_REUSEPORT"):
+        print("Error: MCP_WORKERS > 1 needs SO_REUSEPORT (Linux or BSD)", file=sys.stderr)
+        sys.exit(1)
+    _require_api_keys()  # Fail here rather than in every worker
+
+    snapshot_dir = os.environ.get("MCP_SNAPSHOT_DIR", "").strip()
+    owned_dir = None
+    if not snapshot_dir:
+        owned_dir = snapshot_dir = tempfile.mkdtemp(prefix="campaign-mcp-")
+    path = Path(snapshot_dir) / "vault.snapshot"
+    publisher = SnapshotPublisher(path, state)
+    publisher.publish()
+
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=_http_worker, args=(str(path),), name=f"mcp-http-{i}")
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    logger.info("Started %d HTTP workers", workers)
+
+    loop = asyncio.get_running_loop()
+    task = asyncio.current_task()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        if task is not None:
+            loop.add_signal_handler(signum, task.cancel)
+    try:
+        while all(process.is_alive() for process in processes):
+            await asyncio.sleep(0.5)
+        logger.error("An HTTP worker exited unexpectedly; shutting down")
+    except asyncio.CancelledError:
+        logger.info("Shutting down HTTP workers")
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join(timeout=10)
+        if owned_dir is not None:
+            shutil.rmtree(owned_dir, ignore_errors=True)
 
 
 # ---------------------------------------------------------------------------
@@ -931,27 +6354,151 @@ async def _run_http_server() -> None:
 # ---------------------------------------------------------------------------
 
 
+def load_vault(
+    locations_dir: Path,
+    characters_dir: Path,
+    sessions_dir: Path,
+    cache: IndexCache | None = None,
+    store: SQLiteStore | None = None,
+) -> VaultState:
+    """Point the server at a vault and build every in-memory index over it.
+
+    With a *cache*, the index is restored from it when possible and only
+    notes that changed since it was saved are read; the cache is then
+    rewritten if anything changed.  A SQLite *store* is synced with the
+    index and then kept current by the same pipeline as the analyzers; it
+    answers search, frontmatter queries and link traversal, so those
+    in-memory analyzers are not built.
+
+    Used by :func:`main` and by the benchmark suite, which drives
+    :func:`call_tool` against generated vaults without a transport.
+    """
+    global _locations_dir, _characters_dir, _sessions_dir
+    _locations_dir = locations_dir
+    _characters_dir = characters_dir
+    _sessions_dir = sessions_dir
+
+    started = time.monotonic()
+    stored = store is not None
+    state = (
+        None if cache is None else cache.load(locations_dir, characters_dir, sessions_dir, stored)
+    )
+    if state is not None:
+        pipeline = NotePipeline(state.index)
+        for analyzer in state.analyzers:
+            pipeline.register(analyzer)
+        if cache is not None:
+            cache.attach(state, dirty=False)
+        state.index.refresh(deep=True)
+        logger.info(
+            "Restored %d notes from the index cache and revalidated them in %.2fs",
+            len(state.summaries),
+            time.monotonic() - started,
+        )
+    else:
+        state = VaultState.empty(locations_dir, characters_dir, sessions_dir, stored)
+        state.index.build()
+        logger.info(
+            "Indexed %d locations, %d characters and %d session notes",
+            len(state.index.location_entries()),
+            len(state.index.character_entries()),
+            len(state.index.session_entries()),
+        )
+
+        started = time.monotonic()
+        pipeline = NotePipeline(state.index)
+        for analyzer in state.analyzers:
+            pipeline.register(analyzer)
+        pipeline.bootstrap()
+        logger.info(
+            "Analyzed %d notes in %.2fs",
+            len(state.summaries),
+            time.monotonic() - started,
+        )
+        if cache is not None:
+            cache.attach(state, dirty=True)
+    if cache is not None:
+        cache.save()
+    if store is not None:
+        started = time.monotonic()
+        changed = store.sync(state.index)
+        pipeline.register(store)
+        logger.info(
+            "Synced %d notes into SQLite database %s in %.2fs",
+            changed,
+            store.path,
+            time.monotonic() - started,
+        )
+    _install_vault_state(state)
+    return state
+
+
+def _install_vault_state(state: VaultState) -> None:
+    """Make *state* the one every tool call reads from.
+
+    A single reference is swapped, so a tool call sees either the previous
+    state or *state* in full (see :func:`_served_state`).
+    """
+    global _vault_state
+    _vault_state = state
+
+
+def _configure_io() -> None:
+    """Configure vault walks, the I/O pool and the content cache from the environment."""
+    global _io_dispatcher, _content_cache, _ignored_dirs
+    _ignored_dirs = ignored_dirs_from_env()
+    io_workers = _int_from_env("MCP_IO_WORKERS", DEFAULT_IO_WORKERS)
+    _io_dispatcher = IODispatcher(
+        workers=io_workers,
+        max_concurrent=_int_from_env("MCP_IO_MAX_CONCURRENT", io_workers),
+    )
+    _content_cache = ContentCache(
+        _int_from_env("MCP_CONTENT_CACHE_BYTES", DEFAULT_CONTENT_CACHE_BYTES)
+    )
+
+
 async def main() -> None:
     """Run the MCP server in the configured transport mode.
 
     Set ``MCP_TRANSPORT=http`` for remote/HTTP mode (requires MCP_API_KEY).
     Defaults to stdio transport for local Claude Desktop integration.
     """
-    global _locations_dir, _characters_dir, _sessions_dir
-    _locations_dir = get_locations_directory()
-    _characters_dir = get_characters_directory()
-    _sessions_dir = get_sessions_directory()
-
+    global _vault_watcher, _sqlite_store
+    locations_dir = get_locations_directory()
+    characters_dir = get_characters_directory()
+    sessions_dir = get_sessions_directory()
     transport = os.environ.get("MCP_TRANSPORT", "stdio").lower()
-    if transport == "http":
-        await _run_http_server()
-    else:
-        async with stdio_server() as (read_stream, write_stream):
-            await app.run(
-                read_stream,
-                write_stream,
-                app.create_initialization_options(),
-            )
+    workers = _int_from_env("MCP_WORKERS", 1)
+
+    _configure_io()
+    cache = IndexCache.from_env(locations_dir, characters_dir, sessions_dir)
+    store = sqlite_store_from_env(locations_dir, characters_dir, sessions_dir)
+    state = load_vault(locations_dir, characters_dir, sessions_dir, cache, store)
+    _sqlite_store = store
+    _vault_watcher = start_vault_watcher(state.index)
+
+    try:
+        if transport == "http" and workers > 1:
+            await _run_http_workers(workers, state)
+        elif transport == "http":
+            await _run_http_server()
+        else:
+            async with stdio_server() as (read_stream, write_stream):
+                await app.run(
+                    read_stream,
+                    write_stream,
+                    app.create_initialization_options(),
+                )
+    finally:
+        if _vault_watcher is not None:
+            _vault_watcher.stop()
+        if cache is not None:
+            cache.save()
+        if store is not None:
+            store.close()
+        if _io_dispatcher is not None:
+            _io_dispatcher.shutdown()
+        logger.info("Content cache: %s", _content_cache.stats())
 
 
 if __name__ == "__main__":
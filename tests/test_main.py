@@ -1,8 +1,16 @@
 """Tests for main module."""
 
+import contextlib
+import gzip
+import json
 import os
+import re
+import sys
 import tempfile
-from collections.abc import MutableMapping
+import time
+import zlib
+from collections.abc import Callable, MutableMapping
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Any
 from unittest.mock import patch
@@ -11,21 +19,68 @@ import pytest
 
 from main import (
     DYSCRASIA_OPTIONS,
+    ChangeJournal,
+    ChangeKind,
+    ContentCache,
+    FrontmatterIndex,
+    IndexCache,
+    InotifyWatcher,
+    IODispatcher,
+    LinkDirection,
+    LinkGraph,
     Mood,
+    NameSuggester,
+    NoteEntry,
+    NoteKind,
+    NotePipeline,
+    OutlineCache,
+    PollingWatcher,
     ResonanceLevel,
     ResonanceResult,
+    SearchIndex,
+    SnapshotFollower,
+    SnapshotPublisher,
+    SQLiteStore,
+    SummaryIndex,
+    ToolCosts,
+    ToolMetrics,
+    VaultChange,
+    VaultIndex,
+    VaultState,
     _APIKeyMiddleware,
+    _ChangeCoalescer,
+    _CompressionMiddleware,
+    _int_from_env,
+    _metrics_token_from_env,
+    _MetricsApp,
+    _negotiate_encoding,
     _RateLimiter,
     _safe_join,
     _validate_flat_name,
     _validate_nested_name,
     calculate_victims_resonance,
+    call_tool,
+    content_digest,
     get_all_characters,
     get_all_locations,
     get_character_details,
     get_characters_directory,
     get_location_details,
     get_locations_directory,
+    get_story_so_far,
+    ignored_dirs_from_env,
+    load_vault,
+    make_snippet,
+    parse_frontmatter,
+    parse_outline,
+    parse_wikilinks,
+    read_batch,
+    read_note_files,
+    read_snapshot,
+    restore_snapshot,
+    sqlite_store_from_env,
+    summarize_note,
+    write_snapshot,
 )
 
 
@@ -239,6 +294,28 @@ def test_get_all_characters_nonexistent_directory() -> None:
     assert characters == []
 
 
+def test_get_all_characters_prunes_hidden_and_ignored_directories() -> None:
+    """Test get_all_characters skips hidden directories and those in MCP_IGNORE_DIRS."""
+    import main
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_path = Path(tmp_dir)
+        (tmp_path / "camarilla").mkdir()
+        (tmp_path / "camarilla" / "Prince Sebastian.md").write_text("Prince content")
+        for hidden in (".obsidian", ".trash", "camarilla/.git/objects", "templates"):
+            (tmp_path / hidden).mkdir(parents=True)
+            (tmp_path / hidden / "Stray.md").write_text("Stray")
+        (tmp_path / "Root note.md").write_text("No organization")
+
+        with patch.object(main, "_ignored_dirs", frozenset({"templates"})):
+            characters = get_all_characters(tmp_path)
+            index = VaultIndex(tmp_path / "none", tmp_path)
+            index.build()
+
+        assert characters == [{"name": "Prince Sebastian", "organization": "camarilla"}]
+        assert index.characters() == characters
+
+
 def test_get_character_details_valid_character() -> None:
     """Test get_character_details with valid character."""
     with tempfile.TemporaryDirectory() as tmp_dir:
@@ -607,6 +684,33 @@ class TestRateLimiter:
         time.sleep(1.05)
         assert limiter.is_allowed("client") is True
 
+    def test_refills_one_request_per_interval(self) -> None:
+        limiter = _RateLimiter(max_requests=3, window_seconds=60)
+        with patch("main.time.monotonic", return_value=1000.0):
+            for _ in range(3):
+                assert limiter.is_allowed("client")
+            assert limiter.retry_after("client") == pytest.approx(20.0)
+        with patch("main.time.monotonic", return_value=1020.0):
+            assert limiter.is_allowed("client")
+            assert not limiter.is_allowed("client")
+
+    def test_idle_clients_are_evicted(self) -> None:
+        limiter = _RateLimiter(max_requests=2, window_seconds=10)
+        with patch("main.time.monotonic", return_value=0.0):
+            limiter.is_allowed("alice")
+            limiter.is_allowed("bob")
+        assert len(limiter) == 2
+        with patch("main.time.monotonic", return_value=100.0):
+            limiter.is_allowed("carol")
+        assert len(limiter) == 1
+
+    def test_tracked_clients_are_capped(self) -> None:
+        limiter = _RateLimiter(max_requests=1, window_seconds=60, max_clients=100)
+        for i in range(1000):
+            limiter.is_allowed(f"10.0.{i // 256}.{i % 256}")
+        assert len(limiter) == 100
+        assert not limiter.is_allowed("10.0.3.231")
+
 
 # ---------------------------------------------------------------------------
 # Security: API key middleware (async)
@@ -704,10 +808,7 @@ async def test_middleware_returns_429_when_rate_limited() -> None:
         await send({"type": "http.response.start", "status": 200, "headers": []})
         await send({"type": "http.response.body", "body": b"", "more_body": False})
 
-    mw = _APIKeyMiddleware.__new__(_APIKeyMiddleware)
-    mw._app = inner
-    mw._api_key_bytes = api_key.encode()
-    mw._limiter = _RateLimiter(max_requests=2, window_seconds=60)
+    mw = _APIKeyMiddleware(inner, api_key, ip_limit=2)
 
     scope = _make_http_scope(headers)
     await _collect_response(mw, scope)
@@ -738,3 +839,2014 @@ async def test_middleware_passes_lifespan_events_without_auth() -> None:
 
     await mw(lifespan_scope, receive, send)
     assert lifespan_reached
+
+
+async def _run_compressed(
+    body_chunks: list[bytes],
+    accept_encoding: bytes | None,
+    response_headers: list[tuple[bytes, bytes]] | None = None,
+    method: str = "POST",
+    min_bytes: int = 100,
+) -> list[MutableMapping[str, Any]]:
+    """Send *body_chunks* through the compression middleware and collect what comes out."""
+    sent: list[MutableMapping[str, Any]] = []
+
+    async def inner(scope: Any, receive: Any, send: Any) -> None:
+        start = {"type": "http.response.start", "status": 200, "headers": response_headers or []}
+        await send(start)
+        for i, chunk in enumerate(body_chunks):
+            more = i < len(body_chunks) - 1
+            await send({"type": "http.response.body", "body": chunk, "more_body": more})
+
+    async def receive() -> MutableMapping[str, Any]:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: MutableMapping[str, Any]) -> None:
+        sent.append(message)
+
+    scope = _make_http_scope([(b"accept-encoding", accept_encoding)] if accept_encoding else [])
+    scope["method"] = method
+    await _CompressionMiddleware(inner, min_bytes=min_bytes)(scope, receive, send)
+    return sent
+
+
+class TestCompressionMiddleware:
+    def test_negotiate_encoding(self) -> None:
+        assert _negotiate_encoding("gzip, deflate, br") == "gzip"
+        assert _negotiate_encoding("deflate;q=1.0, gzip;q=0.5") == "deflate"
+        assert _negotiate_encoding("br, *;q=0.1") == "gzip"
+        assert _negotiate_encoding("gzip;q=0, deflate") == "deflate"
+        assert _negotiate_encoding("identity") is None
+        assert _negotiate_encoding("") is None
+
+    @pytest.mark.anyio
+    async def test_large_streamed_body_is_compressed_as_it_arrives(self) -> None:
+        chunks = [b"# Adrian Rook (camarilla)\n\n" * 20 for _ in range(5)]
+        headers = [(b"content-type", b"application/json"), (b"content-length", b"2700")]
+        sent = await _run_compressed(chunks, b"gzip", headers)
+        start, *bodies = sent
+        assert (b"content-encoding", b"gzip") in start["headers"]
+        assert (b"vary", b"Accept-Encoding") in start["headers"]
+        assert not any(k == b"content-length" for k, _ in start["headers"])
+        assert bodies[-1]["more_body"] is False
+        data = b"".join(message["body"] for message in bodies)
+        assert gzip.decompress(data) == b"".join(chunks)
+        assert len(data) < len(b"".join(chunks)) // 10
+
+    @pytest.mark.anyio
+    async def test_small_or_unaccepted_bodies_pass_through(self) -> None:
+        for chunks, accept in (([b"tiny", b" body"], b"gzip"), ([b"x" * 500], None)):
+            sent = await _run_compressed(chunks, accept)
+            assert not any(k == b"content-encoding" for k, _ in sent[0]["headers"])
+            assert b"".join(message["body"] for message in sent[1:]) == b"".join(chunks)
+        sent = await _run_compressed([b"x" * 50], b"gzip", [(b"content-length", b"50")])
+        assert sent[0]["headers"] == [(b"content-length", b"50")]
+
+    @pytest.mark.anyio
+    async def test_deflate_and_already_encoded_bodies(self) -> None:
+        sent = await _run_compressed([b"y" * 500], b"deflate")
+        assert zlib.decompress(sent[1]["body"]) == b"y" * 500
+        sent = await _run_compressed([b"z" * 500], b"gzip", [(b"content-encoding", b"br")])
+        assert sent[1]["body"] == b"z" * 500
+
+    @pytest.mark.anyio
+    async def test_get_event_stream_is_flushed_per_event(self) -> None:
+        events = [b"event: message\ndata: {}\n\n", b": ping\n\n", b""]
+        headers = [(b"content-type", b"text/event-stream")]
+        sent = await _run_compressed(events, b"gzip", headers, method="GET")
+        assert (b"content-encoding", b"gzip") in sent[0]["headers"]
+        decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        assert [decoder.decompress(message["body"]) for message in sent[1:]] == events
+
+
+# ---------------------------------------------------------------------------
+# Vault index
+# ---------------------------------------------------------------------------
+
+
+def _bump_mtime(directory: Path) -> None:
+    """Push a directory's mtime forward so coarse-grained filesystems see a change."""
+    st = os.stat(directory)
+    os.utime(directory, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def _make_vault(root: Path) -> tuple[Path, Path]:
+    locations = root / "Locations"
+    characters = root / "Characters"
+    (characters / "camarilla").mkdir(parents=True)
+    (characters / "Mortals" / "second inquisition").mkdir(parents=True)
+    locations.mkdir()
+    (locations / "Elysium.md").write_text("Elysium content")
+    (locations / "Haven.md").write_text("Haven content")
+    (characters / "camarilla" / "Prince Sebastian.md").write_text("Prince content")
+    (characters / "camarilla" / "__table.md").write_text("Table")
+    (characters / "Mortals" / "Victor Manelli.md").write_text("Victor content")
+    (characters / "Mortals" / "second inquisition" / "Raphael Kirby.md").write_text("Raphael")
+    (characters / "root level.md").write_text("Not a character")
+    return locations, characters
+
+
+class TestVaultIndex:
+    def test_build_matches_directory_scans(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            locations, characters = _make_vault(Path(tmp_dir))
+            index = VaultIndex(locations, characters)
+            index.build()
+            assert index.locations() == get_all_locations(locations)
+            assert index.characters() == get_all_characters(characters)
+
+    def test_entries_carry_stat_data(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            locations, characters = _make_vault(Path(tmp_dir))
+            index = VaultIndex(locations, characters)
+            index.build()
+            entry = index.get_character("Victor Manelli", "Mortals")
+            assert entry is not None
+            assert entry.kind is NoteKind.CHARACTER
+            assert entry.path == characters / "Mortals" / "Victor Manelli.md"
+            assert entry.size == len("Victor content")
+            assert entry.mtime_ns == entry.path.stat().st_mtime_ns
+            assert index.get_location("Nowhere") is None
+
+    def test_refresh_without_changes_is_a_no_op(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            locations, characters = _make_vault(Path(tmp_dir))
+            index = VaultIndex(locations, characters)
+            index.build()
+            assert index.refresh() is False
+
+    def test_refresh_picks_up_added_and_removed_files(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            locations, characters = _make_vault(Path(tmp_dir))
+            index = VaultIndex(locations, characters)
+            index.build()
+
+            (locations / "Docks.md").write_text("Docks")
+            (locations / "Haven.md").unlink()
+            _bump_mtime(locations)
+            (characters / "camarilla" / "Adrian Rook.md").write_text("Adrian")
+            _bump_mtime(characters / "camarilla")
+
+            assert index.refresh() is True
+            assert index.locations() == ["Docks", "Elysium"]
+            assert index.get_character("Adrian Rook", "camarilla") is not None
+
+    def test_refresh_handles_new_and_removed_directories(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            locations, characters = _make_vault(Path(tmp_dir))
+            index = VaultIndex(locations, characters)
+            index.build()
+
+            (characters / "anarchs" / "cell").mkdir(parents=True)
+            (characters / "anarchs" / "cell" / "Rico Vega.md").write_text("Rico")
+            _bump_mtime(characters)
+            for path in (characters / "Mortals").rglob("*.md"):
+                path.unlink()
+            (characters / "Mortals" / "second inquisition").rmdir()
+            (characters / "Mortals").rmdir()
+
+            assert index.refresh() is True
+            assert index.characters() == get_all_characters(characters)
+            assert index.get_character("Rico Vega", "anarchs/cell") is not None
+            assert index.get_character("Raphael Kirby", "Mortals/second inquisition") is None
+
+
+@pytest.fixture
+def vault(tmp_path: Path) -> Any:
+    """Point the server globals at a small temporary vault for ``call_tool`` tests."""
+    import main
+
+    locations, characters = _make_vault(tmp_path)
+    sessions = tmp_path / "sessions"
+    sessions.mkdir()
+    (sessions / "__result.md").write_text("# Session 1\n\nThe story begins.\n")
+    (locations / "Haven.md").write_text("---\ndistrict: North End\nsafety: 3\n---\nHaven")
+    state = VaultState.empty(locations, characters, sessions)
+    state.index.build()
+    pipeline = NotePipeline(state.index)
+    for analyzer in state.analyzers:
+        pipeline.register(analyzer)
+    pipeline.bootstrap()
+    with (
+        patch.object(main, "_locations_dir", locations),
+        patch.object(main, "_characters_dir", characters),
+        patch.object(main, "_sessions_dir", sessions),
+        patch.object(main, "_vault_state", state),
+    ):
+        yield tmp_path
+
+
+@pytest.mark.anyio
+async def test_call_tool_list_locations_is_served_from_index(vault: Path) -> None:
+    (vault / "Locations" / "Docks.md").write_text("Docks")
+    _bump_mtime(vault / "Locations")
+    result = await call_tool("list_locations", {})
+    assert result[0].text == "Available locations (3):\n- Docks\n- Elysium\n- Haven"
+
+
+class TestReadNoteFiles:
+    def test_reads_in_entry_order(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            locations, characters = _make_vault(Path(tmp_dir))
+            index = VaultIndex(locations, characters)
+            index.build()
+            entries = index.character_entries()
+            assert read_note_files(entries) == [e.path.read_text() for e in entries]
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                assert read_note_files(entries, pool) == [e.path.read_text() for e in entries]
+
+    def test_vanished_file_comes_back_as_none(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            locations, characters = _make_vault(Path(tmp_dir))
+            index = VaultIndex(locations, characters)
+            index.build()
+            entries = index.location_entries()
+            entries[0].path.unlink()
+            assert read_note_files(entries) == [None, "Haven content"]
+
+
+@pytest.mark.anyio
+async def test_call_tool_list_characters_reads_all_files(vault: Path) -> None:
+    result = await call_tool("list_characters", {})
+    assert [r.text for r in result] == [
+        "# Victor Manelli (Mortals)\n\nVictor content",
+        "# Raphael Kirby (Mortals/second inquisition)\n\nRaphael",
+        "# Prince Sebastian (camarilla)\n\nPrince content",
+    ]
+
+
+class TestCharacterPage:
+    def _index(self, root: Path) -> VaultIndex:
+        locations, characters = _make_vault(root)
+        (characters / "camarilla" / "Adrian Rook.md").write_text("Adrian")
+        index = VaultIndex(locations, characters)
+        index.build()
+        return index
+
+    def test_pages_walk_the_sorted_listing(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index = self._index(Path(tmp_dir))
+            seen: list[NoteEntry] = []
+            after = None
+            while True:
+                page, after = index.character_page(limit=3, after=after)
+                seen.extend(page)
+                if after is None:
+                    break
+            assert seen == index.character_entries()
+
+    def test_organization_filter_is_exact(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index = self._index(Path(tmp_dir))
+            page, after = index.character_page(limit=10, organization="Mortals")
+            assert [e.name for e in page] == ["Victor Manelli"]
+            assert after is None
+
+    def test_cursor_is_stable_across_inserts(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index = self._index(Path(tmp_dir))
+            page, after = index.character_page(limit=2)
+            assert after == ("Mortals/second inquisition", "Raphael Kirby")
+            chars = Path(tmp_dir) / "Characters"
+            (chars / "Mortals" / "Anna Early.md").write_text("Anna")
+            _bump_mtime(chars / "Mortals")
+            index.refresh()
+            page, _ = index.character_page(limit=10, after=after)
+            assert [e.name for e in page] == ["Adrian Rook", "Prince Sebastian"]
+
+
+@pytest.mark.anyio
+async def test_call_tool_list_characters_paginates(vault: Path) -> None:
+    import main
+
+    with patch.object(main, "_run_io", wraps=main._run_io) as run_io:
+        first = await call_tool("list_characters", {"limit": 2})
+    # Each body on the page is its own dispatcher job
+    assert [c.args[0] for c in run_io.call_args_list].count(main._read_entry) == 2
+    assert len(first) == 3
+    assert first[-1].text.startswith("More characters available. Next cursor: ")
+    cursor = first[-1].text.rsplit(" ", 1)[1]
+
+    second = await call_tool("list_characters", {"limit": 2, "cursor": cursor})
+    assert [r.text.splitlines()[0] for r in second] == ["# Prince Sebastian (camarilla)"]
+
+
+@pytest.mark.anyio
+async def test_call_tool_list_characters_filters_by_organization(vault: Path) -> None:
+    result = await call_tool("list_characters", {"organization": "camarilla"})
+    assert [r.text.splitlines()[0] for r in result] == ["# Prince Sebastian (camarilla)"]
+
+
+@pytest.mark.anyio
+async def test_call_tool_list_characters_rejects_bad_cursor(vault: Path) -> None:
+    result = await call_tool("list_characters", {"cursor": "not-a-cursor"})
+    assert result[0].text == "Error: Invalid cursor"
+    result = await call_tool("list_characters", {"limit": "many"})
+    assert result[0].text == "Error: 'limit' must be an integer"
+    result = await call_tool("list_characters", {"cursor": 5})
+    assert result[0].text == "Error: 'cursor' must be a string"
+    result = await call_tool("list_characters", {"organization": 5})
+    assert result[0].text == "Error: 'organization' must be a string"
+
+
+@pytest.mark.anyio
+async def test_call_tool_list_characters_summary_mode(vault: Path) -> None:
+    prince = vault / "Characters" / "camarilla" / "Prince Sebastian.md"
+    prince.write_text("---\nclan: Ventrue\n---\n# Prince\n\nRules the city.\n\n## Secrets\nMany")
+    _bump_mtime(prince.parent)
+    result = await call_tool("list_characters", {"detail": "summary", "limit": 2})
+    assert [r.text for r in result[:2]] == [
+        "# Victor Manelli (Mortals)\n\nVictor content\n2 words",
+        "# Raphael Kirby (Mortals/second inquisition)\n\nRaphael\n1 word",
+    ]
+    cursor = result[-1].text.rsplit(" ", 1)[1]
+    with patch("main.read_note_files", side_effect=AssertionError("summaries read files")):
+        second = await call_tool(
+            "list_characters", {"detail": "summary", "limit": 2, "cursor": cursor}
+        )
+    assert [r.text for r in second] == [
+        "# Prince Sebastian (camarilla)\n\nRules the city.\n"
+        "properties: clan | headings: Prince, Secrets | 6 words"
+    ]
+
+    result = await call_tool("list_characters", {"detail": "everything"})
+    assert result[0].text == "Error: 'detail' must be one of: full, summary"
+
+
+@pytest.mark.anyio
+async def test_call_tool_list_locations_summary_mode(vault: Path) -> None:
+    result = await call_tool("list_locations", {"detail": "summary"})
+    assert result[0].text == (
+        "Available locations (2):\n\n"
+        "## Elysium\nElysium content\n2 words\n\n"
+        "## Haven\nHaven\nproperties: district, safety | 1 word"
+    )
+
+
+class TestReadBatch:
+    @pytest.mark.anyio
+    async def test_results_and_errors_stay_in_call_order(self) -> None:
+        def read(name: str) -> str:
+            if name == "missing":
+                raise FileNotFoundError(name)
+            _validate_flat_name(name, "name")
+            return name.upper()
+
+        results = await read_batch(read, [("a",), ("missing",), ("../x",), ("b",)])
+        assert results[0] == "A" and results[3] == "B"
+        assert isinstance(results[1], FileNotFoundError)
+        assert isinstance(results[2], ValueError)
+        assert await read_batch(read, []) == []
+
+
+@pytest.mark.anyio
+async def test_call_tool_get_locations_reports_each_item(vault: Path) -> None:
+    result = await call_tool("get_locations", {"names": ["Elysium", "Nowhere", "../etc"]})
+    assert [r.text for r in result] == [
+        "# Elysium\n\nElysium content",
+        "# Nowhere\n\nError: Location 'Nowhere' not found",
+        "# ../etc\n\nError: Invalid location name",
+    ]
+    result = await call_tool("get_locations", {"names": ["Elysium"] * 21})
+    assert result[0].text == "Error: at most 20 locations can be fetched at once"
+    result = await call_tool("get_locations", {"names": "Elysium"})
+    assert result[0].text.startswith("Error: 'names' must be")
+
+
+@pytest.mark.anyio
+async def test_call_tool_get_characters_reads_concurrently(vault: Path) -> None:
+    import main
+
+    characters = [
+        {"name": "Victor Manelli", "organization": "Mortals"},
+        {"name": "Prince Sebastian", "organization": "camarilla"},
+        {"name": "Prince Sebastian", "organization": "anarchs"},
+    ]
+    with patch.object(main, "read_batch", wraps=main.read_batch) as batch:
+        result = await call_tool("get_characters", {"characters": characters})
+    assert batch.call_count == 1
+    assert [r.text for r in result] == [
+        "# Victor Manelli (Mortals)\n\nVictor content",
+        "# Prince Sebastian (camarilla)\n\nPrince content",
+        "# Prince Sebastian (anarchs)\n\n"
+        "Error: Character 'Prince Sebastian' in organization 'anarchs' not found",
+    ]
+    result = await call_tool("get_characters", {"characters": [{"name": "Victor Manelli"}]})
+    assert result[0].text.startswith("Error: 'characters' must be")
+
+
+# ---------------------------------------------------------------------------
+# Incremental index updates and the change watcher
+# ---------------------------------------------------------------------------
+
+
+def _watched_index(root: Path) -> VaultIndex:
+    locations, characters = _make_vault(root)
+    (root / "sessions").mkdir()
+    (root / "sessions" / "__result.md").write_text("# Session 1\n")
+    index = VaultIndex(locations, characters, root / "sessions")
+    index.build()
+    return index
+
+
+def _wait_for(predicate: Callable[[], bool], timeout: float = 5.0) -> bool:
+    import time
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return predicate()
+
+
+class TestVaultIndexApplyChanges:
+    def test_sessions_are_indexed(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index = _watched_index(Path(tmp_dir))
+            assert [e.name for e in index.session_entries()] == ["__result"]
+
+    def test_add_modify_delete(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            root = Path(tmp_dir)
+            index = _watched_index(root)
+            seen: list[VaultChange] = []
+            index.subscribe(seen.extend)
+
+            new = root / "Characters" / "camarilla" / "Adrian Rook.md"
+            new.write_text("Adrian")
+            changes = index.apply_changes([new])
+            assert [(c.kind, c.entry.name) for c in changes] == [(ChangeKind.ADDED, "Adrian Rook")]
+
+            new.write_text("Adrian, longer")
+            changes = index.apply_changes([new])
+            assert [c.kind for c in changes] == [ChangeKind.MODIFIED]
+            assert index.get_character("Adrian Rook", "camarilla") == changes[0].entry
+
+            new.unlink()
+            changes = index.apply_changes([new])
+            assert [c.kind for c in changes] == [ChangeKind.DELETED]
+            assert index.get_character("Adrian Rook", "camarilla") is None
+            assert len(seen) == 3
+
+    def test_directory_rename(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            root = Path(tmp_dir)
+            index = _watched_index(root)
+            old = root / "Characters" / "Mortals"
+            new = root / "Characters" / "Humans"
+            old.rename(new)
+            changes = index.apply_changes([old, new])
+            assert {(c.kind, c.entry.organization) for c in changes} == {
+                (ChangeKind.DELETED, "Mortals"),
+                (ChangeKind.DELETED, "Mortals/second inquisition"),
+                (ChangeKind.ADDED, "Humans"),
+                (ChangeKind.ADDED, "Humans/second inquisition"),
+            }
+            assert index.characters() == get_all_characters(root / "Characters")
+
+    def test_deep_refresh_catches_in_place_edits(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            root = Path(tmp_dir)
+            index = _watched_index(root)
+            path = root / "Locations" / "Haven.md"
+            path.write_text("A much longer haven description")
+            assert index.refresh() is False
+            assert index.refresh(deep=True) is True
+            entry = index.get_location("Haven")
+            assert entry is not None and entry.size == path.stat().st_size
+
+
+class TestChangeCoalescer:
+    def test_waits_for_quiet_period(self) -> None:
+        coalescer = _ChangeCoalescer(quiet_period=1.0, max_delay=10.0)
+        coalescer.add([Path("/a")], now=0.0)
+        coalescer.add([Path("/b"), Path("/a")], now=0.5)
+        assert coalescer.drain(now=1.0) == set()
+        assert coalescer.timeout(now=1.0) == pytest.approx(0.5)
+        assert coalescer.drain(now=1.5) == {Path("/a"), Path("/b")}
+        assert coalescer.timeout(now=2.0) is None
+
+    def test_flushes_long_bursts_after_max_delay(self) -> None:
+        coalescer = _ChangeCoalescer(quiet_period=1.0, max_delay=2.0)
+        for i in range(5):
+            coalescer.add([Path(f"/note{i}")], now=i * 0.5)
+        assert len(coalescer.drain(now=2.0)) == 5
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux-only")
+def test_inotify_watcher_applies_changes() -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        root = Path(tmp_dir)
+        index = _watched_index(root)
+        watcher = InotifyWatcher(index, quiet_period=0.05, max_delay=0.5)
+        watcher.start()
+        try:
+            (root / "Characters" / "anarchs" / "cell").mkdir(parents=True)
+            (root / "Characters" / "anarchs" / "cell" / "Rico Vega.md").write_text("Rico")
+            (root / "Locations" / "Haven.md").unlink()
+            (root / "sessions" / "Session 2.md").write_text("More story")
+            assert _wait_for(
+                lambda: (
+                    index.get_character("Rico Vega", "anarchs/cell") is not None
+                    and index.get_location("Haven") is None
+                    and len(index.session_entries()) == 2
+                )
+            )
+        finally:
+            watcher.stop()
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux-only")
+def test_inotify_overflow_watches_directories_whose_events_were_lost() -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        root = Path(tmp_dir)
+        index = _watched_index(root)
+        watcher = InotifyWatcher(index, quiet_period=0.05, max_delay=0.5)
+        cell = root / "Characters" / "anarchs" / "cell"
+        cell.mkdir(parents=True)
+        (cell / "Rico Vega.md").write_text("Rico")
+        with contextlib.suppress(BlockingIOError):
+            while os.read(watcher._fd, 64 * 1024):
+                pass  # Drop the creation events unread, as an overflow would
+        assert cell not in watcher._watches.values()
+
+        watcher._rescan()
+        assert cell in watcher._watches.values()
+        assert index.get_character("Rico Vega", "anarchs/cell") is not None
+        watcher._close()
+
+
+def test_polling_watcher_applies_changes() -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        root = Path(tmp_dir)
+        index = _watched_index(root)
+        watcher = PollingWatcher(index, interval=0.05)
+        watcher.start()
+        try:
+            (root / "Locations" / "Docks.md").write_text("Docks")
+            _bump_mtime(root / "Locations")
+            assert _wait_for(lambda: index.get_location("Docks") is not None)
+        finally:
+            watcher.stop()
+
+
+# ---------------------------------------------------------------------------
+# Full-text search
+# ---------------------------------------------------------------------------
+
+
+def _entry(name: str, kind: NoteKind = NoteKind.LOCATION, organization: str = "") -> NoteEntry:
+    return NoteEntry(kind, name, organization, Path(f"/vault/{organization}/{name}.md"), 0, 0)
+
+
+class TestSearchIndex:
+    def test_ranks_rarer_and_repeated_terms_higher(self) -> None:
+        index = SearchIndex()
+        index.add_note(_entry("Elysium"), "The nightclub where the Prince holds court.")
+        index.add_note(_entry("Docks"), "Smugglers meet near the nightclub boat.")
+        index.add_note(_entry("Haven"), "A quiet apartment.")
+        hits = index.search("Elysium nightclub")
+        assert [h.entry.name for h in hits] == ["Elysium", "Docks"]
+        assert hits[0].score > hits[1].score
+
+    def test_filters_by_kind(self) -> None:
+        index = SearchIndex()
+        index.add_note(_entry("Elysium"), "nightclub")
+        index.add_note(_entry("Rico", NoteKind.CHARACTER, "anarchs"), "owns a nightclub")
+        hits = index.search("nightclub", kind=NoteKind.CHARACTER)
+        assert [h.entry.name for h in hits] == ["Rico"]
+
+    def test_re_adding_a_note_replaces_its_postings(self) -> None:
+        index = SearchIndex()
+        entry = _entry("Elysium")
+        index.add_note(entry, "nightclub")
+        index.add_note(entry, "opera house")
+        assert index.search("nightclub") == []
+        assert [h.entry for h in index.search("opera")] == [entry]
+        index.remove_note(entry)
+        assert index.search("opera") == [] and len(index) == 0
+
+    def test_pipeline_keeps_index_in_step_with_vault(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            root = Path(tmp_dir)
+            index = _watched_index(root)
+            search = SearchIndex()
+            pipeline = NotePipeline(index)
+            pipeline.register(search)
+            pipeline.bootstrap()
+            assert [h.entry.name for h in search.search("Victor")] == ["Victor Manelli"]
+
+            note = root / "Locations" / "Elysium.md"
+            note.write_text("Now a burned-out ruin")
+            index.apply_changes([note, root / "Characters" / "Mortals"])
+            assert [h.entry.name for h in search.search("ruin")] == ["Elysium"]
+
+            (root / "Characters" / "Mortals" / "Victor Manelli.md").unlink()
+            index.apply_changes([root / "Characters" / "Mortals" / "Victor Manelli.md"])
+            assert search.search("Victor") == []
+
+    def test_pipeline_skips_notes_that_are_not_utf8(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            root = Path(tmp_dir)
+            letter = root / "Characters" / "camarilla" / "Old Letter.md"
+            index = _watched_index(root)
+            letter.write_bytes("Signé, le Prince".encode("latin-1"))
+            index.apply_changes([letter])
+            search = SearchIndex()
+            pipeline = NotePipeline(index)
+            pipeline.register(search)
+            pipeline.bootstrap()
+            assert [h.entry.name for h in search.search("Victor")] == ["Victor Manelli"]
+
+            note = root / "Locations" / "Elysium.md"
+            note.write_text("Now a burned-out ruin")
+            letter.write_bytes("Toujours illisible, ça".encode("latin-1"))
+            index.apply_changes([letter, note])
+            assert [h.entry.name for h in search.search("ruin")] == ["Elysium"]
+            assert search.search("toujours") == [] and search.search("illisible") == []
+
+
+def test_make_snippet_centres_on_first_match() -> None:
+    text = "word " * 100 + "the Elysium nightclub " + "filler " * 100
+    snippet = make_snippet(text, "nightclub", width=60)
+    assert "nightclub" in snippet
+    assert snippet.startswith("…") and snippet.endswith("…")
+    assert make_snippet("short text", "absent") == "short text"
+
+
+@pytest.mark.anyio
+async def test_call_tool_search_vault(vault: Path) -> None:
+    result = await call_tool("search_vault", {"query": "story"})
+    assert result[0].text.startswith("Search results for 'story' (1):")
+    assert "[session] __result" in result[0].text
+    assert "The story begins." in result[0].text
+
+    result = await call_tool("search_vault", {"query": "zeppelin"})
+    assert result[0].text == "No notes match 'zeppelin'."
+
+    result = await call_tool("search_vault", {"query": "story", "kind": "npc"})
+    assert result[0].text == "Error: 'kind' must be one of: location, character, session"
+    result = await call_tool("search_vault", {"query": "story", "limit": "ten"})
+    assert result[0].text == "Error: 'limit' must be an integer"
+    for query in (5, ["story"]):
+        result = await call_tool("search_vault", {"query": query})
+        assert result[0].text == "Error: 'query' must be a string"
+
+
+# ---------------------------------------------------------------------------
+# Blocking I/O dispatch
+# ---------------------------------------------------------------------------
+
+
+@pytest.mark.anyio
+async def test_io_dispatcher_runs_off_the_event_loop_thread() -> None:
+    import threading
+
+    dispatcher = IODispatcher(workers=2)
+    try:
+        name = await dispatcher.run(lambda: threading.current_thread().name)
+        assert name.startswith("vault-io")
+    finally:
+        dispatcher.shutdown()
+
+
+@pytest.mark.anyio
+async def test_io_dispatcher_caps_concurrent_calls() -> None:
+    import asyncio
+    import threading
+    import time
+
+    lock = threading.Lock()
+    active = peak = 0
+
+    def slow_read() -> None:
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.02)
+        with lock:
+            active -= 1
+
+    dispatcher = IODispatcher(workers=8, max_concurrent=2)
+    try:
+        await asyncio.gather(*(dispatcher.run(slow_read) for _ in range(8)))
+    finally:
+        dispatcher.shutdown()
+    assert peak == 2
+
+
+class TestIntFromEnv:
+    def test_default_when_unset(self) -> None:
+        with patch.dict(os.environ, {}, clear=True):
+            assert _int_from_env("MCP_IO_WORKERS", 8) == 8
+
+    def test_reads_value(self) -> None:
+        with patch.dict(os.environ, {"MCP_IO_WORKERS": "16"}):
+            assert _int_from_env("MCP_IO_WORKERS", 8) == 16
+
+    @pytest.mark.parametrize("raw", ["zero", "0", "-3"])
+    def test_rejects_invalid_values(self, raw: str) -> None:
+        with patch.dict(os.environ, {"MCP_IO_WORKERS": raw}):
+            with pytest.raises(SystemExit):
+                _int_from_env("MCP_IO_WORKERS", 8)
+
+
+class TestIgnoredDirsFromEnv:
+    def test_reads_names(self) -> None:
+        with patch.dict(os.environ, {"MCP_IGNORE_DIRS": "templates, _archive,,"}):
+            assert ignored_dirs_from_env() == {"templates", "_archive"}
+
+    @pytest.mark.parametrize("raw", ["a/b", ".."])
+    def test_rejects_paths(self, raw: str) -> None:
+        with patch.dict(os.environ, {"MCP_IGNORE_DIRS": raw}):
+            with pytest.raises(SystemExit):
+                ignored_dirs_from_env()
+
+
+# ---------------------------------------------------------------------------
+# Note content cache
+# ---------------------------------------------------------------------------
+
+
+class TestContentCache:
+    def test_hit_after_first_read(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "Elysium.md"
+            path.write_text("Elysium")
+            cache = ContentCache(max_bytes=1024)
+            assert cache.read(path) == "Elysium"
+            assert cache.read(path) == "Elysium"
+            stats = cache.stats()
+            assert (stats.hits, stats.misses, stats.entries, stats.bytes) == (1, 1, 1, 7)
+
+    def test_changed_file_is_reread(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "Elysium.md"
+            path.write_text("Elysium")
+            cache = ContentCache(max_bytes=1024)
+            cache.read(path)
+            path.write_text("Elysium, burned")
+            assert cache.read(path) == "Elysium, burned"
+            assert cache.stats().misses == 2
+            assert cache.stats().bytes == len("Elysium, burned")
+
+    def test_evicts_least_recently_used_by_bytes(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            root = Path(tmp_dir)
+            for name in "abc":
+                (root / f"{name}.md").write_text(name * 10)
+            cache = ContentCache(max_bytes=25)
+            cache.read(root / "a.md")
+            cache.read(root / "b.md")
+            cache.read(root / "a.md")  # b becomes least recently used
+            cache.read(root / "c.md")
+            stats = cache.stats()
+            assert (stats.evictions, stats.entries, stats.bytes) == (1, 2, 20)
+            cache.read(root / "a.md")
+            assert cache.stats().hits == 2
+
+    def test_oversized_files_are_not_cached(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "big.md"
+            path.write_text("x" * 100)
+            cache = ContentCache(max_bytes=10)
+            assert cache.read(path) == "x" * 100
+            assert cache.stats().entries == 0
+
+    def test_missing_file_raises(self) -> None:
+        cache = ContentCache()
+        with pytest.raises(FileNotFoundError):
+            cache.read(Path("/nonexistent/note.md"))
+
+    def test_digest_outlives_evicted_content_and_tracks_edits(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "big.md"
+            path.write_text("x" * 100)
+            cache = ContentCache(max_bytes=10)
+            cache.read(path)
+            with patch.object(Path, "read_text") as read_text:
+                assert cache.digest(path) == content_digest("x" * 100)
+            read_text.assert_not_called()
+            path.write_text("y" * 101)
+            assert cache.digest(path) == content_digest("y" * 101)
+            with pytest.raises(FileNotFoundError):
+                cache.digest(Path(tmp_dir) / "missing.md")
+
+
+@pytest.mark.anyio
+async def test_call_tool_get_tools_honour_if_none_match(vault: Path) -> None:
+    calls = [
+        ("get_location", {"name": "Elysium"}, vault / "Locations" / "Elysium.md"),
+        (
+            "get_character",
+            {"name": "Victor Manelli", "organization": "Mortals"},
+            vault / "Characters" / "Mortals" / "Victor Manelli.md",
+        ),
+        ("get_story_so_far", {}, vault / "sessions" / "__result.md"),
+    ]
+    for tool, arguments, path in calls:
+        first = await call_tool(tool, arguments)
+        etag = content_digest(path.read_text())
+        assert first[-1].text == f"etag: {etag}"
+        with patch("main.get_location_details") as read, patch("main.get_character_details"):
+            result = await call_tool(tool, {**arguments, "if_none_match": etag})
+        read.assert_not_called()
+        assert [r.text for r in result] == [f"Unchanged (etag: {etag})"]
+
+        path.write_text(path.read_text() + "\nAn edit.")
+        result = await call_tool(tool, {**arguments, "if_none_match": etag})
+        assert "An edit." in result[0].text
+        assert result[-1].text == f"etag: {content_digest(path.read_text())}"
+
+    result = await call_tool("get_location", {"name": "Nowhere", "if_none_match": "abc"})
+    assert result[0].text.startswith("Error: Location 'Nowhere' not found")
+
+
+@pytest.mark.anyio
+async def test_etags_cover_the_selected_sections(vault: Path) -> None:
+    (vault / "Locations" / "Haven.md").write_text("# Haven\n\n## Roof\n\nUp.\n\n## Cellar\n\nDown.")
+    roof = await call_tool("get_location", {"name": "Haven", "sections": ["Roof"]})
+    etag = roof[-1].text.removeprefix("etag: ")
+    whole = await call_tool("get_location", {"name": "Haven"})
+    assert whole[-1].text != roof[-1].text
+
+    arguments = {"name": "Haven", "if_none_match": etag}
+    result = await call_tool("get_location", {**arguments, "sections": [" roof "]})
+    assert [r.text for r in result] == [f"Unchanged (etag: {etag})"]
+    for other in ({"sections": ["Cellar"]}, {"sections": ["Roof", "Cellar"]}, {}):
+        result = await call_tool("get_location", {**arguments, **other})
+        assert result[0].text.startswith("# Haven\n\n")
+
+    story = await call_tool("get_story_so_far", {"section": "Session 1"})
+    etag = story[-1].text.removeprefix("etag: ")
+    result = await call_tool("get_story_so_far", {"section": "session 1", "if_none_match": etag})
+    assert [r.text for r in result] == [f"Unchanged (etag: {etag})"]
+    result = await call_tool("get_story_so_far", {"last_n_sections": 1, "if_none_match": etag})
+    assert result[0].text.startswith("# Story So Far")
+
+
+# ---------------------------------------------------------------------------
+# Name suggestions
+# ---------------------------------------------------------------------------
+
+
+class TestNameSuggester:
+    def test_suggests_close_names_within_organization(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            root = Path(tmp_dir)
+            index = _watched_index(root)
+            (root / "Characters" / "camarilla" / "Prince Sebastien.md").write_text("Twin")
+            index.apply_changes([root / "Characters" / "camarilla" / "Prince Sebastien.md"])
+            suggester = NameSuggester(index)
+            assert suggester.suggest(NoteKind.CHARACTER, "prince sebastion", "camarilla") == [
+                ("camarilla", "Prince Sebastian"),
+                ("camarilla", "Prince Sebastien"),
+            ]
+            assert suggester.suggest(NoteKind.CHARACTER, "Prince Sebastian", "Mortals") == []
+
+    def test_suggests_across_organizations_and_locations(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index = _watched_index(Path(tmp_dir))
+            suggester = NameSuggester(index)
+            assert suggester.suggest(NoteKind.CHARACTER, "Raphael Kirbi") == [
+                ("Mortals/second inquisition", "Raphael Kirby")
+            ]
+            assert suggester.suggest(NoteKind.LOCATION, "Elysum") == [("", "Elysium")]
+            assert suggester.suggest(NoteKind.LOCATION, "zzzz") == []
+
+    def test_suggests_organizations(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index = _watched_index(Path(tmp_dir))
+            suggester = NameSuggester(index)
+            assert suggester.suggest_organizations(NoteKind.CHARACTER, "Camarila") == ["camarilla"]
+            assert suggester.has_organization(NoteKind.CHARACTER, "camarilla")
+
+    def test_follows_index_changes(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            root = Path(tmp_dir)
+            index = _watched_index(root)
+            suggester = NameSuggester(index)
+            note = root / "Characters" / "camarilla" / "Prince Sebastian.md"
+            note.unlink()
+            index.apply_changes([note])
+            assert suggester.suggest(NoteKind.CHARACTER, "Prince Sebastian") == []
+            assert not suggester.has_organization(NoteKind.CHARACTER, "camarilla")
+
+
+@pytest.mark.anyio
+async def test_call_tool_get_location_suggests_close_names(vault: Path) -> None:
+    result = await call_tool("get_location", {"name": "Elysum"})
+    assert result[0].text == "Error: Location 'Elysum' not found\n\nDid you mean: Elysium"
+
+
+@pytest.mark.anyio
+async def test_call_tool_get_character_suggests_organizations(vault: Path) -> None:
+    result = await call_tool(
+        "get_character", {"name": "Prince Sebastian", "organization": "Camarila"}
+    )
+    assert result[0].text.endswith("\n\nDid you mean organization: camarilla")
+
+    result = await call_tool(
+        "get_character", {"name": "Prince Sebastin", "organization": "camarilla"}
+    )
+    assert result[0].text.endswith("\n\nDid you mean (in camarilla): Prince Sebastian")
+
+
+# ---------------------------------------------------------------------------
+# Frontmatter
+# ---------------------------------------------------------------------------
+
+
+class TestParseFrontmatter:
+    def test_scalars_and_lists(self) -> None:
+        text = (
+            "---\n"
+            "clan: Ventrue\n"
+            "generation: 9\n"
+            "humanity: 6.5\n"
+            "active: true\n"
+            'district: "North End"\n'
+            "sire:\n"
+            "tags: [elder, camarilla]\n"
+            "aliases:\n"
+            "  - The Prince\n"
+            "  - Seb\n"
+            "---\n"
+            "# Body\n"
+        )
+        assert parse_frontmatter(text) == {
+            "clan": "Ventrue",
+            "generation": 9,
+            "humanity": 6.5,
+            "active": True,
+            "district": "North End",
+            "sire": None,
+            "tags": ["elder", "camarilla"],
+            "aliases": ["The Prince", "Seb"],
+        }
+
+    def test_only_plain_numbers_are_converted(self) -> None:
+        text = (
+            "---\nnickname: Nan\nrank: Inf\nrange: -infinity\ngold: 1_000\n"
+            "weight: -2.5e3\nhuge: 1e999\nage: 042\n---\n"
+        )
+        assert parse_frontmatter(text) == {
+            "nickname": "Nan",
+            "rank": "Inf",
+            "range": "-infinity",
+            "gold": "1_000",
+            "weight": -2500.0,
+            "huge": "1e999",
+            "age": 42,
+        }
+
+    def test_no_frontmatter(self) -> None:
+        assert parse_frontmatter("# Just a heading\n---\nclan: x\n---\n") == {}
+
+    def test_skips_nested_mappings(self) -> None:
+        text = "---\nstats:\n  strength: 3\nclan: Brujah\n---\n"
+        assert parse_frontmatter(text) == {"stats": None, "clan": "Brujah"}
+
+
+class TestFrontmatterIndex:
+    @staticmethod
+    def notes() -> list[tuple[NoteEntry, str]]:
+        frontmatter = {
+            "Sebastian": "clan: Ventrue\ngeneration: 8\ntags: [elder, prince]",
+            "Adrian": "clan: ventrue\ngeneration: 11\nstatus: alive",
+            "Rico": "clan: Brujah\ngeneration: 12\nstatus: torpor",
+            "Victor": "status: alive",
+        }
+        notes = [
+            (_entry(name, NoteKind.CHARACTER, "vampires"), f"---\n{properties}\n---\nBody")
+            for name, properties in frontmatter.items()
+        ]
+        return [*notes, (_entry("Elysium"), "---\ndistrict: North End\n---\n")]
+
+    def _index(self) -> FrontmatterIndex:
+        index = FrontmatterIndex()
+        for entry, text in self.notes():
+            index.add_note(entry, text)
+        return index
+
+    @staticmethod
+    def _names(results: list[tuple[NoteEntry, dict[str, Any]]]) -> list[str]:
+        return [entry.name for entry, _ in results]
+
+    def test_equality_is_case_insensitive(self) -> None:
+        assert self._names(self._index().query({"clan": "VENTRUE"})) == ["Adrian", "Sebastian"]
+
+    def test_list_properties_match_by_membership(self) -> None:
+        assert self._names(self._index().query({"tags": "elder"})) == ["Sebastian"]
+
+    def test_in_range_and_exists(self) -> None:
+        index = self._index()
+        assert self._names(index.query({"status": ["alive", "torpor"]})) == [
+            "Adrian",
+            "Rico",
+            "Victor",
+        ]
+        assert self._names(index.query({"generation": {"gte": 9, "lt": 12}})) == ["Adrian"]
+        assert self._names(index.query({"clan": {"exists": False}}, NoteKind.CHARACTER)) == [
+            "Victor"
+        ]
+
+    def test_conditions_are_combined(self) -> None:
+        index = self._index()
+        assert self._names(index.query({"clan": "ventrue", "status": "alive"})) == ["Adrian"]
+
+    def test_nan_like_strings_match_as_strings(self) -> None:
+        index = FrontmatterIndex()
+        entry = _entry("Nan", NoteKind.CHARACTER, "mortals")
+        index.add_note(entry, "---\nnickname: Nan\n---\n")
+        assert self._names(index.query({"nickname": "nan"})) == ["Nan"]
+        assert self._names(index.query({"nickname": {"gte": "M"}})) == ["Nan"]
+
+    def test_kind_filter_and_updates(self) -> None:
+        index = self._index()
+        assert self._names(index.query({"district": "north end"}, NoteKind.LOCATION)) == ["Elysium"]
+        index.add_note(_entry("Elysium"), "no frontmatter any more")
+        assert index.query({"district": "north end"}) == []
+        index.remove_note(_entry("Rico", NoteKind.CHARACTER, "vampires"))
+        assert self._names(index.query({"generation": {"gt": 10}})) == ["Adrian"]
+
+    def test_rejects_bad_conditions(self) -> None:
+        index = self._index()
+        with pytest.raises(ValueError):
+            index.query({"clan": {"like": "Ven%"}})
+        with pytest.raises(ValueError):
+            index.query({"generation": {"gt": 1, "lt": "z"}})
+
+
+@pytest.mark.anyio
+async def test_call_tool_query_notes(vault: Path) -> None:
+    result = await call_tool("query_notes", {"where": {"safety": {"lte": 3}}})
+    assert result[0].text == (
+        "Matching notes (1):\n- [location] Haven: district: North End; safety: 3"
+    )
+    result = await call_tool("query_notes", {"where": {"clan": {"near": "x"}}})
+    assert result[0].text.startswith("Error: Unknown operator(s) for 'clan': near")
+    result = await call_tool("query_notes", {"where": {"safety": 3}, "kind": "place"})
+    assert result[0].text == "Error: 'kind' must be one of: location, character, session"
+
+    # Without a watcher, the query revalidates the index like the other tools do
+    (vault / "Locations" / "Rack.md").write_text("---\nsafety: 1\n---\nThe Rack")
+    _bump_mtime(vault / "Locations")
+    result = await call_tool("query_notes", {"where": {"safety": {"lte": 3}}})
+    assert result[0].text == (
+        "Matching notes (2):\n"
+        "- [location] Haven: district: North End; safety: 3\n"
+        "- [location] Rack: safety: 1"
+    )
+
+
+def test_parse_wikilinks() -> None:
+    text = "See [[Elysium]], [[camarilla/Prince Sebastian.md|the Prince]] and [[haven#Roof]]."
+    assert parse_wikilinks(text) == {"elysium", "prince sebastian", "haven"}
+    assert parse_wikilinks("No links, just [single] brackets.") == set()
+
+
+class TestLinkGraph:
+    @staticmethod
+    def _graph() -> LinkGraph:
+        graph = LinkGraph()
+        graph.add_note(_entry("Elysium"), "Court is held by [[Sebastian]].")
+        graph.add_note(_entry("Sebastian", NoteKind.CHARACTER, "camarilla"), "Sire of [[Adrian]].")
+        graph.add_note(_entry("Adrian", NoteKind.CHARACTER, "camarilla"), "Haunts [[Docks]].")
+        return graph
+
+    @staticmethod
+    def _names(graph: LinkGraph, start: NoteEntry, **kwargs: Any) -> list[tuple[str, int]]:
+        return [(r.entry.name, r.depth) for r in graph.related(start.path, **kwargs)]
+
+    def test_outgoing_and_backlinks(self) -> None:
+        graph = self._graph()
+        sebastian = _entry("Sebastian", NoteKind.CHARACTER, "camarilla")
+        assert self._names(graph, sebastian, direction=LinkDirection.OUT) == [("Adrian", 1)]
+        assert self._names(graph, sebastian, direction=LinkDirection.IN) == [("Elysium", 1)]
+        both = graph.related(sebastian.path)
+        assert [(r.entry.name, r.links_to, r.linked_from) for r in both] == [
+            ("Adrian", True, False),
+            ("Elysium", False, True),
+        ]
+
+    def test_depth_and_limit(self) -> None:
+        graph = self._graph()
+        elysium = _entry("Elysium")
+        assert self._names(graph, elysium, depth=2) == [("Sebastian", 1), ("Adrian", 2)]
+        assert self._names(graph, elysium, depth=3, limit=1) == [("Sebastian", 1)]
+
+    def test_dangling_links_resolve_once_the_note_exists(self) -> None:
+        graph = self._graph()
+        adrian = _entry("Adrian", NoteKind.CHARACTER, "camarilla")
+        assert graph.outgoing(adrian.path) == set()
+        graph.add_note(_entry("Docks"), "Smugglers.")
+        assert graph.outgoing(adrian.path) == {_entry("Docks").path}
+        graph.remove_note(_entry("Docks"))
+        graph.add_note(adrian, "No links any more.")
+        assert graph.incoming(_entry("Sebastian", NoteKind.CHARACTER, "camarilla").path) == {
+            _entry("Elysium").path
+        }
+        assert self._names(graph, _entry("Elysium"), depth=3) == [("Sebastian", 1), ("Adrian", 2)]
+        assert graph.incoming(adrian.path) == {
+            _entry("Sebastian", NoteKind.CHARACTER, "camarilla").path
+        }
+
+
+@pytest.mark.anyio
+async def test_call_tool_get_related(vault: Path) -> None:
+    import main
+
+    assert main._vault_state is not None
+    state = main._vault_state
+    haven = vault / "Locations" / "Haven.md"
+    haven.write_text("The [[Prince Sebastian]] sleeps here, near [[Elysium]].")
+    (entry,) = [e for e in state.index.location_entries() if e.name == "Haven"]
+    state.links.add_note(entry, haven.read_text())
+
+    result = await call_tool("get_related", {"name": "prince sebastian"})
+    assert result[0].text == (
+        "# Related to Prince Sebastian (camarilla) (character)\n\n"
+        "- [location] Haven (depth 1, backlink)"
+    )
+    with patch.object(main, "_run_io", wraps=main._run_io) as run_io:
+        result = await call_tool(
+            "get_related", {"name": "Haven", "direction": "out", "include_content": True}
+        )
+    assert [c.args[0] for c in run_io.call_args_list].count(main._read_entry) == 2
+    assert [r.text for r in result] == [
+        "# Related to Haven (location)\n\n"
+        "- [character] Prince Sebastian (camarilla) (depth 1, outgoing link)\n"
+        "- [location] Elysium (depth 1, outgoing link)",
+        "# Prince Sebastian (camarilla)\n\nPrince content",
+        "# Elysium\n\nElysium content",
+    ]
+    result = await call_tool("get_related", {"name": "Nobody"})
+    assert result[0].text == "Error: Note 'Nobody' not found"
+    result = await call_tool("get_related", {"name": "Haven", "direction": "sideways"})
+    assert result[0].text == "Error: 'direction' must be one of: out, in, both"
+    result = await call_tool("get_related", {"name": "Haven", "depth": "deep"})
+    assert result[0].text == "Error: 'depth' must be an integer"
+    result = await call_tool("get_related", {"name": 5})
+    assert result[0].text == "Error: 'name' must be a string"
+
+    (vault / "Locations" / "Rack.md").write_text("Run by [[Prince Sebastian]].")
+    _bump_mtime(vault / "Locations")
+    result = await call_tool("get_related", {"name": "prince sebastian"})
+    assert result[0].text == (
+        "# Related to Prince Sebastian (camarilla) (character)\n\n"
+        "- [location] Haven (depth 1, backlink)\n"
+        "- [location] Rack (depth 1, backlink)"
+    )
+
+
+@pytest.mark.anyio
+async def test_a_call_keeps_the_state_it_started_with(vault: Path) -> None:
+    import main
+
+    served = main._served_state
+    newer = VaultState.empty(vault / "Locations", vault / "Characters", vault / "sessions")
+
+    def switch_after_reading() -> VaultState:
+        state = served()
+        main._install_vault_state(newer)  # A worker switching generations mid-call
+        return state
+
+    with patch.object(main, "_served_state", switch_after_reading):
+        result = await call_tool("get_related", {"name": "Elysium", "include_content": True})
+    assert result[0].text.startswith("No linked notes found for Elysium.")
+    assert main._vault_state is newer
+    result = await call_tool("get_related", {"name": "Elysium"})
+    assert result[0].text == "Error: Note 'Elysium' not found"
+
+
+_CHRONICLE = (
+    "---\ntags: [chronicle]\n# not a heading\n---\n"
+    "# Chronicle\n\nIntro.\n\n"
+    "## Session 1 - Arrival ##\n\nThe coterie arrives.\n\n"
+    "### Aftermath\n\n```\n# not a heading either\n```\n\n"
+    "## Session 2 - The Docks\n\nSmugglers.\n\n"
+    "## Session 3 - Élysium\n\nThe Prince speaks.\n"
+)
+
+
+class TestSummaryIndex:
+    def test_summary_skips_frontmatter_headings_and_code(self) -> None:
+        summary = summarize_note(
+            "---\nclan: Tremere\ntags: [elder]\n---\n"
+            "# Karl\n\n```\n# not a heading\n```\n"
+            "Regent of the\nchantry.\n\nSecond paragraph.\n\n## Touchstones ##\n"
+        )
+        assert summary.first_paragraph == "Regent of the chantry."
+        assert summary.properties == ("clan", "tags")
+        assert summary.headings == ("Karl", "Touchstones")
+        assert summary.words == 11
+
+    def test_long_paragraphs_are_truncated(self) -> None:
+        summary = summarize_note("word " * 100)
+        assert len(summary.first_paragraph) <= 160
+        assert summary.first_paragraph.endswith("…")
+        assert summary.words == 100
+
+    def test_updates_replace_and_removals_forget(self) -> None:
+        index = SummaryIndex()
+        entry = _entry("Karl", NoteKind.CHARACTER, "tremere")
+        index.add_note(entry, "Old text")
+        index.add_note(entry, "New text here")
+        summary = index.get(entry.path)
+        assert summary is not None
+        assert summary.first_paragraph == "New text here"
+        index.remove_note(entry)
+        assert index.get(entry.path) is None
+        assert len(index) == 0
+
+
+class TestChangeJournal:
+    def test_generations_advance_per_batch_and_changes_are_netted(self, tmp_path: Path) -> None:
+        index = _watched_index(tmp_path)
+        journal = ChangeJournal(index)
+        start = journal.generation
+        locations = tmp_path / "Locations"
+        (locations / "Rack.md").write_text("The Rack")
+        index.apply_changes([locations / "Rack.md"])
+        (locations / "Rack.md").write_text("The Rack, burned")
+        (locations / "Haven.md").unlink()
+        index.apply_changes([locations / "Rack.md", locations / "Haven.md"])
+        (locations / "Docks.md").write_text("Docks")
+        index.apply_changes([locations / "Docks.md"])
+        (locations / "Docks.md").unlink()
+        index.apply_changes([locations / "Docks.md"])
+        assert journal.generation == start + 4
+
+        changes = journal.since(start)
+        assert changes is not None
+        assert [(c.kind, c.entry.name, c.generation - start) for c in changes] == [
+            (ChangeKind.ADDED, "Rack", 2),
+            (ChangeKind.DELETED, "Haven", 2),
+        ]
+        changes = journal.since(start + 1)
+        assert changes is not None
+        assert [(c.kind, c.entry.name) for c in changes] == [
+            (ChangeKind.MODIFIED, "Rack"),
+            (ChangeKind.DELETED, "Haven"),
+        ]
+        assert journal.since(journal.generation) == []
+        assert journal.since(start - 1) is None
+        assert journal.since(journal.generation + 1) is None
+
+    def test_note_that_existed_before_is_never_reported_as_added(self) -> None:
+        journal = ChangeJournal()
+        start = journal.generation
+        entry = _entry("Rack")
+        for kind in (ChangeKind.MODIFIED, ChangeKind.DELETED, ChangeKind.ADDED):
+            journal.record([VaultChange(kind, entry)])
+        changes = journal.since(start)
+        assert changes is not None
+        assert [(c.kind, c.generation - start) for c in changes] == [(ChangeKind.MODIFIED, 3)]
+
+    def test_trimmed_journal_asks_for_a_resync(self, tmp_path: Path) -> None:
+        index = _watched_index(tmp_path)
+        journal = ChangeJournal(index, max_entries=2)
+        start = journal.generation
+        for name in ("A", "B", "C"):
+            (tmp_path / "Locations" / f"{name}.md").write_text(name)
+            index.apply_changes([tmp_path / "Locations" / f"{name}.md"])
+        assert journal.since(start) is None
+        changes = journal.since(start + 1)
+        assert changes is not None and [c.entry.name for c in changes] == ["B", "C"]
+
+        restored = ChangeJournal()
+        restored.import_state(journal.export_state())
+        assert restored.generation == journal.generation
+        assert restored.since(start) is None
+        assert restored.since(start + 1) == changes
+
+
+@pytest.mark.anyio
+async def test_requests_pick_up_notes_edited_in_place_without_a_watcher(vault: Path) -> None:
+    import main
+
+    haven = vault / "Locations" / "Haven.md"
+    haven.write_text("---\nsafety: 1\n---\nNow a gargoyle roost")  # Directory mtime unchanged
+    with patch.object(main, "_last_deep_refresh", time.monotonic()):
+        result = await call_tool("search_vault", {"query": "gargoyle"})
+        assert result[0].text == "No notes match 'gargoyle'."  # Restatted too recently
+    with patch.object(main, "_last_deep_refresh", 0.0):
+        result = await call_tool("search_vault", {"query": "gargoyle"})
+    assert "1. [location] Haven" in result[0].text
+    result = await call_tool("query_notes", {"where": {"safety": 1}})
+    assert result[0].text.startswith("Matching notes (1):\n- [location] Haven")
+
+
+@pytest.mark.anyio
+async def test_call_tool_changes_since(vault: Path) -> None:
+    result = await call_tool("changes_since", {})
+    generation = int(result[0].text.rsplit(" ", 1)[1])
+    result = await call_tool("changes_since", {"generation": generation})
+    assert result[0].text == (
+        f"No changes since generation {generation}. Current generation: {generation}"
+    )
+
+    (vault / "Locations" / "Rack.md").write_text("The Rack")
+    _bump_mtime(vault / "Locations")
+    result = await call_tool("changes_since", {"generation": generation})
+    assert result[0].text == (
+        f"Changes since generation {generation} (1), now at {generation + 1}:\n"
+        f"- added [location] Rack (generation {generation + 1})"
+    )
+    result = await call_tool("changes_since", {"generation": generation - 1})
+    assert result[0].text.startswith("Resync required")
+    result = await call_tool("changes_since", {"generation": "soon"})
+    assert result[0].text == "Error: 'generation' must be an integer"
+
+
+class TestVaultSnapshot:
+    @staticmethod
+    def _state(root: Path) -> VaultState:
+        state = VaultState.empty(root / "Locations", root / "Characters", root / "sessions")
+        state.index.build()
+        pipeline = NotePipeline(state.index)
+        for analyzer in state.analyzers:
+            pipeline.register(analyzer)
+        pipeline.bootstrap()
+        return state
+
+    @staticmethod
+    def _vault(root: Path) -> None:
+        _make_vault(root)
+        (root / "sessions").mkdir()
+        (root / "Locations" / "Elysium.md").write_text(
+            "---\ndistrict: Downtown\n---\nCourt is held by [[Prince Sebastian]]."
+        )
+
+    def test_round_trip_restores_index_and_analyzers(self, tmp_path: Path) -> None:
+        self._vault(tmp_path)
+        state = self._state(tmp_path)
+        path = tmp_path / "vault.snapshot"
+        assert write_snapshot(path, state, generation=3) == path.stat().st_size
+
+        restored = VaultState.empty(
+            tmp_path / "Locations", tmp_path / "Characters", tmp_path / "sessions"
+        )
+        snapshot = read_snapshot(path, restored.analyzers)
+        restore_snapshot(snapshot, restored)
+        assert snapshot.generation == 3
+        assert restored.index.characters() == state.index.characters()
+        assert restored.index.locations() == state.index.locations()
+        assert [h.entry for h in restored.search.search("court")] == [
+            h.entry for h in state.search.search("court")
+        ]
+        assert restored.frontmatter.query({"district": "Downtown"}) == state.frontmatter.query(
+            {"district": "Downtown"}
+        )
+        elysium = tmp_path / "Locations" / "Elysium.md"
+        assert [r.entry.name for r in restored.links.related(elysium)] == ["Prince Sebastian"]
+        assert restored.summaries.get(elysium) == state.summaries.get(elysium)
+        assert restored.summaries.get(elysium) is not None
+
+    def test_rejects_foreign_and_mismatched_files(self, tmp_path: Path) -> None:
+        self._vault(tmp_path)
+        state = self._state(tmp_path)
+        garbage = tmp_path / "garbage"
+        garbage.write_bytes(b"not a snapshot at all")
+        with pytest.raises(ValueError, match="not a vault snapshot"):
+            read_snapshot(garbage, state.analyzers)
+
+        path = tmp_path / "vault.snapshot"
+        write_snapshot(path, state, generation=1)
+        with pytest.raises(ValueError, match="incompatible"):
+            read_snapshot(path, state.analyzers[:2])
+
+        other = VaultState.empty(
+            tmp_path / "elsewhere", tmp_path / "Characters", tmp_path / "sessions"
+        )
+        with pytest.raises(ValueError):
+            restore_snapshot(read_snapshot(path, other.analyzers), other)
+
+    def test_follower_picks_up_published_generations(self, tmp_path: Path) -> None:
+        self._vault(tmp_path)
+        state = self._state(tmp_path)
+        path = tmp_path / "vault.snapshot"
+        publisher = SnapshotPublisher(path, state)
+        publisher.publish()
+
+        installed: list[VaultState] = []
+        follower = SnapshotFollower(
+            path,
+            tmp_path / "Locations",
+            tmp_path / "Characters",
+            tmp_path / "sessions",
+            install=installed.append,
+        )
+        follower.load_and_install()
+        assert follower.generation == 1
+        assert "Haven" in installed[-1].index.locations()
+
+        (tmp_path / "Locations" / "Rack.md").write_text("The Rack")
+        state.index.refresh()
+        assert publisher.generation == 2
+        follower.load_and_install()
+        assert follower.generation == 2
+        assert "Rack" in installed[-1].index.locations()
+        journal = installed[-1].journal
+        assert journal.generation == state.journal.generation
+        changes = journal.since(journal.generation - 1)
+        assert changes is not None
+        assert [(c.kind, c.entry.name) for c in changes] == [(ChangeKind.ADDED, "Rack")]
+
+
+class TestIndexCache:
+    @staticmethod
+    def _load(root: Path, cache: IndexCache) -> VaultState:
+        return load_vault(root / "Locations", root / "Characters", root / "sessions", cache)
+
+    def test_restart_reads_only_notes_changed_while_down(self, vault: Path) -> None:
+        import main
+
+        cache = IndexCache(vault / "cache" / "vault.snapshot")
+        self._load(vault, cache)
+        assert cache.path.exists()
+
+        locations = vault / "Locations"
+        (locations / "Haven.md").write_text("---\ndistrict: Docks\n---\nHaven by the water")
+        (locations / "Elysium.md").unlink()
+        (locations / "Rack.md").write_text("The Rack")
+        _bump_mtime(locations)
+        with patch.object(main, "read_note_files", wraps=main.read_note_files) as reads:
+            state = self._load(vault, IndexCache(cache.path))
+        read = sorted(e.path.name for call in reads.call_args_list for e in call.args[0])
+        assert read == ["Haven.md", "Rack.md"]
+        assert state.index.locations() == ["Haven", "Rack"]
+        assert [hit.entry.name for hit in state.search.search("water")] == ["Haven"]
+        assert [e.name for e, _ in state.frontmatter.query({"district": "Docks"})] == ["Haven"]
+
+        with patch.object(main, "read_note_files", wraps=main.read_note_files) as reads:
+            self._load(vault, IndexCache(cache.path))
+        assert reads.call_count == 0
+
+    def test_unusable_cache_is_rebuilt(self, vault: Path) -> None:
+        cache = IndexCache(vault / "vault.snapshot")
+        cache.path.write_bytes(b"not a snapshot")
+        state = self._load(vault, cache)
+        assert state.index.locations() == ["Elysium", "Haven"]
+        assert read_snapshot(cache.path, state.analyzers).generation == 0
+
+    def test_sqlite_storage_skips_the_analyzers_it_replaces(self, vault: Path) -> None:
+        dirs = (vault / "Locations", vault / "Characters", vault / "sessions")
+        cache = IndexCache(vault / "vault.snapshot")
+        self._load(vault, cache)
+        assert cache.load(*dirs, stored=True) is None
+
+        state = load_vault(*dirs, IndexCache(cache.path), SQLiteStore(":memory:"))
+        assert state.stored and state.analyzers == [state.summaries]
+        assert len(state.search) == 0 and state.frontmatter.query({"district": "north end"}) == []
+        restored = IndexCache(cache.path).load(*dirs, stored=True)
+        assert restored is not None and len(restored.summaries) == len(state.summaries)
+        assert cache.load(*dirs) is None
+
+    def test_from_env(self, tmp_path: Path) -> None:
+        dirs = (tmp_path / "Locations", tmp_path / "Characters", tmp_path / "sessions")
+        with patch.dict(os.environ, {"MCP_CACHE_DIR": "off"}):
+            assert IndexCache.from_env(*dirs) is None
+        with patch.dict(os.environ, {"MCP_CACHE_DIR": str(tmp_path / "cache")}):
+            cache = IndexCache.from_env(*dirs)
+            other = IndexCache.from_env(tmp_path / "Elsewhere", *dirs[1:])
+        assert cache is not None and other is not None
+        assert cache.path.parent == tmp_path / "cache"
+        assert cache.path != other.path
+
+
+class TestSQLiteStore:
+    @staticmethod
+    def _index(root: Path) -> VaultIndex:
+        index = VaultIndex(root / "Locations", root / "Characters", root / "sessions")
+        index.build()
+        return index
+
+    def test_sync_mirrors_the_vault_and_reads_only_changed_notes(self, vault: Path) -> None:
+        import main
+
+        index = self._index(vault)
+        store = SQLiteStore(vault / "vault.sqlite3")
+        assert store.sync(index) == 6
+        assert store.locations() == ["Elysium", "Haven"]
+        page, next_key = store.character_page(2)
+        assert [(e.organization, e.name, text) for e, text in page] == [
+            ("Mortals", "Victor Manelli", "Victor content"),
+            ("Mortals/second inquisition", "Raphael Kirby", "Raphael"),
+        ]
+        assert next_key == ("Mortals/second inquisition", "Raphael Kirby")
+        page, next_key = store.character_page(2, next_key)
+        assert [e.name for e, _ in page] == ["Prince Sebastian"] and next_key is None
+        found = store.note(NoteKind.CHARACTER, "Prince Sebastian", "camarilla")
+        assert found is not None and found[1] == "Prince content"
+        assert store.note(NoteKind.LOCATION, "Nowhere") is None
+
+        (vault / "Locations" / "Elysium.md").unlink()
+        (vault / "Locations" / "Rack.md").write_text("The Rack")
+        index = self._index(vault)
+        with patch.object(main, "read_note_files", wraps=main.read_note_files) as reads:
+            assert store.sync(index) == 2
+        assert [e.name for call in reads.call_args_list for e in call.args[0]] == ["Rack"]
+        assert store.locations() == ["Haven", "Rack"]
+        store.close()
+
+    def test_notes_that_cannot_be_stored_are_skipped(self, vault: Path) -> None:
+        index_keys = FrontmatterIndex._index_keys
+
+        def broken_keys(properties: dict[str, Any]) -> set[tuple[str, tuple[str, Any]]]:
+            if "safety" in properties:
+                return {("safety", ("s", None))}  # NULL violates properties.value NOT NULL
+            return index_keys(properties)
+
+        store = SQLiteStore(":memory:")
+        with patch.object(FrontmatterIndex, "_index_keys", staticmethod(broken_keys)):
+            assert store.sync(self._index(vault)) == 6
+        assert store.locations() == ["Elysium"]
+        assert len(store) == 5
+
+    def test_non_finite_numbers_are_not_indexed(self) -> None:
+        store = SQLiteStore(":memory:")
+        entry = _entry("Haven")
+        with patch("main.parse_frontmatter", return_value={"safety": float("nan"), "n": 10**400}):
+            store.add_note(entry, "Haven")
+        assert store._query("SELECT count(*) FROM properties")[0][0] == 0
+        assert len(store) == 1
+
+    def test_search_ranks_with_bm25_and_filters_by_kind(self, vault: Path) -> None:
+        (vault / "Locations" / "Docks.md").write_text("Smugglers meet Victor here at night")
+        store = SQLiteStore(":memory:")
+        store.sync(self._index(vault))
+        results = store.search("victor")
+        assert [hit.entry.name for hit, _ in results] == ["Victor Manelli", "Docks"]
+        assert results[0][0].score > results[1][0].score
+        assert results[1][1] == "Smugglers meet Victor here at night"
+        assert [hit.entry.name for hit, _ in store.search("victor", kind=NoteKind.LOCATION)] == [
+            "Docks"
+        ]
+        assert store.search("the and") == []
+
+    def test_pipeline_keeps_properties_and_links_current(self, vault: Path) -> None:
+        index = self._index(vault)
+        store = SQLiteStore(":memory:")
+        store.sync(index)
+        NotePipeline(index).register(store)
+
+        haven = vault / "Locations" / "Haven.md"
+        haven.write_text("---\ndistrict: Docks\ntags: [safe, hidden]\n---\nSee [[Elysium]]")
+        _bump_mtime(vault / "Locations")
+        index.refresh(deep=True)
+        rows = store._query(
+            "SELECT p.name, p.type, p.value FROM properties p JOIN notes n ON n.id = p.note_id"
+            " WHERE n.name = 'Haven' ORDER BY 1, 3"
+        )
+        assert rows == [("district", "s", "docks"), ("tags", "s", "hidden"), ("tags", "s", "safe")]
+        assert store._query("SELECT target_key FROM links") == [("elysium",)]
+
+        haven.unlink()
+        _bump_mtime(vault / "Locations")
+        index.refresh()
+        assert store.locations() == ["Elysium"]
+        assert store._query("SELECT count(*) FROM properties") == [(0,)]
+        assert store.search("docks") == []
+
+    def test_query_matches_the_frontmatter_index(self) -> None:
+        index = FrontmatterIndex()
+        store = SQLiteStore(":memory:")
+        for entry, text in [*TestFrontmatterIndex.notes(), (_entry("Haven"), "No frontmatter")]:
+            index.add_note(entry, text)
+            store.add_note(entry, text)
+        queries: list[tuple[dict[str, Any], NoteKind | None]] = [
+            ({"clan": "VENTRUE"}, None),
+            ({"tags": "elder"}, None),
+            ({"status": ["alive", "torpor"]}, None),
+            ({"status": {"in": []}}, None),
+            ({"generation": {"gte": 9, "lt": 12}}, None),
+            ({"generation": {"gt": 8.0}}, None),
+            ({"clan": {"gte": "c", "lte": "w"}}, None),
+            ({"clan": {"exists": False}}, NoteKind.CHARACTER),
+            ({"clan": {"exists": False}}, None),
+            ({"district": {"exists": True}}, None),
+            ({"clan": "ventrue", "status": "alive"}, None),
+            ({"clan": "ventrue", "generation": {"eq": 8, "exists": True}}, None),
+        ]
+        for where, kind in queries:
+            assert store.query(where, kind) == index.query(where, kind), where
+        assert store.query({"status": "alive"}, limit=1) == index.query(
+            {"status": "alive"}, limit=1
+        )
+        for where in (
+            {"clan": {"like": "Ven%"}},
+            {"generation": {"gt": 1, "lt": "z"}},
+            {"generation": {"gt": True}},
+            {"status": {"in": "alive"}},
+            {"status": {"eq": None}},
+        ):
+            with pytest.raises(ValueError) as expected:
+                index.query(where)
+            with pytest.raises(ValueError, match=re.escape(str(expected.value))):
+                store.query(where)
+
+    def test_related_matches_the_link_graph(self) -> None:
+        notes = {
+            _entry("Elysium"): "Court is held by [[Sebastian]], see [[Haven]].",
+            _entry("Haven"): "Safe from [[Elysium]]; [[Sebastian]] sleeps here.",
+            _entry("Sebastian", NoteKind.CHARACTER, "camarilla"): "Sire of [[Adrian]].",
+            _entry("Sebastian", NoteKind.CHARACTER, "anarchs"): "Not the [[Elysium]] one.",
+            _entry("Adrian", NoteKind.CHARACTER, "camarilla"): "Haunts [[Docks]], [[adrian]].",
+        }
+        graph = LinkGraph()
+        store = SQLiteStore(":memory:")
+        for entry, text in notes.items():
+            graph.add_note(entry, text)
+            store.add_note(entry, text)
+        assert store.find("SEBASTIAN") == graph.find("SEBASTIAN")
+        assert store.find("Docks") == []
+        for start in notes:
+            for direction in LinkDirection:
+                for depth, limit in ((1, None), (2, None), (3, None), (3, 2)):
+                    assert store.related(start.path, depth, direction, limit) == graph.related(
+                        start.path, depth, direction, limit
+                    ), (start.name, direction, depth, limit)
+        assert store.related(_entry("Docks").path) == []
+
+    def test_organizations(self, vault: Path) -> None:
+        store = SQLiteStore(":memory:")
+        store.sync(self._index(vault))
+        assert store.organizations(NoteKind.CHARACTER) == [
+            "Mortals",
+            "Mortals/second inquisition",
+            "camarilla",
+        ]
+        assert store.organizations(NoteKind.LOCATION) == []
+
+    def test_database_of_another_schema_is_rebuilt(self, vault: Path) -> None:
+        import sqlite3
+
+        path = vault / "vault.sqlite3"
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE notes (id INTEGER PRIMARY KEY)")
+        conn.execute("PRAGMA user_version = 999")
+        conn.commit()
+        conn.close()
+        store = SQLiteStore(path)
+        store.sync(self._index(vault))
+        assert store.locations() == ["Elysium", "Haven"]
+        store.close()
+
+        path.write_bytes(b"not a database" * 100)
+        store = SQLiteStore(path)
+        assert store.locations() == []
+
+    def test_from_env(self, tmp_path: Path) -> None:
+        dirs = (tmp_path / "Locations", tmp_path / "Characters", tmp_path / "sessions")
+        with patch.dict(os.environ, {"MCP_STORAGE": "filesystem"}):
+            assert sqlite_store_from_env(*dirs) is None
+        env = {"MCP_STORAGE": "sqlite", "MCP_SQLITE_PATH": str(tmp_path / "db" / "v.sqlite3")}
+        with patch.dict(os.environ, env):
+            store = sqlite_store_from_env(*dirs)
+        assert store is not None and store.path == tmp_path / "db" / "v.sqlite3"
+        with (
+            patch.dict(os.environ, {"MCP_STORAGE": "sqlite", "MCP_CACHE_DIR": "off"}),
+            pytest.raises(SystemExit),
+        ):
+            sqlite_store_from_env(*dirs)
+        with patch.dict(os.environ, {"MCP_STORAGE": "postgres"}), pytest.raises(SystemExit):
+            sqlite_store_from_env(*dirs)
+
+
+@pytest.mark.anyio
+async def test_call_tool_reads_from_sqlite_store(vault: Path) -> None:
+    import main
+
+    store = SQLiteStore(":memory:")
+    store.sync(main._served_state().index)
+    NotePipeline(main._served_state().index).register(store)
+    (vault / "Locations" / "Haven.md").unlink()
+    with patch.object(main, "_sqlite_store", store), patch.object(main, "get_location_details"):
+        result = await call_tool("list_locations", {})
+        assert result[0].text == "Available locations (1):\n- Elysium"
+        # Edited in place, so the store has not seen it: the etag follows the text served
+        (vault / "Locations" / "Elysium.md").write_text("Elysium, edited")
+        result = await call_tool("get_location", {"name": "Elysium"})
+        etag = content_digest("Elysium content")
+        assert [r.text for r in result] == ["# Elysium\n\nElysium content", f"etag: {etag}"]
+        result = await call_tool("get_location", {"name": "Elysium", "if_none_match": etag})
+        assert result[0].text == f"Unchanged (etag: {etag})"
+        result = await call_tool("get_location", {"name": "Haven"})
+        assert result[0].text.startswith("Error: Location 'Haven' not found")
+        result = await call_tool("get_character", {"name": "../x", "organization": "camarilla"})
+        assert result[0].text == "Error: Invalid character name"
+        result = await call_tool("list_characters", {"limit": 2})
+        assert [r.text.split("\n")[0] for r in result] == [
+            "# Victor Manelli (Mortals)",
+            "# Raphael Kirby (Mortals/second inquisition)",
+            "More characters available. Next cursor: "
+            + main._encode_cursor(("Mortals/second inquisition", "Raphael Kirby")),
+        ]
+        result = await call_tool("search_vault", {"query": "prince"})
+        assert "1. [character] Prince Sebastian (camarilla)" in result[0].text
+
+    # The in-memory analyzers are left out when the store answers for them
+    state = main._served_state()
+    state.frontmatter = FrontmatterIndex()
+    state.links = LinkGraph()
+    (vault / "Locations" / "Haven.md").write_text(
+        "---\nsafety: 2\n---\nThe [[Prince Sebastian]] sleeps here."
+    )
+    _bump_mtime(vault / "Locations")
+    with (
+        patch.object(main, "_sqlite_store", store),
+        patch.object(store, "organizations", wraps=store.organizations) as organizations,
+    ):
+        result = await call_tool("query_notes", {"where": {"safety": {"lte": 3}}})
+        assert result[0].text == "Matching notes (1):\n- [location] Haven: safety: 2"
+        result = await call_tool("get_related", {"name": "prince sebastian"})
+        assert result[0].text == (
+            "# Related to Prince Sebastian (camarilla) (character)\n\n"
+            "- [location] Haven (depth 1, backlink)"
+        )
+        result = await call_tool(
+            "get_character", {"name": "Prince Sebastian", "organization": "Camarila"}
+        )
+        assert result[0].text.endswith("\n\nDid you mean organization: camarilla")
+        result = await call_tool(
+            "get_character", {"name": "Prince Sebastin", "organization": "camarilla"}
+        )
+        assert result[0].text.endswith("\n\nDid you mean (in camarilla): Prince Sebastian")
+        assert organizations.call_count == 2
+
+
+class TestOutline:
+    def test_parse_offsets_levels_and_skipped_lines(self) -> None:
+        data = _CHRONICLE.encode()
+        outline = parse_outline(data)
+        assert [(s.level, s.title) for s in outline.sections] == [
+            (1, "Chronicle"),
+            (2, "Session 1 - Arrival"),
+            (3, "Aftermath"),
+            (2, "Session 2 - The Docks"),
+            (2, "Session 3 - Élysium"),
+        ]
+        chronicle, session1, aftermath, session2, _ = outline.sections
+        assert (chronicle.end, session1.end, aftermath.end) == (
+            len(data),
+            session2.start,
+            session2.start,
+        )
+        assert data[session2.start : session2.end] == b"## Session 2 - The Docks\n\nSmugglers.\n\n"
+
+    def test_selectors(self) -> None:
+        outline = parse_outline(_CHRONICLE.encode())
+        assert [s.title for s in outline.top_level()] == [
+            "Session 1 - Arrival",
+            "Session 2 - The Docks",
+            "Session 3 - Élysium",
+        ]
+        assert [s.title for s in outline.last(2)] == [
+            "Session 2 - The Docks",
+            "Session 3 - Élysium",
+        ]
+        assert [s.title for s in outline.find("aftermath")] == ["Aftermath"]
+        assert [s.title for s in outline.find("SESSION 3")] == ["Session 3 - Élysium"]
+        since = outline.since("session 2")
+        assert since is not None and since.end == outline.size
+        assert outline.since("Session 9") is None
+
+    def test_cache_follows_file_versions(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "story.md"
+            path.write_text("## One\n\nFirst.\n")
+            cache = OutlineCache()
+            assert cache.read(path, lambda o: o.last(1)) == ["## One\n\nFirst.\n"]
+            with open(path, "a") as f:
+                f.write("## Two\n\nSecond.\n")
+            assert cache.read(path, lambda o: o.last(1)) == ["## Two\n\nSecond.\n"]
+            path.write_text("")
+            assert cache.read(path, lambda o: o.last(1)) == []
+
+
+def test_get_story_so_far_sections() -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        sessions = Path(tmp_dir)
+        (sessions / "__result.md").write_text(_CHRONICLE)
+        assert get_story_so_far(sessions) == _CHRONICLE
+        assert get_story_so_far(sessions, last_n_sections=1) == (
+            "## Session 3 - Élysium\n\nThe Prince speaks."
+        )
+        assert get_story_so_far(sessions, since_heading="Session 2").startswith(
+            "## Session 2 - The Docks\n\nSmugglers.\n\n## Session 3"
+        )
+        with pytest.raises(ValueError, match="Top-level headings: Session 1 - Arrival, "):
+            get_story_so_far(sessions, section="Session 4")
+        with pytest.raises(ValueError, match="only one of"):
+            get_story_so_far(sessions, section="Session 1", last_n_sections=1)
+        with pytest.raises(FileNotFoundError):
+            get_story_so_far(sessions / "missing", section="Session 1")
+
+
+@pytest.mark.anyio
+async def test_call_tool_get_story_so_far_section(vault: Path) -> None:
+    result = await call_tool("get_story_so_far", {"section": "session 1"})
+    assert result[0].text == "# Story So Far\n\n# Session 1\n\nThe story begins."
+    result = await call_tool("get_story_so_far", {"last_n_sections": 0})
+    assert result[0].text == "Error: 'last_n_sections' must be a positive integer"
+    result = await call_tool("get_story_so_far", {"section": 5})
+    assert result[0].text == "Error: 'section' must be a string"
+    result = await call_tool("get_story_so_far", {"since_heading": ["Session 1"]})
+    assert result[0].text == "Error: 'since_heading' must be a string"
+
+
+def test_outline_select_merges_nested_and_reports_missing() -> None:
+    outline = parse_outline(_CHRONICLE.encode())
+    selected = outline.select(["Aftermath", "session 1", "Session 3"])
+    assert [s.title for s in selected] == ["Session 1 - Arrival", "Session 3 - Élysium"]
+    with pytest.raises(ValueError, match="Section\\(s\\) not found: Secrets. Available sections: "):
+        outline.select(["Secrets", "Aftermath"])
+
+
+@pytest.mark.anyio
+async def test_call_tool_get_character_sections(vault: Path) -> None:
+    note = vault / "Characters" / "camarilla" / "Prince Sebastian.md"
+    note.write_text(
+        "# Prince Sebastian\n\n## Haven\n\nThe tower.\n\n"
+        "## Touchstones\n\n- Maria\n\n## Secrets\n\nDiablerist.\n"
+    )
+    result = await call_tool(
+        "get_character",
+        {"name": "Prince Sebastian", "organization": "camarilla", "sections": ["secrets", "Haven"]},
+    )
+    assert result[0].text == (
+        "# Prince Sebastian (camarilla)\n\n## Haven\n\nThe tower.\n\n## Secrets\n\nDiablerist."
+    )
+    result = await call_tool(
+        "get_character",
+        {"name": "Prince Sebastian", "organization": "camarilla", "sections": ["Coterie"]},
+    )
+    assert result[0].text.startswith("Error: Section(s) not found: Coterie.")
+    result = await call_tool("get_location", {"name": "Elysium", "sections": "Haven"})
+    assert result[0].text == "Error: 'sections' must be a list of heading names"
+
+
+class TestToolMetrics:
+    def test_render_counts_and_histograms(self) -> None:
+        metrics = ToolMetrics()
+        metrics.observe("get_location", 0.002, 300, error=False)
+        metrics.observe("get_location", 0.2, 5000, error=True)
+        text = metrics.render()
+        assert 'campaign_tool_calls_total{tool="get_location"} 2' in text
+        assert 'campaign_tool_errors_total{tool="get_location"} 1' in text
+        assert 'campaign_tool_latency_seconds_bucket{tool="get_location",le="0.0025"} 1' in text
+        assert 'campaign_tool_latency_seconds_bucket{tool="get_location",le="+Inf"} 2' in text
+        assert 'campaign_tool_response_bytes_bucket{tool="get_location",le="4096"} 1' in text
+        assert 'campaign_tool_response_bytes_sum{tool="get_location"} 5300' in text
+
+    def test_label_count_is_bounded(self) -> None:
+        metrics = ToolMetrics(max_tools=1)
+        metrics.observe("list_locations", 0.001, 10, error=False)
+        metrics.observe('made "up"', 0.001, 0, error=True)
+        text = metrics.render()
+        assert 'campaign_tool_calls_total{tool="other"} 1' in text
+        assert "made" not in text
+
+
+@pytest.mark.anyio
+async def test_call_tool_records_metrics(vault: Path) -> None:
+    import main
+
+    metrics = ToolMetrics()
+    with patch.object(main, "_tool_metrics", metrics):
+        await call_tool("get_location", {"name": "Elysium"})
+        await call_tool("get_location", {"name": "Nowhere"})
+        with pytest.raises(ValueError):
+            await call_tool("no_such_tool", {})
+    text = metrics.render()
+    assert 'campaign_tool_calls_total{tool="get_location"} 2' in text
+    assert 'campaign_tool_errors_total{tool="get_location"} 1' in text
+    assert 'campaign_tool_errors_total{tool="no_such_tool"} 1' in text
+
+
+@pytest.mark.anyio
+async def test_metrics_endpoint_has_its_own_token_and_skips_rate_limit() -> None:
+    api_key, metrics_token = "a" * 32, "m" * 32
+    metrics = _MetricsApp(metrics_token)
+
+    async def inner(scope: Any, receive: Any, send: Any) -> None:
+        await metrics(scope, receive, send)
+
+    mw = _APIKeyMiddleware(inner, api_key, exempt_paths={"/metrics"}, ip_limit=1)
+    scrape = _make_http_scope([(b"authorization", f"Bearer {metrics_token}".encode())])
+    scrape["path"] = "/metrics"
+    for _ in range(3):
+        assert (await _collect_response(mw, scrape))["status"] == 200
+    wrong = _make_http_scope([(b"authorization", f"Bearer {api_key}".encode())])
+    wrong["path"] = "/metrics"
+    assert (await _collect_response(mw, wrong))["status"] == 401
+
+
+@pytest.mark.anyio
+async def test_metrics_endpoint_throttles_failed_authentication() -> None:
+    metrics_token = "m" * 32
+    mw = _APIKeyMiddleware(
+        _MetricsApp(metrics_token, failure_limit=2), "a" * 32, exempt_paths={"/metrics"}
+    )
+    wrong = _make_http_scope([(b"authorization", b"Bearer guess")])
+    wrong["path"] = "/metrics"
+    assert [(await _collect_response(mw, wrong))["status"] for _ in range(3)] == [401, 401, 429]
+    scrape = _make_http_scope([(b"authorization", f"Bearer {metrics_token}".encode())])
+    scrape["path"] = "/metrics"
+    assert (await _collect_response(mw, scrape))["status"] == 429
+
+
+def test_metrics_token_is_not_derived_from_the_api_key() -> None:
+    with patch.dict(os.environ, {"MCP_API_KEY": "a" * 32}, clear=True):
+        assert _metrics_token_from_env() is None
+    with patch.dict(os.environ, {"MCP_METRICS_TOKEN": "short"}):
+        with pytest.raises(SystemExit):
+            _metrics_token_from_env()
+
+
+@pytest.mark.anyio
+async def test_middleware_refuses_bodies_too_large_to_price() -> None:
+    app_reached = False
+
+    async def inner(scope: Any, receive: Any, send: Any) -> None:
+        nonlocal app_reached
+        app_reached = True
+
+    mw = _APIKeyMiddleware(inner, "a" * 32, costs=ToolCosts({"list_characters": 3.0}))
+    scope = _make_http_scope([(b"authorization", b"Bearer " + b"a" * 32)])
+    scope["method"] = "POST"
+    padded = _tool_call("list_characters")[:-1] + b', "pad": "' + b" " * (1024 * 1024) + b'"}'
+    chunks = [padded[i : i + 65536] for i in range(0, len(padded), 65536)]
+    sent: list[MutableMapping[str, Any]] = []
+
+    async def receive() -> MutableMapping[str, Any]:
+        chunk = chunks.pop(0)
+        return {"type": "http.request", "body": chunk, "more_body": bool(chunks)}
+
+    async def send(message: MutableMapping[str, Any]) -> None:
+        sent.append(message)
+
+    await mw(scope, receive, send)
+    assert sent[0]["status"] == 413
+    assert not app_reached
+
+
+def _tool_call(tool: str) -> bytes:
+    message = {"jsonrpc": "2.0", "id": 1, "method": "tools/call", "params": {"name": tool}}
+    return json.dumps(message).encode()
+
+
+def test_tool_costs() -> None:
+    costs = ToolCosts({"list_characters": 3.0, "victims_resonance": 0.25}, bytes_per_unit=1000)
+    assert costs.request_cost(_tool_call("list_characters")) == 3.0
+    batch = b"[" + _tool_call("victims_resonance") + b"," + _tool_call("get_location") + b"]"
+    assert costs.request_cost(batch) == 1.25
+    assert costs.request_cost(b'{"jsonrpc": "2.0", "method": "initialize"}') == 1.0
+    assert costs.request_cost(b"not json") == 1.0
+    assert costs.response_cost(2500) == 2.5
+
+
+@pytest.mark.anyio
+async def test_middleware_charges_by_tool_cost_per_key_and_ip() -> None:
+    gm_key, player_key = "g" * 32, "p" * 32
+    bodies: list[bytes] = []
+
+    async def inner(scope: Any, receive: Any, send: Any) -> None:
+        bodies.append((await receive())["body"])
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"x" * 500, "more_body": False})
+
+    mw = _APIKeyMiddleware(
+        inner,
+        {"gm": gm_key, "player": player_key},
+        ip_limit=100,
+        identity_limit=4,
+        costs=ToolCosts({"list_characters": 3.0}, bytes_per_unit=1000),
+    )
+
+    async def post(key: str, tool: str, ip: str) -> int:
+        scope = _make_http_scope([(b"authorization", f"Bearer {key}".encode())], ip)
+        scope["method"] = "POST"
+        sent: list[MutableMapping[str, Any]] = []
+        body = _tool_call(tool)
+
+        async def receive() -> MutableMapping[str, Any]:
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send(message: MutableMapping[str, Any]) -> None:
+            sent.append(message)
+
+        await mw(scope, receive, send)
+        return int(sent[0]["status"])
+
+    with patch("main.time.monotonic", return_value=500.0):
+        # 3 units + 0.5 for the response body leaves the player 0.5 units
+        assert await post(player_key, "list_characters", "10.0.0.1") == 200
+        assert await post(player_key, "get_location", "10.0.0.2") == 429
+        # The game master's key has its own quota
+        assert await post(gm_key, "get_location", "10.0.0.1") == 200
+    assert bodies == [_tool_call("list_characters"), _tool_call("get_location")]